@@ -7,11 +7,12 @@ from lightrag.utils import setup_logger
 
 setup_logger("lightrag", level="INFO")
 
-WORKING_DIR = "./lightrag_data"
-if not os.path.exists(WORKING_DIR):
-    os.mkdir(WORKING_DIR)
+WORKING_DIR = os.environ.get("LIGHTRAG_WORKING_DIR", "./lightrag_data")
 
 async def initialize_rag():
+    # Created here rather than on import: importers may point WORKING_DIR
+    # elsewhere first (the Lambda code directory is read-only)
+    os.makedirs(WORKING_DIR, exist_ok=True)
     rag = LightRAG(
         working_dir=WORKING_DIR,
         embedding_func=openai_embed,
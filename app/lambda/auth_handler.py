@@ -3,8 +3,7 @@ Lambda function for handling user authentication
 Supports login, registration, and JWT token management for VPFlow
 """
 
-import json
-import boto3
+import aws_clients
 import os
 import hashlib
 import hmac
@@ -12,24 +11,32 @@ import base64
 import jwt
 import uuid
 from datetime import datetime, timedelta
+from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
 import logging
+import http_api
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-cognito_client = boto3.client('cognito-idp')
+# AWS clients, created on first use
+dynamodb = aws_clients.lazy_resource('dynamodb')
+cognito_client = aws_clients.lazy_client('cognito-idp')
 
 # Environment variables
 USERS_TABLE = os.environ.get('USERS_TABLE', 'vpflow-users')
+USERNAME_INDEX = os.environ.get('USERS_USERNAME_INDEX', 'username-index')
+EMAIL_INDEX = os.environ.get('USERS_EMAIL_INDEX', 'email-index')
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-super-secret-jwt-key-change-in-production')
 COGNITO_USER_POOL_ID = os.environ.get('COGNITO_USER_POOL_ID')
 COGNITO_CLIENT_ID = os.environ.get('COGNITO_CLIENT_ID')
 COGNITO_CLIENT_SECRET = os.environ.get('COGNITO_CLIENT_SECRET')
 
+# Authentication actions, selected by the body's "action" field
+router = http_api.Router(default='login')
+
+@http_api.handler(client_error_message='Internal server error')
 def lambda_handler(event, context):
     """
     Handle authentication requests (login, register, token refresh, etc.)
@@ -41,38 +48,9 @@ def lambda_handler(event, context):
     Returns:
         dict: Response with status code and authentication result
     """
-    try:
-        # Determine the authentication action
-        path = event.get('path', '')
-        http_method = event.get('httpMethod', 'POST')
-        
-        if 'body' in event:
-            body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
-        else:
-            body = event
-        
-        action = body.get('action', 'login')
-        
-        # Route to appropriate handler
-        if action == 'login':
-            return handle_login(body)
-        elif action == 'register':
-            return handle_registration(body)
-        elif action == 'refresh':
-            return handle_token_refresh(body)
-        elif action == 'verify':
-            return handle_token_verification(body)
-        elif action == 'logout':
-            return handle_logout(body)
-        elif action == 'change_password':
-            return handle_password_change(body)
-        else:
-            return error_response(400, 'Invalid action')
-        
-    except Exception as e:
-        logger.error(f"Error in auth handler: {str(e)}")
-        return error_response(500, 'Internal server error', str(e))
+    return router.dispatch(http_api.parse_body(event))
 
+@router.route('login')
 def handle_login(body):
     """
     Handle user login
@@ -82,7 +60,7 @@ def handle_login(body):
         password = body.get('password', '')
         
         if not username or not password:
-            return error_response(400, 'Username and password are required')
+            return http_api.error_response(400, 'Username and password are required')
         
         # Try Cognito authentication first if configured
         if COGNITO_USER_POOL_ID:
@@ -92,8 +70,9 @@ def handle_login(body):
         
     except Exception as e:
         logger.error(f"Login error: {str(e)}")
-        return error_response(500, 'Login failed', str(e))
+        return http_api.error_response(500, 'Login failed', str(e))
 
+@router.route('register')
 def handle_registration(body):
     """
     Handle user registration
@@ -107,15 +86,15 @@ def handle_registration(body):
         department = body.get('department', '')
         
         if not username or not email or not password or not name:
-            return error_response(400, 'Username, email, password, and name are required')
+            return http_api.error_response(400, 'Username, email, password, and name are required')
         
         # Validate email format
         if '@' not in email or '.' not in email:
-            return error_response(400, 'Invalid email format')
+            return http_api.error_response(400, 'Invalid email format')
         
         # Validate password strength
         if len(password) < 8:
-            return error_response(400, 'Password must be at least 8 characters long')
+            return http_api.error_response(400, 'Password must be at least 8 characters long')
         
         # Try Cognito registration first if configured
         if COGNITO_USER_POOL_ID:
@@ -125,8 +104,9 @@ def handle_registration(body):
         
     except Exception as e:
         logger.error(f"Registration error: {str(e)}")
-        return error_response(500, 'Registration failed', str(e))
+        return http_api.error_response(500, 'Registration failed', str(e))
 
+@router.route('refresh')
 def handle_token_refresh(body):
     """
     Handle JWT token refresh
@@ -135,14 +115,14 @@ def handle_token_refresh(body):
         refresh_token = body.get('refreshToken', '')
         
         if not refresh_token:
-            return error_response(400, 'Refresh token is required')
+            return http_api.error_response(400, 'Refresh token is required')
         
         # Verify and decode refresh token
         try:
             payload = jwt.decode(refresh_token, JWT_SECRET, algorithms=['HS256'])
             
             if payload.get('type') != 'refresh':
-                return error_response(401, 'Invalid refresh token type')
+                return http_api.error_response(401, 'Invalid refresh token type')
             
             user_id = payload.get('user_id')
             username = payload.get('username')
@@ -150,13 +130,13 @@ def handle_token_refresh(body):
             # Get user info
             user = get_user_by_id(user_id)
             if not user:
-                return error_response(401, 'User not found')
+                return http_api.error_response(401, 'User not found')
             
             # Generate new access token
             access_token = generate_access_token(user)
             new_refresh_token = generate_refresh_token(user)
             
-            return success_response({
+            return http_api.success_response({
                 'access_token': access_token,
                 'refresh_token': new_refresh_token,
                 'token_type': 'Bearer',
@@ -164,14 +144,15 @@ def handle_token_refresh(body):
             })
             
         except jwt.ExpiredSignatureError:
-            return error_response(401, 'Refresh token expired')
+            return http_api.error_response(401, 'Refresh token expired')
         except jwt.InvalidTokenError:
-            return error_response(401, 'Invalid refresh token')
+            return http_api.error_response(401, 'Invalid refresh token')
         
     except Exception as e:
         logger.error(f"Token refresh error: {str(e)}")
-        return error_response(500, 'Token refresh failed', str(e))
+        return http_api.error_response(500, 'Token refresh failed', str(e))
 
+@router.route('verify')
 def handle_token_verification(body):
     """
     Handle token verification
@@ -180,7 +161,7 @@ def handle_token_verification(body):
         token = body.get('token', '')
         
         if not token:
-            return error_response(400, 'Token is required')
+            return http_api.error_response(400, 'Token is required')
         
         # Remove Bearer prefix if present
         if token.startswith('Bearer '):
@@ -189,7 +170,7 @@ def handle_token_verification(body):
         try:
             payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
             
-            return success_response({
+            return http_api.success_response({
                 'valid': True,
                 'user_id': payload.get('user_id'),
                 'username': payload.get('username'),
@@ -198,14 +179,15 @@ def handle_token_verification(body):
             })
             
         except jwt.ExpiredSignatureError:
-            return success_response({'valid': False, 'reason': 'Token expired'})
+            return http_api.success_response({'valid': False, 'reason': 'Token expired'})
         except jwt.InvalidTokenError:
-            return success_response({'valid': False, 'reason': 'Invalid token'})
+            return http_api.success_response({'valid': False, 'reason': 'Invalid token'})
         
     except Exception as e:
         logger.error(f"Token verification error: {str(e)}")
-        return error_response(500, 'Token verification failed', str(e))
+        return http_api.error_response(500, 'Token verification failed', str(e))
 
+@router.route('logout')
 def handle_logout(body):
     """
     Handle user logout
@@ -214,14 +196,15 @@ def handle_logout(body):
         # For now, just return success (client-side token removal)
         # In production, you might want to maintain a token blacklist
         
-        return success_response({
+        return http_api.success_response({
             'message': 'Logged out successfully'
         })
         
     except Exception as e:
         logger.error(f"Logout error: {str(e)}")
-        return error_response(500, 'Logout failed', str(e))
+        return http_api.error_response(500, 'Logout failed', str(e))
 
+@router.route('change_password')
 def handle_password_change(body):
     """
     Handle password change
@@ -232,20 +215,20 @@ def handle_password_change(body):
         new_password = body.get('newPassword', '')
         
         if not user_id or not current_password or not new_password:
-            return error_response(400, 'User ID, current password, and new password are required')
+            return http_api.error_response(400, 'User ID, current password, and new password are required')
         
         # Validate new password
         if len(new_password) < 8:
-            return error_response(400, 'New password must be at least 8 characters long')
+            return http_api.error_response(400, 'New password must be at least 8 characters long')
         
         # Get user
         user = get_user_by_id(user_id)
         if not user:
-            return error_response(404, 'User not found')
+            return http_api.error_response(404, 'User not found')
         
         # Verify current password
         if not verify_password(current_password, user.get('password_hash', '')):
-            return error_response(401, 'Current password is incorrect')
+            return http_api.error_response(401, 'Current password is incorrect')
         
         # Hash new password
         new_password_hash = hash_password(new_password)
@@ -261,13 +244,13 @@ def handle_password_change(body):
             }
         )
         
-        return success_response({
+        return http_api.success_response({
             'message': 'Password changed successfully'
         })
         
     except Exception as e:
         logger.error(f"Password change error: {str(e)}")
-        return error_response(500, 'Password change failed', str(e))
+        return http_api.error_response(500, 'Password change failed', str(e))
 
 def cognito_login(username, password):
     """
@@ -307,7 +290,7 @@ def cognito_login(username, password):
         # Create user record in local database if not exists
         create_or_update_user_from_cognito(username, user_attributes)
         
-        return success_response({
+        return http_api.success_response({
             'access_token': access_token,
             'refresh_token': refresh_token,
             'id_token': id_token,
@@ -322,12 +305,12 @@ def cognito_login(username, password):
         })
         
     except cognito_client.exceptions.NotAuthorizedException:
-        return error_response(401, 'Invalid username or password')
+        return http_api.error_response(401, 'Invalid username or password')
     except cognito_client.exceptions.UserNotConfirmedException:
-        return error_response(401, 'User account not confirmed')
+        return http_api.error_response(401, 'User account not confirmed')
     except Exception as e:
         logger.error(f"Cognito login error: {str(e)}")
-        return error_response(500, 'Authentication service error')
+        return http_api.error_response(500, 'Authentication service error')
 
 def cognito_register(username, email, password, name, role, department):
     """
@@ -365,19 +348,19 @@ def cognito_register(username, email, password, name, role, department):
         # Create user record in local database
         user_id = create_local_user(username, email, None, name, role, department)
         
-        return success_response({
+        return http_api.success_response({
             'message': 'User registered successfully',
             'user_id': user_id,
             'confirmation_required': not response['UserConfirmed']
         })
         
     except cognito_client.exceptions.UsernameExistsException:
-        return error_response(400, 'Username already exists')
+        return http_api.error_response(400, 'Username already exists')
     except cognito_client.exceptions.InvalidPasswordException:
-        return error_response(400, 'Password does not meet requirements')
+        return http_api.error_response(400, 'Password does not meet requirements')
     except Exception as e:
         logger.error(f"Cognito registration error: {str(e)}")
-        return error_response(500, 'Registration service error')
+        return http_api.error_response(500, 'Registration service error')
 
 def local_login(username, password):
     """
@@ -388,15 +371,15 @@ def local_login(username, password):
         user = get_user_by_username(username)
         
         if not user:
-            return error_response(401, 'Invalid username or password')
+            return http_api.error_response(401, 'Invalid username or password')
         
         # Verify password
         if not verify_password(password, user.get('password_hash', '')):
-            return error_response(401, 'Invalid username or password')
+            return http_api.error_response(401, 'Invalid username or password')
         
         # Check if user is active
         if user.get('status') != 'active':
-            return error_response(401, 'User account is not active')
+            return http_api.error_response(401, 'User account is not active')
         
         # Generate tokens
         access_token = generate_access_token(user)
@@ -405,7 +388,7 @@ def local_login(username, password):
         # Update last login
         update_last_login(user['user_id'])
         
-        return success_response({
+        return http_api.success_response({
             'access_token': access_token,
             'refresh_token': refresh_token,
             'token_type': 'Bearer',
@@ -422,7 +405,7 @@ def local_login(username, password):
         
     except Exception as e:
         logger.error(f"Local login error: {str(e)}")
-        return error_response(500, 'Authentication failed')
+        return http_api.error_response(500, 'Authentication failed')
 
 def local_register(username, email, password, name, role, department):
     """
@@ -431,11 +414,11 @@ def local_register(username, email, password, name, role, department):
     try:
         # Check if username exists
         if get_user_by_username(username):
-            return error_response(400, 'Username already exists')
+            return http_api.error_response(400, 'Username already exists')
         
         # Check if email exists
         if get_user_by_email(email):
-            return error_response(400, 'Email already exists')
+            return http_api.error_response(400, 'Email already exists')
         
         # Hash password
         password_hash = hash_password(password)
@@ -443,26 +426,19 @@ def local_register(username, email, password, name, role, department):
         # Create user
         user_id = create_local_user(username, email, password_hash, name, role, department)
         
-        return success_response({
+        return http_api.success_response({
             'message': 'User registered successfully',
             'user_id': user_id
         })
         
     except Exception as e:
         logger.error(f"Local registration error: {str(e)}")
-        return error_response(500, 'Registration failed')
+        return http_api.error_response(500, 'Registration failed')
 
 def get_user_by_username(username):
     """Get user by username from database"""
     try:
-        table = dynamodb.Table(USERS_TABLE)
-        response = table.scan(
-            FilterExpression='username = :username',
-            ExpressionAttributeValues={':username': username}
-        )
-        
-        items = response.get('Items', [])
-        return items[0] if items else None
+        return get_user_by_index('username', username, USERNAME_INDEX)
         
     except Exception as e:
         logger.error(f"Error getting user by username: {str(e)}")
@@ -471,19 +447,46 @@ def get_user_by_username(username):
 def get_user_by_email(email):
     """Get user by email from database"""
     try:
-        table = dynamodb.Table(USERS_TABLE)
-        response = table.scan(
-            FilterExpression='email = :email',
-            ExpressionAttributeValues={':email': email}
-        )
-        
-        items = response.get('Items', [])
-        return items[0] if items else None
+        return get_user_by_index('email', email, EMAIL_INDEX)
         
     except Exception as e:
         logger.error(f"Error getting user by email: {str(e)}")
         return None
 
+def get_user_by_index(attribute, value, index_name):
+    """Get user by a unique attribute using its global secondary index"""
+    table = dynamodb.Table(USERS_TABLE)
+    try:
+        response = table.query(
+            IndexName=index_name,
+            KeyConditionExpression=Key(attribute).eq(value),
+            Limit=1
+        )
+        items = response.get('Items', [])
+        return items[0] if items else None
+        
+    except ClientError as e:
+        # The index is missing or still backfilling (see migrate_user_indexes.py)
+        if e.response['Error']['Code'] not in ('ValidationException', 'ResourceNotFoundException'):
+            raise
+        logger.warning(f"Index {index_name} unavailable, falling back to table scan: {str(e)}")
+        return scan_user_by_attribute(table, attribute, value)
+
+def scan_user_by_attribute(table, attribute, value):
+    """Find a user with a full paginated scan (fallback until the index is active)"""
+    scan_kwargs = {'FilterExpression': Attr(attribute).eq(value)}
+    while True:
+        response = table.scan(**scan_kwargs)
+        items = response.get('Items', [])
+        if items:
+            return items[0]
+        
+        # The filter is applied per 1 MB page, so keep paging until the end
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return None
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
 def get_user_by_id(user_id):
     """Get user by ID from database"""
     try:
@@ -631,36 +634,3 @@ def update_last_login(user_id):
         )
     except Exception as e:
         logger.warning(f"Could not update last login: {str(e)}")
-
-def success_response(data):
-    """Generate success response"""
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps({
-            'success': True,
-            **data
-        })
-    }
-
-def error_response(status_code, message, details=None):
-    """Generate error response"""
-    response_body = {
-        'success': False,
-        'error': message
-    }
-    
-    if details:
-        response_body['details'] = details
-    
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps(response_body)
-    }
@@ -0,0 +1,125 @@
+"""
+Shared, lazily created AWS clients for the Lambda functions
+Modules declare their clients at import time with lazy_client() and
+lazy_resource(), but nothing is built until the first attribute access, so an
+invocation only pays for the clients its code path uses. Clients are cached
+per process and reused across warm invocations, and share one botocore
+configuration: a connection pool, TCP keep-alive, adaptive retries and
+explicit timeouts.
+"""
+
+import os
+import threading
+import boto3
+from botocore.config import Config
+
+# Environment variables
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '25'))
+AWS_CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '2'))
+AWS_READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '10'))
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '5'))
+
+BASE_CONFIG = Config(
+    max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=AWS_CONNECT_TIMEOUT,
+    read_timeout=AWS_READ_TIMEOUT,
+    retries={'mode': 'adaptive', 'max_attempts': AWS_MAX_ATTEMPTS}
+)
+
+# Services whose calls legitimately run longer than AWS_READ_TIMEOUT
+SERVICE_CONFIGS = {
+    # Diagram generation runs model inference (up to 60 s per invocation)
+    'sagemaker-runtime': Config(read_timeout=70, retries={'mode': 'adaptive', 'max_attempts': 2}),
+    # Synchronous Textract calls process a whole page
+    'textract': Config(read_timeout=60),
+}
+
+_session = None
+_clients = {}
+_resources = {}
+_lock = threading.Lock()
+
+def service_config(service_name):
+    """botocore Config for a service: BASE_CONFIG plus its overrides"""
+    override = SERVICE_CONFIGS.get(service_name)
+    return BASE_CONFIG.merge(override) if override else BASE_CONFIG
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+def client(service_name, endpoint_url=None):
+    """
+    Shared low-level client for a service, created on first use
+
+    Args:
+        service_name (str): e.g. 's3', 'textract'
+        endpoint_url (str): Custom endpoint, e.g. a WebSocket API's
+            connection management URL; cached separately per endpoint
+
+    Returns:
+        botocore client
+    """
+    key = (service_name, endpoint_url)
+    cached = _clients.get(key)
+    if cached is not None:
+        return cached
+    # Sessions are not thread-safe, so clients are built under a lock
+    with _lock:
+        if key not in _clients:
+            _clients[key] = _get_session().client(
+                service_name, endpoint_url=endpoint_url, config=service_config(service_name)
+            )
+        return _clients[key]
+
+def resource(service_name):
+    """
+    Shared boto3 resource for a service, created on first use
+
+    Args:
+        service_name (str): e.g. 'dynamodb'
+
+    Returns:
+        boto3 ServiceResource
+    """
+    cached = _resources.get(service_name)
+    if cached is not None:
+        return cached
+    with _lock:
+        if service_name not in _resources:
+            _resources[service_name] = _get_session().resource(service_name, config=service_config(service_name))
+        return _resources[service_name]
+
+class _LazyProxy:
+    """Stand-in that builds the real client or resource on first attribute access"""
+
+    __slots__ = ('_factory', '_service_name')
+
+    def __init__(self, factory, service_name):
+        self._factory = factory
+        self._service_name = service_name
+
+    def __getattr__(self, name):
+        return getattr(self._factory(self._service_name), name)
+
+    def __repr__(self):
+        return f"<lazy {self._factory.__name__} {self._service_name!r}>"
+
+def lazy_client(service_name):
+    """Module-level handle for client(service_name), resolved on first use"""
+    return _LazyProxy(client, service_name)
+
+def lazy_resource(service_name):
+    """Module-level handle for resource(service_name), resolved on first use"""
+    return _LazyProxy(resource, service_name)
+
+def reset():
+    """Drop every cached client (tests, or after changing credentials)"""
+    global _session
+    with _lock:
+        _clients.clear()
+        _resources.clear()
+        _session = None
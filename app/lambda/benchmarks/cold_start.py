@@ -0,0 +1,135 @@
+"""
+Cold-start benchmark for the Lambda handlers
+Imports each handler module in a fresh interpreter, the way a new Lambda
+execution environment does, and reports the import time. With --first-client
+it also times building the first client a handler uses, which is the cost
+moved from import time to first use by aws_clients.py.
+
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py upload_handler textract_handler --runs 20
+    python benchmarks/cold_start.py --importtime upload_handler
+
+No AWS calls are made; a region and dummy credentials are set if missing.
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HANDLERS = [
+    'upload_handler',
+    'textract_handler',
+    'retrieval_handler',
+    'diagram_handler',
+    'feedback_handler',
+    'chatbot_handler',
+    'auth_handler',
+]
+
+# Client each handler's main path builds first
+FIRST_CLIENT = {
+    'upload_handler': 's3_client',
+    'textract_handler': 'textract_client',
+    'retrieval_handler': 'dynamodb',
+    'diagram_handler': 'dynamodb',
+    'feedback_handler': 'dynamodb',
+    'chatbot_handler': 'dynamodb',
+    'auth_handler': 'cognito_client',
+}
+
+# Runs in the child interpreter; prints one JSON line
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+module = __import__({module!r})
+import_ms = (time.perf_counter() - start) * 1000
+result = {{'import_ms': import_ms}}
+if {client!r}:
+    start = time.perf_counter()
+    getattr(getattr(module, {client!r}), 'meta')
+    result['first_client_ms'] = (time.perf_counter() - start) * 1000
+print(json.dumps(result))
+"""
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    env.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    env.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    # Cached bytecode, as in a deployed package
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+def measure(module, first_client=False):
+    """
+    Import a handler in a fresh interpreter
+
+    Returns:
+        dict: import_ms (and first_client_ms), or error
+    """
+    code = PROBE.format(module=module, client=FIRST_CLIENT.get(module) if first_client else None)
+    proc = subprocess.run(
+        [sys.executable, '-c', code], cwd=LAMBDA_DIR, env=child_env(), capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        return {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def benchmark(module, runs, first_client=False):
+    # The first run compiles bytecode, which a deployed package ships precompiled
+    warmup = measure(module, first_client)
+    if 'error' in warmup:
+        return {'handler': module, 'error': warmup['error']}
+
+    samples = [measure(module, first_client) for _ in range(runs)]
+    imports = [sample['import_ms'] for sample in samples]
+    result = {
+        'handler': module,
+        'runs': runs,
+        'import_ms_median': round(statistics.median(imports), 1),
+        'import_ms_min': round(min(imports), 1),
+        'import_ms_max': round(max(imports), 1),
+    }
+    if first_client:
+        result['first_client_ms_median'] = round(statistics.median(s['first_client_ms'] for s in samples), 1)
+    return result
+
+def show_importtime(module, top=15):
+    """Print the slowest imports of a handler (python -X importtime)"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=LAMBDA_DIR, env=child_env(), capture_output=True, text=True
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    print(f"Slowest imports of {module} (cumulative ms, self ms):")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} {self_us / 1000:8.1f}  {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the Lambda handlers.")
+    parser.add_argument('handlers', nargs='*', default=HANDLERS, help="Handler modules (default: all)")
+    parser.add_argument('--runs', type=int, default=10, help="Fresh interpreters per handler")
+    parser.add_argument('--first-client', action='store_true', help="Also time building the first AWS client")
+    parser.add_argument('--importtime', action='store_true', help="Break down import time per module instead")
+    args = parser.parse_args()
+
+    if args.importtime:
+        for module in args.handlers:
+            show_importtime(module)
+        return
+
+    for module in args.handlers:
+        print(json.dumps(benchmark(module, args.runs, args.first_client)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Warm-invocation benchmark for the chatbot handler
+Runs the handler in a fresh interpreter, the way one Lambda execution
+environment does: the first invocation pays for building the agent, loading
+the knowledge base and opening the history store, the following ones reuse
+them. --mode rebuild drops that state before every invocation, which is the
+cost each request paid when the agent was built per call.
+
+    python benchmarks/warm_invocation.py --invocations 20
+    python benchmarks/warm_invocation.py --mode warm rebuild --store memory
+
+The real agent is used when OPENAI_API_KEY is set and its dependencies are
+installed (app/ is put on the path, as the Lambda layer does); otherwise the
+rule-based answer is timed. Answers come from the model, so compare modes
+against the same store and model.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.dirname(LAMBDA_DIR)
+
+MESSAGES = [
+    "What are the steps of the loan approval workflow?",
+    "Which roles approve a credit card application?",
+    "How is a customer's identity verified when opening an account?",
+    "What happens when a document fails verification?",
+]
+
+# Runs in the child interpreter; prints one JSON line
+PROBE = """
+import json, sys, time
+sys.path.append({app_dir!r})
+start = time.perf_counter()
+import chatbot_handler
+import_ms = (time.perf_counter() - start) * 1000
+
+def reset():
+    state = chatbot_handler._warm_state
+    if state is not None:
+        state.store.close()
+        if state.loop is not None:
+            state.loop.call_soon_threadsafe(state.loop.stop)
+    chatbot_handler._warm_state = None
+    agent = sys.modules.get('sagemaker.agent.chatbot')
+    if agent is not None:
+        agent.get_agent.cache_clear()
+    tools = sys.modules.get('sagemaker.agent.graph_tools')
+    if tools is not None:
+        tools._rag = None
+        tools._rag_lock = None
+
+def server_timing(header):
+    timings = {{}}
+    for part in header.split(','):
+        name, _, duration = part.strip().partition(';dur=')
+        timings[name] = float(duration)
+    return timings
+
+invocations = []
+for i in range({invocations}):
+    if {rebuild}:
+        reset()
+    event = {{'body': json.dumps({{
+        'userId': 'benchmark-user',
+        'threadId': {thread_id!r},
+        'message': {messages!r}[i % {count}]
+    }})}}
+    start = time.perf_counter()
+    result = chatbot_handler.lambda_handler(event, None)
+    total_ms = (time.perf_counter() - start) * 1000
+    if result['statusCode'] != 200:
+        raise SystemExit(result['body'])
+    invocations.append({{'total_ms': total_ms, **server_timing(result['headers']['Server-Timing'])}})
+
+state = chatbot_handler.get_warm_state()
+print(json.dumps({{
+    'import_ms': import_ms,
+    'agent': state.agent_stream is not None,
+    'store': state.store.name,
+    'invocations': invocations
+}}))
+"""
+
+def child_env(store):
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    if store:
+        env['CHAT_HISTORY_STORE'] = store
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(values):
+    return {
+        'p50': round(percentile(values, 0.5), 1),
+        'p95': round(percentile(values, 0.95), 1),
+        'max': round(max(values), 1),
+    }
+
+def run(mode, invocations, store):
+    """
+    Invoke the handler repeatedly in a fresh interpreter
+
+    Returns:
+        dict: first invocation and later invocations' latency, per phase
+    """
+    code = PROBE.format(
+        app_dir=APP_DIR,
+        invocations=invocations,
+        rebuild=mode == 'rebuild',
+        thread_id=f"benchmark-{mode}-{os.getpid()}",
+        messages=MESSAGES,
+        count=len(MESSAGES)
+    )
+    proc = subprocess.run(
+        [sys.executable, '-c', code], cwd=LAMBDA_DIR, env=child_env(store), capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        return {'mode': mode, 'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}
+
+    data = json.loads(proc.stdout.strip().splitlines()[-1])
+    first, rest = data['invocations'][0], data['invocations'][1:]
+    result = {
+        'mode': mode,
+        'agent': data['agent'],
+        'store': data['store'],
+        'import_ms': round(data['import_ms'], 1),
+        'first_ms': {name: round(ms, 1) for name, ms in first.items()},
+    }
+    if rest:
+        result['next_invocations'] = len(rest)
+        result['next_ms'] = {name: summarize([sample[name] for sample in rest]) for name in first}
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold and warm invocation latency of the chatbot handler.")
+    parser.add_argument('--mode', nargs='+', choices=['warm', 'rebuild'], default=['warm', 'rebuild'],
+                        help="warm reuses the container state; rebuild drops it before every invocation")
+    parser.add_argument('--invocations', type=int, default=10, help="Invocations per interpreter")
+    parser.add_argument('--store', choices=['postgres', 'dynamodb', 'memory'],
+                        help="Chat history store (default: CHAT_HISTORY_STORE or its default)")
+    args = parser.parse_args()
+
+    for mode in args.mode:
+        print(json.dumps(run(mode, args.invocations, args.store)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Chat history store for the chatbot
+One store per deployment holds every conversation turn, read once before the
+agent runs and written once after the answer is complete:
+- postgres: the agent's `message` table (app/database/chat_history.py),
+  through a connection pool kept open across warm invocations
+- dynamodb: CHAT_HISTORY_TABLE, queried through its thread-timestamp-index
+- memory: process-local, for local development and benchmarks
+History is returned in the agent's format, oldest first:
+[{"role": "human", "content": ...}, {"role": "assistant", "content": ...}]
+"""
+
+import os
+import uuid
+import logging
+import threading
+from datetime import datetime
+from collections import defaultdict
+import aws_clients
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Environment variables (same connection settings as app/database)
+DB_HOST = os.environ.get('DB_HOST')
+DB_PORT = os.environ.get('DB_PORT', '5432')
+DB_NAME = os.environ.get('DB_NAME', 'vpflow')
+DB_USER = os.environ.get('DB_USER', 'postgres')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
+CHAT_HISTORY_TABLE = os.environ.get('CHAT_HISTORY_TABLE', 'vpflow-chat-history')
+# postgres, dynamodb or memory; defaults to postgres when DB_HOST is set
+CHAT_HISTORY_STORE = os.environ.get('CHAT_HISTORY_STORE') or ('postgres' if DB_HOST else 'dynamodb')
+# One invocation uses one connection at a time; extra slots serve local threads
+CHAT_DB_POOL_SIZE = int(os.environ.get('CHAT_DB_POOL_SIZE', '2'))
+# Conversation turns (question and answer) passed to the agent
+CHAT_HISTORY_TURNS = int(os.environ.get('CHAT_HISTORY_TURNS', '10'))
+
+def turns_to_messages(turns):
+    """
+    Convert (question, answer) turns, oldest first, to agent messages
+    """
+    messages = []
+    for question, answer in turns:
+        messages.append({'role': 'human', 'content': question})
+        messages.append({'role': 'assistant', 'content': answer})
+    return messages
+
+class PostgresChatStore:
+    """
+    History in the agent's `message` table, through a connection pool
+    """
+
+    name = 'postgres'
+
+    def __init__(self):
+        from psycopg_pool import ConnectionPool
+
+        conninfo = f"host={DB_HOST} port={DB_PORT} dbname={DB_NAME} user={DB_USER} connect_timeout=5"
+        # Connections idle while the container is frozen may have been dropped,
+        # so each one is checked before it is handed out
+        self.pool = ConnectionPool(
+            conninfo,
+            min_size=1,
+            max_size=CHAT_DB_POOL_SIZE,
+            kwargs={'password': DB_PASSWORD, 'autocommit': True},
+            check=ConnectionPool.check_connection,
+            open=True
+        )
+        self.pool.wait(timeout=10)
+        self.init_table()
+
+    def init_table(self):
+        # Same schema as app/database/chat_history.py
+        with self.pool.connection() as conn:
+            conn.execute("CREATE EXTENSION IF NOT EXISTS \"uuid-ossp\"")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS message (
+                    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+                    thread_id VARCHAR(255) NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_message_thread_id ON message(thread_id)")
+
+    def recent(self, thread_id, limit=CHAT_HISTORY_TURNS):
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT question, answer FROM message WHERE thread_id = %s ORDER BY created_at DESC LIMIT %s",
+                (thread_id, limit)
+            ).fetchall()
+        return turns_to_messages(reversed(rows))
+
+    def save(self, user_id, thread_id, question, answer, context_type=None, context_id=None):
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT INTO message (thread_id, question, answer) VALUES (%s, %s, %s)",
+                (thread_id, question, answer)
+            )
+
+    def close(self):
+        self.pool.close()
+
+class DynamoChatStore:
+    """
+    History in CHAT_HISTORY_TABLE: a user item and a bot item per turn
+    """
+
+    name = 'dynamodb'
+
+    def __init__(self):
+        self.table = aws_clients.resource('dynamodb').Table(CHAT_HISTORY_TABLE)
+
+    def recent(self, thread_id, limit=CHAT_HISTORY_TURNS):
+        result = self.table.query(
+            IndexName='thread-timestamp-index',
+            KeyConditionExpression='thread_id = :thread_id',
+            ExpressionAttributeValues={':thread_id': thread_id},
+            ScanIndexForward=False,
+            Limit=limit * 2
+        )
+        # Both items of a turn share a timestamp; the question comes first
+        items = sorted(
+            result.get('Items', []),
+            key=lambda item: (item.get('timestamp', ''), item.get('message_type') == 'bot')
+        )
+        messages = []
+        for item in items:
+            content = item.get('content')
+            if isinstance(content, dict):
+                content = content.get('message', '')
+            role = 'assistant' if item.get('message_type') == 'bot' else 'human'
+            messages.append({'role': role, 'content': content or ''})
+        return messages
+
+    def save(self, user_id, thread_id, question, answer, context_type=None, context_id=None):
+        message_id = str(uuid.uuid4())
+        timestamp = datetime.utcnow().isoformat()
+        with self.table.batch_writer() as batch:
+            for suffix, message_type, content in (('_user', 'user', question), ('_bot', 'bot', answer)):
+                batch.put_item(Item={
+                    'message_id': message_id + suffix,
+                    'thread_id': thread_id,
+                    'user_id': user_id,
+                    'message_type': message_type,
+                    'content': content,
+                    'context_type': context_type,
+                    'context_id': context_id,
+                    'timestamp': timestamp
+                })
+
+    def close(self):
+        pass
+
+class MemoryChatStore:
+    """
+    Process-local history
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self.turns = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def recent(self, thread_id, limit=CHAT_HISTORY_TURNS):
+        with self.lock:
+            return turns_to_messages(self.turns[thread_id][-limit:])
+
+    def save(self, user_id, thread_id, question, answer, context_type=None, context_id=None):
+        with self.lock:
+            self.turns[thread_id].append((question, answer))
+
+    def close(self):
+        pass
+
+STORES = {
+    'postgres': PostgresChatStore,
+    'dynamodb': DynamoChatStore,
+    'memory': MemoryChatStore,
+}
+
+def open_store(kind=None):
+    """
+    Open the configured chat history store
+
+    Args:
+        kind (str): Store name, defaults to CHAT_HISTORY_STORE
+
+    Returns:
+        Store with recent(thread_id, limit) and save(user_id, thread_id,
+        question, answer, context_type, context_id)
+    """
+    kind = kind or CHAT_HISTORY_STORE
+    if kind not in STORES:
+        raise ValueError(f"Unknown chat history store: {kind}")
+    store = STORES[kind]()
+    logger.info(f"Chat history store: {kind}")
+    return store
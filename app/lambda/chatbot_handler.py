@@ -1,15 +1,20 @@
 """
 Lambda function for handling chatbot interactions
 Integrates with the LangChain agent and LightRAG knowledge graph for intelligent responses
+The agent, the loaded knowledge base and the chat history store (with its open
+database pool) are built once per container and reused by warm invocations.
 """
 
-import json
-import boto3
+import aws_clients
 import os
 import sys
+import time
+import asyncio
+import threading
 from datetime import datetime
-from botocore.exceptions import ClientError
 import logging
+import http_api
+import chat_store
 
 # Configure logging
 logger = logging.getLogger()
@@ -18,16 +23,30 @@ logger.setLevel(logging.INFO)
 # Add the app directory to Python path for imports
 sys.path.append('/opt/python/app')
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-s3_client = boto3.client('s3')
+# AWS clients, created on first use
+dynamodb = aws_clients.lazy_resource('dynamodb')
+s3_client = aws_clients.lazy_client('s3')
 
 # Environment variables
-CHAT_HISTORY_TABLE = os.environ.get('CHAT_HISTORY_TABLE', 'vpflow-chat-history')
 DOCUMENTS_TABLE = os.environ.get('DOCUMENTS_TABLE', 'vpflow-documents')
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+# Streamed tokens are coalesced into frames of up to this many characters or seconds
+STREAM_FLUSH_CHARS = int(os.environ.get('STREAM_FLUSH_CHARS', '200'))
+STREAM_FLUSH_INTERVAL = float(os.environ.get('STREAM_FLUSH_INTERVAL', '0.05'))
+# Build the warm state during the init phase instead of the first invocation
+CHATBOT_PREWARM = os.environ.get('CHATBOT_PREWARM', 'false').lower() == 'true'
 
 def lambda_handler(event, context):
+    """
+    Handle chatbot requests from the REST API (one JSON answer) and the
+    WebSocket API (answer streamed as it is generated)
+    """
+    if is_websocket_event(event):
+        return handle_websocket_event(event)
+    return handle_chat_request(event, context)
+
+@http_api.handler(client_error_message='Failed to process chat message', error_message='Failed to process chat message')
+def handle_chat_request(event, context):
     """
     Handle chatbot conversation requests
     
@@ -38,75 +57,313 @@ def lambda_handler(event, context):
     Returns:
         dict: Response with status code and body containing chatbot response
     """
-    try:
-        # Parse the request
-        if 'body' in event:
-            body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
-        else:
-            body = event
-        
-        # Extract parameters
-        user_id = body.get('userId')
-        thread_id = body.get('threadId')
-        message = body.get('message', '')
-        context_type = body.get('contextType', 'general')  # general, workflow, diagram
-        context_id = body.get('contextId')  # ID of workflow, diagram, etc.
-        
-        if not user_id or not thread_id or not message:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Missing required fields: userId, threadId, or message'
-                })
-            }
-        
-        # Get conversation context
+    body = http_api.parse_body(event)
+    
+    # Extract parameters
+    user_id = body.get('userId')
+    thread_id = body.get('threadId')
+    message = body.get('message', '')
+    context_type = body.get('contextType', 'general')  # general, workflow, diagram
+    context_id = body.get('contextId')  # ID of workflow, diagram, etc.
+    
+    http_api.require_fields(
+        body, ['userId', 'threadId', 'message'], 'Missing required fields: userId, threadId, or message'
+    )
+    
+    # Agent and history store, built on the container's first invocation
+    with http_api.timer('init'):
+        state = get_warm_state()
+    
+    # Get conversation context
+    with http_api.timer('context'):
         context_data = get_conversation_context(context_type, context_id, user_id)
-        
-        # Initialize chatbot with context
+    
+    with http_api.timer('history_read'):
+        chat_history = load_chat_history(state.store, thread_id)
+    
+    # Initialize chatbot with context
+    with http_api.timer('agent'):
         chatbot_response = get_chatbot_response(
             user_id=user_id,
             thread_id=thread_id,
             message=message,
             context_data=context_data,
-            context_type=context_type
+            context_type=context_type,
+            context_id=context_id,
+            chat_history=chat_history
         )
-        
-        # Save conversation to history
-        save_chat_message(user_id, thread_id, message, chatbot_response, context_type, context_id)
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'success': True,
-                'response': chatbot_response,
-                'thread_id': thread_id,
-                'context_type': context_type,
-                'timestamp': datetime.utcnow().isoformat()
-            })
-        }
-        
+    
+    # Save conversation to history
+    with http_api.timer('history'):
+        save_chat_message(state.store, user_id, thread_id, message, chatbot_response, context_type, context_id)
+    
+    return http_api.success_response({
+        'response': chatbot_response,
+        'thread_id': thread_id,
+        'context_type': context_type,
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+def is_websocket_event(event):
+    """WebSocket API events carry a connection ID"""
+    return 'connectionId' in (event.get('requestContext') or {})
+
+class WebSocketConnection:
+    """
+    Sends JSON frames to a WebSocket client through the API Gateway
+    Management API
+    """
+    
+    def __init__(self, event):
+        request_context = event['requestContext']
+        self.connection_id = request_context['connectionId']
+        self.client = aws_clients.client(
+            'apigatewaymanagementapi',
+            endpoint_url=f"https://{request_context['domainName']}/{request_context['stage']}"
+        )
+        self.gone = False
+    
+    def send(self, frame):
+        if self.gone:
+            return
+        try:
+            self.client.post_to_connection(ConnectionId=self.connection_id, Data=http_api.dumps_bytes(frame))
+        except self.client.exceptions.GoneException:
+            # The client disconnected; generation continues so history is complete
+            logger.info(f"Connection {self.connection_id} closed during the stream")
+            self.gone = True
+
+def handle_websocket_event(event):
+    """
+    Handle a WebSocket API route
+    
+    The sendMessage route (and $default) takes the REST request body,
+    e.g. {"action": "sendMessage", "userId", "threadId", "message"}, and
+    answers with frames:
+    {"type": "start"}, {"type": "token", "data": "..."} per chunk, then
+    {"type": "end", "response": {...}} or {"type": "error", "error": "..."}.
+    """
+    route_key = event['requestContext'].get('routeKey')
+    if route_key in ('$connect', '$disconnect'):
+        return {'statusCode': 200}
+    
+    connection = WebSocketConnection(event)
+    try:
+        body = http_api.parse_body(event)
+        http_api.require_fields(
+            body, ['userId', 'threadId', 'message'], 'Missing required fields: userId, threadId, or message'
+        )
+    except http_api.HttpError as e:
+        connection.send({'type': 'error', 'error': e.message})
+        return {'statusCode': e.status_code}
+    
+    stream_chat(
+        connection.send,
+        user_id=body['userId'],
+        thread_id=body['threadId'],
+        message=body['message'],
+        context_type=body.get('contextType', 'general'),
+        context_id=body.get('contextId')
+    )
+    return {'statusCode': 200}
+
+class TokenBuffer:
+    """
+    Coalesce streamed tokens into frames
+    
+    The first token is sent at once so time to first token stays at model
+    latency; later tokens are batched by size and age to limit API calls.
+    """
+    
+    def __init__(self, send):
+        self.send = send
+        self.parts = []
+        self.size = 0
+        self.last_flush = None
+    
+    def add(self, token):
+        self.parts.append(token)
+        self.size += len(token)
+        if (self.last_flush is None or self.size >= STREAM_FLUSH_CHARS
+                or time.monotonic() - self.last_flush >= STREAM_FLUSH_INTERVAL):
+            self.flush()
+    
+    def flush(self):
+        if self.parts:
+            self.send({'type': 'token', 'data': ''.join(self.parts)})
+            self.parts = []
+            self.size = 0
+        self.last_flush = time.monotonic()
+
+class WarmState:
+    """
+    Chatbot state kept for the life of the container
+    
+    Holds the chat history store, the prebuilt agent and the event loop it
+    runs on. The loop runs in a background thread because LightRAG storages
+    are bound to the loop that loaded them, and local servers call in from
+    several threads.
+    """
+    
+    def __init__(self):
+        start = time.perf_counter()
+        self.store = chat_store.open_store()
+        self.loop = None
+        self.agent_stream = None
+        if OPENAI_API_KEY:
+            self.load_agent()
+        logger.info(
+            f"Chatbot warm state ready in {(time.perf_counter() - start) * 1000:.0f} ms "
+            f"(store: {self.store.name}, agent: {'yes' if self.agent_stream else 'no'})"
+        )
+    
+    def load_agent(self):
+        """
+        Build the agent and load the knowledge base, or leave the agent unset
+        if the agent system is not available (it ships in ChatbotAgentLayer,
+        see template.yaml and app/Makefile)
+        """
+        try:
+            from sagemaker.agent import chatbot, graph_tools
+            chatbot.get_agent()
+        except Exception as e:
+            logger.warning(f"Agent unavailable: {str(e)}")
+            return
+        
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name='chatbot-agent-loop', daemon=True).start()
+        try:
+            self.run(graph_tools.load_knowledge_base())
+        except Exception as e:
+            # The tool retries on its first query
+            logger.warning(f"Knowledge base not loaded: {str(e)}")
+        self.agent_stream = chatbot.get_answer_stream
+    
+    def run(self, coroutine):
+        """Run a coroutine on the agent's event loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+    
+    def iter_async(self, async_iterator):
+        """Drive an async iterator on the agent's event loop from synchronous code"""
+        async def next_item():
+            return await async_iterator.__anext__()
+        
+        try:
+            while True:
+                try:
+                    yield self.run(next_item())
+                except StopAsyncIteration:
+                    break
+        finally:
+            self.run(async_iterator.aclose())
+
+_warm_state = None
+_warm_state_lock = threading.Lock()
+
+def get_warm_state():
+    """
+    The container's WarmState, built on first use
+    """
+    global _warm_state
+    if _warm_state is None:
+        with _warm_state_lock:
+            if _warm_state is None:
+                _warm_state = WarmState()
+    return _warm_state
+
+def load_chat_history(store, thread_id):
+    """
+    Recent messages of a thread for the agent, or none if the store fails
+    """
+    try:
+        return store.recent(thread_id)
     except Exception as e:
-        logger.error(f"Error in chatbot handler: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': 'Failed to process chat message',
-                'details': str(e)
-            })
-        }
+        logger.warning(f"Could not load chat history: {str(e)}")
+        return []
+
+def iter_agent_tokens(state, message, thread_id, context_type, context_id=None, chat_history=None):
+    """
+    Yield the agent's answer as it is generated
+    
+    History is passed in and saved by the caller, so the agent does not touch
+    the database itself.
+    """
+    docs_id = [context_id] if context_type == 'workflow' and context_id else []
+    yield from state.iter_async(state.agent_stream(
+        docs_id, message, thread_id, course_id=None, chat_history=chat_history or [], save_history=False
+    ))
+
+def iter_chatbot_tokens(user_id, thread_id, message, context_data, context_type, context_id=None, chat_history=None):
+    """
+    Yield the chatbot's answer in pieces as it is generated
+    """
+    state = get_warm_state()
+    if state.agent_stream is not None:
+        yield from iter_agent_tokens(state, message, thread_id, context_type, context_id, chat_history)
+        return
+    
+    # Rule-based answers are complete at once; they are sent word by word
+    # so clients handle a single protocol
+    response = get_local_response(user_id, thread_id, message, context_data, context_type)
+    words = response['message'].split(' ')
+    for i, word in enumerate(words):
+        yield word if i == len(words) - 1 else word + ' '
+
+def stream_chat(send, user_id, thread_id, message, context_type='general', context_id=None):
+    """
+    Generate an answer, forwarding it through send(frame) as it arrives
+    
+    History is read once before generation and saved once after the stream
+    closes, from the complete answer.
+    
+    Args:
+        send (callable): Delivers one frame (dict) to the client
+    
+    Returns:
+        dict: The complete response, or None if generation failed
+    """
+    send({'type': 'start', 'thread_id': thread_id})
+    try:
+        state = get_warm_state()
+    except Exception as e:
+        logger.error(f"Could not initialize chatbot: {str(e)}")
+        send({'type': 'error', 'error': 'Failed to process chat message'})
+        return None
+    context_data = get_conversation_context(context_type, context_id, user_id)
+    chat_history = load_chat_history(state.store, thread_id)
+    
+    buffer = TokenBuffer(send)
+    parts = []
+    try:
+        for token in iter_chatbot_tokens(user_id, thread_id, message, context_data, context_type, context_id, chat_history):
+            parts.append(token)
+            buffer.add(token)
+    except Exception as e:
+        if not parts:
+            logger.error(f"Error streaming chatbot response: {str(e)}")
+            send({'type': 'error', 'error': 'Failed to process chat message'})
+            return None
+        # The answer was delivered; only the agent's own bookkeeping failed
+        logger.warning(f"Chatbot stream ended with an error: {str(e)}")
+    buffer.flush()
+    
+    intent = analyze_message_intent(message)
+    chatbot_response = {
+        'message': ''.join(parts),
+        'intent': intent,
+        'suggestions': generate_suggestions(intent, context_data),
+        'context_used': context_type != 'general'
+    }
+    send({
+        'type': 'end',
+        'response': chatbot_response,
+        'thread_id': thread_id,
+        'context_type': context_type,
+        'timestamp': datetime.utcnow().isoformat()
+    })
+    
+    save_chat_message(state.store, user_id, thread_id, message, chatbot_response, context_type, context_id)
+    return chatbot_response
 
 def get_conversation_context(context_type, context_id, user_id):
     """
@@ -179,29 +436,49 @@ def get_diagram_context(diagram_id, user_id):
         logger.warning(f"Could not get diagram context: {str(e)}")
         return None
 
-def get_chatbot_response(user_id, thread_id, message, context_data, context_type):
+def get_chatbot_response(user_id, thread_id, message, context_data, context_type, context_id=None, chat_history=None):
     """
     Get response from the chatbot using the integrated agent system
     """
     try:
-        # Try to use the integrated chatbot system
-        if OPENAI_API_KEY:
-            return get_ai_response(user_id, thread_id, message, context_data, context_type)
+        # Use the agent when it is deployed
+        if get_warm_state().agent_stream is not None:
+            return get_ai_response(user_id, thread_id, message, context_data, context_type, context_id, chat_history)
         else:
-            return get_fallback_response(message, context_data, context_type)
+            return get_local_response(user_id, thread_id, message, context_data, context_type)
             
     except Exception as e:
         logger.error(f"Error getting chatbot response: {str(e)}")
         return get_fallback_response(message, context_data, context_type)
 
-def get_ai_response(user_id, thread_id, message, context_data, context_type):
+def get_ai_response(user_id, thread_id, message, context_data, context_type, context_id=None, chat_history=None):
+    """
+    Get AI-powered response from the LangChain agent
+    """
+    state = get_warm_state()
+    answer = ''.join(iter_agent_tokens(state, message, thread_id, context_type, context_id, chat_history))
+    
+    intent = analyze_message_intent(message)
+    return {
+        'message': answer,
+        'intent': intent,
+        'suggestions': generate_suggestions(intent, context_data),
+        'context_used': context_type != 'general'
+    }
+
+def get_local_response(user_id, thread_id, message, context_data, context_type):
+    """
+    Get response without the agent
+    """
+    if OPENAI_API_KEY:
+        return get_rule_based_response(user_id, thread_id, message, context_data, context_type)
+    return get_fallback_response(message, context_data, context_type)
+
+def get_rule_based_response(user_id, thread_id, message, context_data, context_type):
     """
-    Get AI-powered response using the chatbot system
+    Get keyword-matched response, used when the agent system is not deployed
     """
     try:
-        # Import the chatbot system (this would be available in the Lambda layer)
-        # For now, implement a simplified version
-        
         # Analyze the message to understand intent
         intent = analyze_message_intent(message)
         
@@ -229,7 +506,7 @@ def get_ai_response(user_id, thread_id, message, context_data, context_type):
         }
         
     except Exception as e:
-        logger.error(f"Error in AI response generation: {str(e)}")
+        logger.error(f"Error in rule-based response generation: {str(e)}")
         return get_fallback_response(message, context_data, context_type)
 
 def analyze_message_intent(message):
@@ -412,45 +689,20 @@ def get_fallback_response(message, context_data, context_type):
             'context_used': False
         }
 
-def save_chat_message(user_id, thread_id, user_message, bot_response, context_type, context_id):
+def save_chat_message(store, user_id, thread_id, user_message, bot_response, context_type, context_id):
     """
     Save chat interaction to history
     """
     try:
-        table = dynamodb.Table(CHAT_HISTORY_TABLE)
-        
-        import uuid
-        message_id = str(uuid.uuid4())
-        timestamp = datetime.utcnow().isoformat()
-        
-        # Save user message
-        table.put_item(
-            Item={
-                'message_id': message_id + '_user',
-                'thread_id': thread_id,
-                'user_id': user_id,
-                'message_type': 'user',
-                'content': user_message,
-                'context_type': context_type,
-                'context_id': context_id,
-                'timestamp': timestamp
-            }
-        )
-        
-        # Save bot response
-        table.put_item(
-            Item={
-                'message_id': message_id + '_bot',
-                'thread_id': thread_id,
-                'user_id': user_id,
-                'message_type': 'bot',
-                'content': bot_response,
-                'context_type': context_type,
-                'context_id': context_id,
-                'timestamp': timestamp
-            }
-        )
+        store.save(user_id, thread_id, user_message, bot_response['message'], context_type, context_id)
         
     except Exception as e:
         logger.warning(f"Could not save chat message: {str(e)}")
         # Don't fail the request if history saving fails
+
+if CHATBOT_PREWARM:
+    try:
+        get_warm_state()
+    except Exception as e:
+        # The first invocation retries
+        logger.warning(f"Could not prewarm chatbot: {str(e)}")
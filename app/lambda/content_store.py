@@ -0,0 +1,384 @@
+"""
+Content-addressed storage for uploaded documents
+Identical files (by SHA-256) share one S3 object and one processing result;
+each upload keeps its own record in the documents table pointing at the
+content through content_hash
+"""
+
+import os
+import hashlib
+import logging
+from datetime import datetime
+import aws_clients
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+import similarity_index
+import vector_index
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# AWS clients, created on first use
+s3_client = aws_clients.lazy_client('s3')
+dynamodb = aws_clients.lazy_resource('dynamodb')
+
+# Environment variables
+CONTENT_TABLE = os.environ.get('CONTENT_TABLE', 'vpflow-content')
+DOCUMENTS_TABLE = os.environ.get('DOCUMENTS_TABLE', 'vpflow-documents')
+CONTENT_HASH_INDEX = os.environ.get('CONTENT_HASH_INDEX', 'content-hash-index')
+
+CONTENT_PREFIX = 'content/sha256/'
+
+# Processing results shared by every document with the same content;
+# markdown_s3_key is only set when the result comes from an OCR cache entry
+# rendered by the offline pipeline (see ocr_cache.lookup)
+RESULT_FIELDS = ['processed_text_s3_key', 'markdown_s3_key', 'processed_timestamp']
+
+def content_key(content_hash):
+    """Canonical S3 key of a content object"""
+    return f"{CONTENT_PREFIX}{content_hash}"
+
+def hash_bytes(data):
+    """SHA-256 hex digest of in-memory content"""
+    return hashlib.sha256(data).hexdigest()
+
+def get_content(content_hash):
+    """
+    Get a content record
+
+    Returns:
+        dict: Content record, or None if the content is unknown
+    """
+    return dynamodb.Table(CONTENT_TABLE).get_item(Key={'content_hash': content_hash}).get('Item')
+
+def register_content(content_hash, bucket, upload_key, file_size, file_type):
+    """
+    Store an uploaded object under its content hash
+
+    The first upload of some content claims the content record and its object
+    is copied to the canonical key. Later uploads of the same content only add
+    a reference. The per-upload object is kept; the caller removes it with
+    discard_upload() once registration has succeeded.
+
+    Args:
+        content_hash (str): SHA-256 hex digest of the object
+        bucket (str): Bucket holding the uploaded object
+        upload_key (str): Key of the uploaded object
+        file_size (int): Object size in bytes
+        file_type (str): Content type
+
+    Returns:
+        tuple: (content record, True if this upload is the first with this content)
+    """
+    table = dynamodb.Table(CONTENT_TABLE)
+    canonical_key = content_key(content_hash)
+    now = datetime.utcnow().isoformat()
+
+    try:
+        item = {
+            'content_hash': content_hash,
+            's3_bucket': bucket,
+            's3_key': canonical_key,
+            'file_size': file_size,
+            'file_type': file_type,
+            'status': 'pending',
+            'ref_count': 1,
+            'created_timestamp': now
+        }
+        table.put_item(Item=item, ConditionExpression='attribute_not_exists(content_hash)')
+        is_new = True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        item = table.update_item(
+            Key={'content_hash': content_hash},
+            UpdateExpression='ADD ref_count :one SET last_referenced = :now',
+            ExpressionAttributeValues={':one': 1, ':now': now},
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+        is_new = False
+
+    if is_new:
+        try:
+            # Managed copy switches to multipart copy for objects over 5 GB
+            s3_client.copy(
+                {'Bucket': bucket, 'Key': upload_key},
+                bucket, canonical_key,
+                ExtraArgs={
+                    'MetadataDirective': 'REPLACE',
+                    'ContentType': file_type or 'application/octet-stream',
+                    'Metadata': {'content-hash': content_hash}
+                }
+            )
+        except Exception:
+            # Without its object the record must not be reused; a retry claims it again
+            table.delete_item(
+                Key={'content_hash': content_hash},
+                ConditionExpression='ref_count = :one',
+                ExpressionAttributeValues={':one': 1}
+            )
+            raise
+        logger.info(f"Stored new content {content_hash} ({file_size} bytes)")
+    else:
+        logger.info(f"Content {content_hash} already stored (status {item.get('status')}), reusing it")
+
+    return item, is_new
+
+def release_content(content_hash):
+    """
+    Drop one reference to some content (counted by register_content)
+
+    The last reference removes the content record and its object. The
+    object's current version is noted before the record is deleted and only
+    that version is removed, so an upload registering the same content again
+    in the meantime keeps the copy it just made.
+
+    Returns:
+        bool: True if the content was removed
+    """
+    table = dynamodb.Table(CONTENT_TABLE)
+    item = table.update_item(
+        Key={'content_hash': content_hash},
+        UpdateExpression='ADD ref_count :minus_one',
+        ConditionExpression='attribute_exists(content_hash)',
+        ExpressionAttributeValues={':minus_one': -1},
+        ReturnValues='ALL_NEW'
+    )['Attributes']
+    if item.get('ref_count', 0) > 0:
+        return False
+
+    bucket, key = item['s3_bucket'], item['s3_key']
+    try:
+        version_id = s3_client.head_object(Bucket=bucket, Key=key).get('VersionId')
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+            raise
+        version_id = None
+
+    try:
+        table.delete_item(
+            Key={'content_hash': content_hash},
+            ConditionExpression='ref_count <= :zero',
+            ExpressionAttributeValues={':zero': 0}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            # Referenced again in the meantime
+            return False
+        raise
+
+    if version_id:
+        discard_upload(bucket, key, version_id)
+    logger.info(f"Removed unreferenced content {content_hash}")
+    return True
+
+def discard_upload(bucket, upload_key, version_id=None):
+    """
+    Delete a per-upload object once its content is stored under its hash
+
+    The bucket is versioned, so the version itself is deleted when known;
+    a plain delete would only add a delete marker and keep the bytes as a
+    billed noncurrent version (the lifecycle rule on uploads/ expires those).
+    """
+    delete_kwargs = {'Bucket': bucket, 'Key': upload_key}
+    if version_id:
+        delete_kwargs['VersionId'] = version_id
+    try:
+        s3_client.delete_object(**delete_kwargs)
+    except ClientError as e:
+        # The document is registered; the lifecycle rule removes leftovers
+        logger.warning(f"Could not delete upload s3://{bucket}/{upload_key}: {str(e)}")
+
+def claim_processing(content_hash):
+    """
+    Claim the right to process some content
+
+    Only one upload of the same content starts Textract; content whose
+    processing failed can be claimed again.
+
+    Returns:
+        bool: True if the caller should start processing
+    """
+    try:
+        dynamodb.Table(CONTENT_TABLE).update_item(
+            Key={'content_hash': content_hash},
+            UpdateExpression='SET #status = :processing',
+            ConditionExpression='#status IN (:pending, :failed)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':processing': 'processing', ':pending': 'pending', ':failed': 'failed'}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+def update_content(content_hash, **fields):
+    """
+    Set fields on a content record (e.g. status, textract_job_id)
+    """
+    if not fields:
+        return
+    names = {f'#f{i}': name for i, name in enumerate(fields)}
+    values = {f':v{i}': value for i, value in enumerate(fields.values())}
+    dynamodb.Table(CONTENT_TABLE).update_item(
+        Key={'content_hash': content_hash},
+        UpdateExpression='SET ' + ', '.join(f'#f{i} = :v{i}' for i in range(len(fields))),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+def result_fields(content):
+    """
+    Processing results of a content record to copy onto a document record
+
+    Returns:
+        dict: Result fields, empty if the content has not been processed yet
+    """
+    if not content or content.get('status') != 'processed':
+        return {}
+    return {field: content[field] for field in RESULT_FIELDS if content.get(field) is not None}
+
+def get_document_ids(content_hash):
+    """
+    List every document that references some content
+
+    Returns:
+        list: Document IDs
+    """
+    table = dynamodb.Table(DOCUMENTS_TABLE)
+    query_kwargs = {
+        'IndexName': CONTENT_HASH_INDEX,
+        'KeyConditionExpression': Key('content_hash').eq(content_hash)
+    }
+    try:
+        return read_document_ids(table.query, query_kwargs)
+    except ClientError as e:
+        # The index is missing or still backfilling (see DocumentsContentHashIndexEnabled)
+        if e.response['Error']['Code'] not in ('ValidationException', 'ResourceNotFoundException'):
+            raise
+        logger.warning(f"Index {CONTENT_HASH_INDEX} unavailable, falling back to table scan: {str(e)}")
+    return read_document_ids(table.scan, {
+        'FilterExpression': Attr('content_hash').eq(content_hash),
+        'ProjectionExpression': 'document_id'
+    })
+
+def read_document_ids(read, read_kwargs):
+    document_ids = []
+    while True:
+        response = read(**read_kwargs)
+        document_ids.extend(item['document_id'] for item in response.get('Items', []))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return document_ids
+        read_kwargs['ExclusiveStartKey'] = last_key
+
+def mark_processed(content_hash, results, document_ids=()):
+    """
+    Record processing results for some content and copy them to every
+    document referencing it
+
+    Args:
+        content_hash (str): SHA-256 hex digest
+        results (dict): Result fields (see RESULT_FIELDS)
+        document_ids (list): Documents known to reference the content, updated
+            even when the eventually consistent index does not list them yet
+
+    Returns:
+        list: IDs of the documents that were updated
+    """
+    results = {field: value for field, value in results.items() if field in RESULT_FIELDS and value is not None}
+    results.setdefault('processed_timestamp', datetime.utcnow().isoformat())
+    update_content(content_hash, status='processed', **results)
+
+    table = dynamodb.Table(DOCUMENTS_TABLE)
+    names = {f'#f{i}': name for i, name in enumerate(results)}
+    values = {f':v{i}': value for i, value in enumerate(results.values())}
+    values[':status'] = 'processed'
+    update_expression = 'SET processing_status = :status, ' + ', '.join(f'#f{i} = :v{i}' for i in range(len(results)))
+
+    document_ids = list(dict.fromkeys([*document_ids, *get_document_ids(content_hash)]))
+    for document_id in document_ids:
+        table.update_item(
+            Key={'document_id': document_id},
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+    logger.info(f"Content {content_hash} processed; updated {len(document_ids)} document(s)")
+    return document_ids
+
+def get_documents(document_ids):
+    """
+    Load document records in batches
+    """
+    documents = []
+    for start in range(0, len(document_ids), 100):
+        request = {DOCUMENTS_TABLE: {'Keys': [{'document_id': document_id} for document_id in document_ids[start:start + 100]]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            documents.extend(response.get('Responses', {}).get(DOCUMENTS_TABLE, []))
+            request = response.get('UnprocessedKeys')
+    return documents
+
+def publish_text(content_hash, results, text, documents=()):
+    """
+    Record extracted text for some content and index every document
+    referencing it
+
+    Args:
+        content_hash (str): SHA-256 hex digest
+        results (dict): Result fields (see RESULT_FIELDS)
+        text (str): Extracted document text
+        documents (list): Document records already known to reference the
+            content (such as the upload being registered); they are updated
+            and indexed by key, the index only supplies the others
+
+    Returns:
+        list: IDs of the documents that were updated
+    """
+    known = {document['document_id']: document for document in documents}
+    document_ids = mark_processed(content_hash, results, list(known))
+    documents = list(known.values()) + get_documents([document_id for document_id in document_ids if document_id not in known])
+
+    # Every document gets its own rows, but the text is embedded only once
+    embedded_chunks = None
+    if documents and vector_index.is_configured():
+        try:
+            embedded_chunks = vector_index.embed_document(text)
+        except Exception as e:
+            logger.warning(f"Embedding failed for content {content_hash}: {str(e)}")
+
+    for document in documents:
+        index_document(document, text, embedded_chunks)
+    return document_ids
+
+def index_document(document, text, embedded_chunks=None):
+    """
+    Add a processed document to the similarity and semantic search indexes
+
+    Args:
+        document (dict): Document record
+        text (str): Processed document text
+        embedded_chunks (list): vector_index.embed_document(text), shared by
+            the documents of one content; semantic indexing is skipped when
+            it is None
+    """
+    try:
+        similarity_index.index_document_text(document, text)
+    except ClientError as e:
+        logger.warning(f"Similarity indexing failed for document {document['document_id']}: {str(e)}")
+
+    if embedded_chunks is not None:
+        try:
+            vector_index.index_document(
+                document['document_id'],
+                document['user_id'],
+                document.get('workflow_name'),
+                text,
+                embedded_chunks
+            )
+        except Exception as e:
+            logger.warning(f"Vector indexing failed for document {document['document_id']}: {str(e)}")
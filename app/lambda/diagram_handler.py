@@ -4,29 +4,31 @@ Integrates with SageMaker for AI-powered diagram generation from workflow docume
 """
 
 import json
-import boto3
+import aws_clients
 import os
 from datetime import datetime
 from botocore.exceptions import ClientError
 import logging
+import event_publisher
+import http_api
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-s3_client = boto3.client('s3')
-sagemaker_runtime = boto3.client('sagemaker-runtime')
-eventbridge_client = boto3.client('events')
+# AWS clients, created on first use
+dynamodb = aws_clients.lazy_resource('dynamodb')
+s3_client = aws_clients.lazy_client('s3')
+sagemaker_runtime = aws_clients.lazy_client('sagemaker-runtime')
 
 # Environment variables
 DOCUMENTS_TABLE = os.environ.get('DOCUMENTS_TABLE', 'vpflow-documents')
 DIAGRAMS_TABLE = os.environ.get('DIAGRAMS_TABLE', 'vpflow-diagrams')
 BUCKET_NAME = os.environ.get('DOCUMENT_BUCKET', 'vpflow-documents')
 SAGEMAKER_ENDPOINT = os.environ.get('SAGEMAKER_DIAGRAM_ENDPOINT', 'vpflow-diagram-generator')
-EVENT_BUS_NAME = os.environ.get('EVENT_BUS_NAME', 'vpflow-events')
 
+@http_api.handler(client_error_message='Failed to generate diagram')
+@event_publisher.flush_after
 def lambda_handler(event, context):
     """
     Handle diagram generation requests
@@ -38,76 +40,47 @@ def lambda_handler(event, context):
     Returns:
         dict: Response with status code and body containing diagram data
     """
-    try:
-        # Parse the request
-        if 'body' in event:
-            body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
-        else:
-            body = event
-        
-        # Extract parameters
-        user_id = body.get('userId')
-        document_id = body.get('documentId')
-        diagram_type = body.get('diagramType', 'swimlane')  # swimlane, flowchart, etc.
-        customization = body.get('customization', {})
-        workflow_text = body.get('workflowText')  # Optional: direct text input
-        
-        if not user_id or (not document_id and not workflow_text):
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Missing required fields: userId and (documentId or workflowText)'
-                })
-            }
-        
-        # Get document content if document_id is provided
-        document_content = None
-        document = None
-        
-        if document_id:
+    body = http_api.parse_body(event)
+    
+    # Extract parameters
+    user_id = body.get('userId')
+    document_id = body.get('documentId')
+    diagram_type = body.get('diagramType', 'swimlane')  # swimlane, flowchart, etc.
+    customization = body.get('customization', {})
+    workflow_text = body.get('workflowText')  # Optional: direct text input
+    
+    if not user_id or (not document_id and not workflow_text):
+        raise http_api.HttpError(400, 'Missing required fields: userId and (documentId or workflowText)')
+    
+    # Get document content if document_id is provided
+    document_content = None
+    document = None
+    
+    if document_id:
+        with http_api.timer('document'):
             document = get_document(document_id, user_id)
             if not document:
-                return {
-                    'statusCode': 404,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'error': 'Document not found or access denied'
-                    })
-                }
+                raise http_api.HttpError(404, 'Document not found or access denied')
             
             # Get processed text from document
             document_content = get_document_text_content(document)
-        
-        # Use provided workflow text or document content
-        workflow_content = workflow_text or document_content
-        
-        if not workflow_content:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'No workflow content available for diagram generation'
-                })
-            }
-        
-        # Generate diagram using AI
+    
+    # Use provided workflow text or document content
+    workflow_content = workflow_text or document_content
+    
+    if not workflow_content:
+        raise http_api.HttpError(400, 'No workflow content available for diagram generation')
+    
+    # Generate diagram using AI
+    with http_api.timer('generate'):
         diagram_data = generate_diagram_with_ai(
             workflow_content, 
             diagram_type, 
             customization
         )
-        
-        # Save diagram to database
+    
+    # Save diagram to database
+    with http_api.timer('save'):
         diagram_id = save_diagram(
             user_id=user_id,
             document_id=document_id,
@@ -116,52 +89,17 @@ def lambda_handler(event, context):
             workflow_content=workflow_content[:1000],  # Store first 1000 chars as preview
             customization=customization
         )
-        
-        # Trigger post-processing events
-        trigger_diagram_events(diagram_id, user_id, document_id, diagram_type)
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'success': True,
-                'diagram_id': diagram_id,
-                'diagram_data': diagram_data,
-                'diagram_type': diagram_type,
-                'message': 'Diagram generated successfully'
-            })
-        }
-        
-    except ClientError as e:
-        logger.error(f"AWS service error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': 'Failed to generate diagram',
-                'details': str(e)
-            })
-        }
-        
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error',
-                'details': str(e)
-            })
-        }
+    
+    # Trigger post-processing events
+    trigger_diagram_events(diagram_id, user_id, document_id, diagram_type)
+    
+    # Diagram data is the large payload; http_api compresses it for clients that accept it
+    return http_api.success_response({
+        'diagram_id': diagram_id,
+        'diagram_data': diagram_data,
+        'diagram_type': diagram_type,
+        'message': 'Diagram generated successfully'
+    })
 
 def get_document(document_id, user_id):
     """
@@ -425,24 +363,17 @@ def save_diagram(user_id, document_id, diagram_type, diagram_data, workflow_cont
 def trigger_diagram_events(diagram_id, user_id, document_id, diagram_type):
     """
     Trigger events for diagram post-processing
+    
+    The event is buffered and sent in a batch when the invocation ends
     """
     try:
-        eventbridge_client.put_events(
-            Entries=[
-                {
-                    'Source': 'vpflow.diagram',
-                    'DetailType': 'Diagram Generated',
-                    'Detail': json.dumps({
-                        'diagram_id': diagram_id,
-                        'user_id': user_id,
-                        'document_id': document_id,
-                        'diagram_type': diagram_type,
-                        'timestamp': datetime.utcnow().isoformat()
-                    }),
-                    'EventBusName': EVENT_BUS_NAME
-                }
-            ]
-        )
+        event_publisher.publish('vpflow.diagram', 'Diagram Generated', {
+            'diagram_id': diagram_id,
+            'user_id': user_id,
+            'document_id': document_id,
+            'diagram_type': diagram_type,
+            'timestamp': datetime.utcnow().isoformat()
+        })
         
     except Exception as e:
         logger.warning(f"Failed to trigger diagram events: {str(e)}")
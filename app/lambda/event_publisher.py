@@ -0,0 +1,209 @@
+"""
+Batched EventBridge publishing
+Handlers buffer events with publish() instead of calling put_events per
+event; the buffer is sent up to 10 entries per PutEvents call and entries
+that fail (throttling, internal errors) are retried with backoff. Lambda
+handlers flush once at the end of the invocation (see flush_after);
+long-running services call start_background() to flush off the request
+thread.
+"""
+
+import os
+import json
+import time
+import random
+import atexit
+import logging
+import threading
+import functools
+import aws_clients
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Environment variables
+EVENT_BUS_NAME = os.environ.get('EVENT_BUS_NAME', 'vpflow-events')
+
+# PutEvents limits
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+DEFAULT_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.1
+
+def entry_size(entry):
+    """Approximate size EventBridge counts against MAX_BATCH_BYTES"""
+    size = 14  # Time
+    for field in ('Source', 'DetailType', 'Detail', 'EventBusName'):
+        if entry.get(field):
+            size += len(entry[field].encode('utf-8'))
+    for resource in entry.get('Resources', []):
+        size += len(resource.encode('utf-8'))
+    return size
+
+def make_batches(entries):
+    """Split entries into PutEvents batches by count and size"""
+    batch, batch_bytes = [], 0
+    for entry in entries:
+        size = entry_size(entry)
+        if batch and (len(batch) == MAX_BATCH_ENTRIES or batch_bytes + size > MAX_BATCH_BYTES):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(entry)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+class EventPublisher:
+    """
+    Buffer of EventBridge entries sent in batches
+
+    Thread-safe: any thread may publish() while another flushes.
+    """
+
+    def __init__(self, events_client=None, event_bus_name=EVENT_BUS_NAME, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self._client = events_client
+        self.event_bus_name = event_bus_name
+        self.max_attempts = max_attempts
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = aws_clients.client('events')
+        return self._client
+
+    def publish(self, source, detail_type, detail, event_bus_name=None):
+        """
+        Buffer one event
+
+        Args:
+            source (str): Event source, e.g. 'vpflow.document'
+            detail_type (str): Event detail type
+            detail (dict | str): Event detail, serialized to JSON if needed
+            event_bus_name (str): Bus to publish to (defaults to the publisher's)
+        """
+        entry = {
+            'Source': source,
+            'DetailType': detail_type,
+            'Detail': detail if isinstance(detail, str) else json.dumps(detail),
+            'EventBusName': event_bus_name or self.event_bus_name
+        }
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= MAX_BATCH_ENTRIES
+        if full and self._thread is not None:
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self):
+        """
+        Send every buffered event
+
+        Returns:
+            int: Number of events that could not be delivered
+        """
+        with self._flush_lock:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+            failed = 0
+            for batch in make_batches(entries):
+                failed += self._send(batch)
+            return failed
+
+    def _send(self, entries):
+        """Send one batch, retrying the entries that failed"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = self.client.put_events(Entries=entries)
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error(f"Dropping {len(entries)} events after {attempt} attempts: {str(e)}")
+                    return len(entries)
+                logger.warning(f"PutEvents failed (attempt {attempt}): {str(e)}")
+            else:
+                if not response.get('FailedEntryCount'):
+                    return 0
+                # Results are in request order; failed ones carry an ErrorCode
+                failures = [
+                    (entry, result) for entry, result in zip(entries, response['Entries'])
+                    if result.get('ErrorCode')
+                ]
+                entries = [entry for entry, _ in failures]
+                if attempt == self.max_attempts:
+                    for entry, result in failures:
+                        logger.error(
+                            f"Dropping {entry['Source']} event after {attempt} attempts: "
+                            f"{result['ErrorCode']} {result.get('ErrorMessage', '')}"
+                        )
+                    return len(entries)
+                logger.warning(f"{len(entries)} of {len(response['Entries'])} events failed (attempt {attempt}), retrying")
+            time.sleep(RETRY_BASE_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        return len(entries)
+
+    def start_background(self, interval=1.0):
+        """
+        Flush from a daemon thread every interval seconds, or as soon as a
+        full batch is buffered; remaining events are flushed at exit
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='event-publisher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Background event flush failed: {str(e)}")
+
+    def stop(self):
+        """Stop the background thread and flush what is left"""
+        if self._thread is not None:
+            self._stop.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+# Process-wide publisher shared by the handlers
+publisher = EventPublisher()
+
+def publish(source, detail_type, detail, event_bus_name=None):
+    """Buffer an event on the shared publisher"""
+    publisher.publish(source, detail_type, detail, event_bus_name)
+
+def flush():
+    return publisher.flush()
+
+def flush_after(handler):
+    """
+    Decorate a Lambda handler to flush buffered events once it returns
+
+    Events are sent after the response is built but before the invocation
+    ends, so they are never lost to a frozen execution environment.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            try:
+                publisher.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush events: {str(e)}")
+    return wrapper
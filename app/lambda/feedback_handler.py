@@ -3,29 +3,29 @@ Lambda function for handling user feedback submission and processing
 Integrates with DynamoDB for feedback storage and SageMaker for learning loop
 """
 
-import json
-import boto3
+import aws_clients
 import uuid
 import os
 from datetime import datetime
-from botocore.exceptions import ClientError
 import logging
+import event_publisher
+import http_api
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-eventbridge_client = boto3.client('events')
-s3_client = boto3.client('s3')
+# AWS clients, created on first use
+dynamodb = aws_clients.lazy_resource('dynamodb')
+s3_client = aws_clients.lazy_client('s3')
 
 # Environment variables
 FEEDBACKS_TABLE = os.environ.get('FEEDBACKS_TABLE', 'vpflow-feedbacks')
 DIAGRAMS_TABLE = os.environ.get('DIAGRAMS_TABLE', 'vpflow-diagrams')
-EVENT_BUS_NAME = os.environ.get('EVENT_BUS_NAME', 'vpflow-events')
 BUCKET_NAME = os.environ.get('DOCUMENT_BUCKET', 'vpflow-documents')
 
+@http_api.handler(client_error_message='Failed to submit feedback')
+@event_publisher.flush_after
 def lambda_handler(event, context):
     """
     Handle feedback submission requests
@@ -37,52 +37,38 @@ def lambda_handler(event, context):
     Returns:
         dict: Response with status code and body
     """
-    try:
-        # Parse the request
-        if 'body' in event:
-            body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
-        else:
-            body = event
-        
-        # Extract feedback data
-        user_id = body.get('userId')
-        feedback_type = body.get('feedbackType', 'general')  # general, diagram, painpoint, suggestion
-        content = body.get('content', '')
-        title = body.get('title', 'User Feedback')
-        
-        # Optional references
-        diagram_id = body.get('diagramId')
-        document_id = body.get('documentId')
-        workflow_step_id = body.get('workflowStepId')
-        
-        # Feedback details
-        rating = body.get('rating')  # 1-5 scale
-        category = body.get('category', 'improvement')  # improvement, bug, complaint, suggestion
-        priority = body.get('priority', 'medium')  # low, medium, high
-        tags = body.get('tags', [])
-        
-        if not user_id or not content:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Missing required fields: userId or content'
-                })
-            }
-        
-        # Generate feedback ID
-        feedback_id = str(uuid.uuid4())
-        
-        # Get user info for feedback context
-        user_info = get_user_context(user_id)
-        
-        # Process and analyze feedback content
-        feedback_analysis = analyze_feedback_content(content, feedback_type)
-        
-        # Save feedback to database
+    body = http_api.parse_body(event)
+    
+    # Extract feedback data
+    user_id = body.get('userId')
+    feedback_type = body.get('feedbackType', 'general')  # general, diagram, painpoint, suggestion
+    content = body.get('content', '')
+    title = body.get('title', 'User Feedback')
+    
+    # Optional references
+    diagram_id = body.get('diagramId')
+    document_id = body.get('documentId')
+    workflow_step_id = body.get('workflowStepId')
+    
+    # Feedback details
+    rating = body.get('rating')  # 1-5 scale
+    category = body.get('category', 'improvement')  # improvement, bug, complaint, suggestion
+    priority = body.get('priority', 'medium')  # low, medium, high
+    tags = body.get('tags', [])
+    
+    http_api.require_fields(body, ['userId', 'content'], 'Missing required fields: userId or content')
+    
+    # Generate feedback ID
+    feedback_id = str(uuid.uuid4())
+    
+    # Get user info for feedback context
+    user_info = get_user_context(user_id)
+    
+    # Process and analyze feedback content
+    feedback_analysis = analyze_feedback_content(content, feedback_type)
+    
+    # Save feedback to database
+    with http_api.timer('save'):
         feedback_record = save_feedback(
             feedback_id=feedback_id,
             user_id=user_id,
@@ -99,60 +85,24 @@ def lambda_handler(event, context):
             workflow_step_id=workflow_step_id,
             analysis=feedback_analysis
         )
-        
-        # Update related records if applicable
-        if diagram_id:
-            update_diagram_feedback(diagram_id, feedback_id, rating, category)
-        
-        # Trigger feedback processing events
-        trigger_feedback_events(feedback_record)
-        
-        # Generate auto-response or suggestions if applicable
-        auto_response = generate_auto_response(feedback_record)
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'success': True,
-                'feedback_id': feedback_id,
-                'status': 'received',
-                'message': 'Feedback submitted successfully',
-                'auto_response': auto_response,
-                'estimated_response_time': get_estimated_response_time(priority, category)
-            })
-        }
-        
-    except ClientError as e:
-        logger.error(f"AWS service error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': 'Failed to submit feedback',
-                'details': str(e)
-            })
-        }
-        
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error',
-                'details': str(e)
-            })
-        }
+    
+    # Update related records if applicable
+    if diagram_id:
+        update_diagram_feedback(diagram_id, feedback_id, rating, category)
+    
+    # Trigger feedback processing events
+    trigger_feedback_events(feedback_record)
+    
+    # Generate auto-response or suggestions if applicable
+    auto_response = generate_auto_response(feedback_record)
+    
+    return http_api.success_response({
+        'feedback_id': feedback_id,
+        'status': 'received',
+        'message': 'Feedback submitted successfully',
+        'auto_response': auto_response,
+        'estimated_response_time': get_estimated_response_time(priority, category)
+    })
 
 def get_user_context(user_id):
     """
@@ -383,26 +333,19 @@ def update_diagram_feedback(diagram_id, feedback_id, rating, category):
 def trigger_feedback_events(feedback_record):
     """
     Trigger events for feedback processing
+    
+    The event is buffered and sent in a batch when the invocation ends
     """
     try:
-        eventbridge_client.put_events(
-            Entries=[
-                {
-                    'Source': 'vpflow.feedback',
-                    'DetailType': 'Feedback Submitted',
-                    'Detail': json.dumps({
-                        'feedback_id': feedback_record['feedback_id'],
-                        'user_id': feedback_record['user_id'],
-                        'feedback_type': feedback_record['feedback_type'],
-                        'category': feedback_record['category'],
-                        'priority': feedback_record['priority'],
-                        'urgency_score': feedback_record['analysis'].get('urgency_score', 0),
-                        'timestamp': feedback_record['created_timestamp']
-                    }),
-                    'EventBusName': EVENT_BUS_NAME
-                }
-            ]
-        )
+        event_publisher.publish('vpflow.feedback', 'Feedback Submitted', {
+            'feedback_id': feedback_record['feedback_id'],
+            'user_id': feedback_record['user_id'],
+            'feedback_type': feedback_record['feedback_type'],
+            'category': feedback_record['category'],
+            'priority': feedback_record['priority'],
+            'urgency_score': feedback_record['analysis'].get('urgency_score', 0),
+            'timestamp': feedback_record['created_timestamp']
+        })
         
     except Exception as e:
         logger.warning(f"Failed to trigger feedback events: {str(e)}")
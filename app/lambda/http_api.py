@@ -0,0 +1,283 @@
+"""
+Shared request/response layer for the API Gateway handlers
+Parses request bodies, routes actions, validates required fields and builds
+CORS JSON responses. Serialization uses orjson when it is installed and
+handles DynamoDB Decimal values, datetimes and sets either way. Large
+responses are compressed (br or gzip, per Accept-Encoding) and every
+invocation logs its timing, also returned in a Server-Timing header.
+
+    @http_api.handler(client_error_message='Failed to generate diagram')
+    def lambda_handler(event, context):
+        body = http_api.parse_body(event)
+        http_api.require_fields(body, ['userId'])
+        with http_api.timer('generate'):
+            ...
+        return http_api.success_response({...})
+"""
+
+import os
+import json
+import gzip
+import time
+import base64
+import logging
+import datetime
+import functools
+import threading
+from decimal import Decimal
+from botocore.exceptions import ClientError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Environment variables
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '4096'))
+CORS_ALLOW_ORIGIN = os.environ.get('CORS_ALLOW_ORIGIN', '*')
+
+class HttpError(Exception):
+    """Raised by handler code to return an error response"""
+
+    def __init__(self, status_code, message, details=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.details = details
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        # DynamoDB returns every number as Decimal
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode('ascii')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if orjson is not None:
+    def dumps_bytes(obj):
+        """Serialize to UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps(obj):
+        """Serialize to a JSON string"""
+        return dumps_bytes(obj).decode('utf-8')
+
+    loads = orjson.loads
+else:
+    def dumps(obj):
+        """Serialize to a JSON string"""
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps_bytes(obj):
+        """Serialize to UTF-8 JSON bytes"""
+        return dumps(obj).encode('utf-8')
+
+    loads = json.loads
+
+def parse_body(event):
+    """
+    Request body of an API Gateway event, or the event itself for direct
+    invocations
+
+    Raises:
+        HttpError: 400 if the body is not a JSON object
+    """
+    if 'body' not in event:
+        return event
+    body = event['body']
+    if body is None or body == '':
+        return {}
+    if isinstance(body, dict):
+        return body
+    try:
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(body)
+        body = loads(body)
+    except ValueError as e:
+        raise HttpError(400, 'Invalid JSON body', str(e))
+    if not isinstance(body, dict):
+        raise HttpError(400, 'Request body must be a JSON object')
+    return body
+
+def require_fields(body, fields, message=None):
+    """
+    Raises:
+        HttpError: 400 naming the missing fields (or with message)
+    """
+    missing = [field for field in fields if body.get(field) in (None, '')]
+    if missing:
+        raise HttpError(400, message or f"Missing required fields: {', '.join(missing)}")
+
+class Router:
+    """
+    Dispatch on a body field, e.g. {"action": "login"}
+
+        router = http_api.Router(default='login')
+
+        @router.route('login')
+        def handle_login(body): ...
+    """
+
+    def __init__(self, default=None, field='action'):
+        self.default = default
+        self.field = field
+        self.routes = {}
+
+    def route(self, name):
+        def register(fn):
+            self.routes[name] = fn
+            return fn
+        return register
+
+    def dispatch(self, body, *args):
+        name = body.get(self.field, self.default)
+        fn = self.routes.get(name)
+        if fn is None:
+            raise HttpError(400, f"Invalid {self.field}")
+        _current.route = name
+        return fn(body, *args)
+
+def response(status_code, body, headers=None):
+    """JSON response with CORS headers"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': CORS_ALLOW_ORIGIN,
+            **(headers or {})
+        },
+        'body': dumps(body)
+    }
+
+def success_response(data, status_code=200):
+    return response(status_code, {'success': True, **data})
+
+def error_response(status_code, message, details=None):
+    body = {'success': False, 'error': message}
+    if details:
+        body['details'] = details
+    return response(status_code, body)
+
+def accepted_encodings(event):
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'accept-encoding' and value:
+            return {part.split(';')[0].strip().lower() for part in value.split(',')}
+    return set()
+
+def compress_response(result, event):
+    """
+    Compress a response body when the client accepts it and it is large
+
+    API Gateway passes the base64 body through as binary (the API lists
+    application/json under BinaryMediaTypes, so JSON request bodies arrive
+    base64-encoded too; parse_body decodes them).
+    """
+    body = result.get('body')
+    if not isinstance(body, str) or result.get('isBase64Encoded'):
+        return result
+    data = body.encode('utf-8')
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return result
+
+    encodings = accepted_encodings(event)
+    if 'br' in encodings and brotli is not None:
+        encoding, compressed = 'br', brotli.compress(data, quality=4)
+    elif 'gzip' in encodings:
+        encoding, compressed = 'gzip', gzip.compress(data, compresslevel=5)
+    else:
+        return result
+
+    result['body'] = base64.b64encode(compressed).decode('ascii')
+    result['isBase64Encoded'] = True
+    result['headers'] = {**result.get('headers', {}), 'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'}
+    return result
+
+# Per-invocation state (route name and timings)
+_current = threading.local()
+
+class timer:
+    """Time a step of the current invocation: with http_api.timer('query'): ..."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        timings = getattr(_current, 'timings', None)
+        if timings is not None:
+            timings.append((self.name, (time.perf_counter() - self.start) * 1000))
+        return False
+
+def handler(client_error_message='Request failed', error_message='Internal server error'):
+    """
+    Decorate an API Gateway Lambda handler
+
+    HttpError becomes its error response, botocore ClientError a 500 with
+    client_error_message and any other exception a 500 with error_message.
+    Responses are compressed when worthwhile, and the invocation's status,
+    route, size and timings are logged as one JSON line and returned in a
+    Server-Timing header. Results that are not HTTP responses (e.g. from S3
+    event invocations) are passed through.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            _current.route = None
+            _current.timings = []
+            start = time.perf_counter()
+            try:
+                result = fn(event, context)
+            except HttpError as e:
+                result = error_response(e.status_code, e.message, e.details)
+            except ClientError as e:
+                logger.error(f"AWS service error: {str(e)}")
+                result = error_response(500, client_error_message, str(e))
+            except Exception as e:
+                logger.exception(f"Unexpected error: {str(e)}")
+                result = error_response(500, error_message, str(e))
+
+            if not isinstance(result, dict) or 'statusCode' not in result:
+                return result
+
+            handler_ms = (time.perf_counter() - start) * 1000
+            raw_bytes = len(result['body']) if isinstance(result.get('body'), str) else 0
+            result = compress_response(result, event)
+            total_ms = (time.perf_counter() - start) * 1000
+
+            timings = _current.timings
+            server_timing = [f"{name};dur={ms:.1f}" for name, ms in timings]
+            server_timing.append(f"app;dur={total_ms:.1f}")
+            result['headers'] = {**result.get('headers', {}), 'Server-Timing': ', '.join(server_timing)}
+
+            logger.info(dumps({
+                'handler': fn.__module__,
+                'route': _current.route,
+                'status': result['statusCode'],
+                'handler_ms': round(handler_ms, 1),
+                'total_ms': round(total_ms, 1),
+                'timings': {name: round(ms, 1) for name, ms in timings},
+                'body_bytes': raw_bytes,
+                'encoding': result['headers'].get('Content-Encoding'),
+                'request_id': getattr(context, 'aws_request_id', None)
+            }))
+            return result
+        return wrapper
+    return decorate
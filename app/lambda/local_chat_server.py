@@ -0,0 +1,108 @@
+"""
+Local stand-in for the chatbot's streaming gateway
+Serves chatbot_handler over HTTP for development: POST /chat/stream streams
+the answer as Server-Sent Events with the same frames the WebSocket API
+sends, and POST /chat returns the REST API's JSON response.
+
+    python local_chat_server.py --port 8765
+    curl -N -X POST localhost:8765/chat/stream \
+        -d '{"userId": "u1", "threadId": "t1", "message": "hello"}'
+"""
+
+import base64
+import argparse
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import http_api
+import chatbot_handler
+
+logger = logging.getLogger()
+
+def sse_frame(frame):
+    """Encode a frame as one Server-Sent Event"""
+    return f"event: {frame['type']}\ndata: {http_api.dumps(frame)}\n\n".encode('utf-8')
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length).decode('utf-8') if length else ''
+
+    def do_POST(self):
+        if self.path == '/chat/stream':
+            self.stream()
+        elif self.path == '/chat':
+            self.respond()
+        else:
+            self.send_error(404)
+
+    def respond(self):
+        event = {'body': self._read_body(), 'headers': dict(self.headers)}
+        result = chatbot_handler.lambda_handler(event, None)
+        # Compressed responses come back base64-encoded, as API Gateway expects
+        if result.get('isBase64Encoded'):
+            body = base64.b64decode(result['body'])
+        else:
+            body = result['body'].encode('utf-8')
+        self.send_response(result['statusCode'])
+        for name, value in result['headers'].items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self):
+        try:
+            body = http_api.parse_body({'body': self._read_body()})
+            http_api.require_fields(
+                body, ['userId', 'threadId', 'message'], 'Missing required fields: userId, threadId, or message'
+            )
+        except http_api.HttpError as e:
+            self.send_error(e.status_code, e.message)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send(frame):
+            data = sse_frame(frame)
+            try:
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        chatbot_handler.stream_chat(
+            send,
+            user_id=body['userId'],
+            thread_id=body['threadId'],
+            message=body['message'],
+            context_type=body.get('contextType', 'general'),
+            context_id=body.get('contextId')
+        )
+        try:
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the chatbot handler locally with SSE streaming.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = ThreadingHTTPServer((args.host, args.port), ChatRequestHandler)
+    logger.info(f"Chat server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
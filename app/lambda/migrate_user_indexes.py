@@ -0,0 +1,125 @@
+"""
+Migration script for the users table lookup indexes
+Adds the username/email global secondary indexes used by auth_handler to an
+existing users table and normalizes stored usernames and emails to lower case
+"""
+
+import argparse
+import time
+import boto3
+import logging
+from botocore.exceptions import ClientError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+logger = logging.getLogger(__name__)
+
+# Index name -> key attribute (must match auth_handler and template.yaml)
+USER_INDEXES = {
+    'username-index': 'username',
+    'email-index': 'email'
+}
+
+def wait_for_index(client, table_name, index_name, poll_seconds=15):
+    """
+    Wait until an index has finished backfilling
+    """
+    while True:
+        table = client.describe_table(TableName=table_name)['Table']
+        indexes = {index['IndexName']: index for index in table.get('GlobalSecondaryIndexes', [])}
+        index = indexes.get(index_name)
+        if index and index['IndexStatus'] == 'ACTIVE' and not index.get('Backfilling'):
+            logger.info(f"Index {index_name} is ACTIVE")
+            return
+
+        status = index['IndexStatus'] if index else 'MISSING'
+        logger.info(f"Index {index_name} status: {status}. Waiting {poll_seconds}s...")
+        time.sleep(poll_seconds)
+
+def create_missing_indexes(client, table_name):
+    """
+    Create the lookup indexes that do not exist yet
+
+    DynamoDB only allows one index creation per UpdateTable call, so indexes are
+    created and backfilled one at a time.
+    """
+    table = client.describe_table(TableName=table_name)['Table']
+    existing = {index['IndexName'] for index in table.get('GlobalSecondaryIndexes', [])}
+    on_demand = table.get('BillingModeSummary', {}).get('BillingMode') == 'PAY_PER_REQUEST'
+
+    for index_name, attribute in USER_INDEXES.items():
+        if index_name in existing:
+            logger.info(f"Index {index_name} already exists")
+            wait_for_index(client, table_name, index_name)
+            continue
+
+        create_spec = {
+            'IndexName': index_name,
+            'KeySchema': [{'AttributeName': attribute, 'KeyType': 'HASH'}],
+            'Projection': {'ProjectionType': 'ALL'}
+        }
+        if not on_demand:
+            create_spec['ProvisionedThroughput'] = {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+
+        logger.info(f"Creating index {index_name} on {table_name}")
+        client.update_table(
+            TableName=table_name,
+            AttributeDefinitions=[{'AttributeName': attribute, 'AttributeType': 'S'}],
+            GlobalSecondaryIndexUpdates=[{'Create': create_spec}]
+        )
+        wait_for_index(client, table_name, index_name)
+
+def normalize_users(table_name, dry_run=False):
+    """
+    Lower-case stored usernames and emails so index lookups match login input
+    """
+    table = boto3.resource('dynamodb').Table(table_name)
+    scan_kwargs = {'ProjectionExpression': 'user_id, username, email'}
+    updated = 0
+
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            username = item.get('username')
+            email = item.get('email')
+            if (username is None or username == username.lower()) and (email is None or email == email.lower()):
+                continue
+
+            logger.info(f"Normalizing user {item['user_id']}")
+            if not dry_run:
+                table.update_item(
+                    Key={'user_id': item['user_id']},
+                    UpdateExpression='SET username = :username, email = :email',
+                    ExpressionAttributeValues={
+                        ':username': username.lower() if username else username,
+                        ':email': email.lower() if email else email
+                    }
+                )
+            updated += 1
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+    logger.info(f"Normalized {updated} user(s){' (dry run)' if dry_run else ''}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Add username/email indexes to the VPFlow users table')
+    parser.add_argument('--table', default='vpflow-users', help='Users table name')
+    parser.add_argument('--skip-normalize', action='store_true', help='Do not lower-case usernames and emails')
+    parser.add_argument('--dry-run', action='store_true', help='Only report users that would be normalized')
+    args = parser.parse_args()
+
+    if not args.skip_normalize:
+        normalize_users(args.table, dry_run=args.dry_run)
+
+    if not args.dry_run:
+        try:
+            create_missing_indexes(boto3.client('dynamodb'), args.table)
+        except ClientError as e:
+            logger.error(f"Failed to create indexes: {str(e)}")
+            raise
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+OCR result cache keyed by file content and Textract feature set
+Results live in the document bucket under
+ocr-cache/{sha256}/{features}/ as blocks.ndjson.gz (raw Textract blocks),
+text.txt (page text) and, when the Textract pipeline in app/textract rendered
+one, document.md. The same layout is written by that pipeline's --cache
+option, so either side reuses results the other produced.
+"""
+
+import os
+import gzip
+import json
+import logging
+import tempfile
+import aws_clients
+from botocore.exceptions import ClientError
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# AWS clients, created on first use
+s3_client = aws_clients.lazy_client('s3')
+
+# Environment variables
+OCR_CACHE_PREFIX = os.environ.get('OCR_CACHE_PREFIX', 'ocr-cache/')
+
+# Feature types of analysis jobs started by upload_handler
+ANALYSIS_FEATURES = ('TABLES', 'FORMS')
+
+BLOCKS_FILE = 'blocks.ndjson.gz'
+TEXT_FILE = 'text.txt'
+MARKDOWN_FILE = 'document.md'
+
+def features_key(mode, feature_types=ANALYSIS_FEATURES):
+    """
+    Cache key component for a Textract configuration
+
+    Args:
+        mode (str): 'analysis' or 'detection'
+        feature_types (tuple): Analysis feature types
+
+    Returns:
+        str: e.g. 'DETECTION' or 'ANALYSIS-FORMS+TABLES'
+    """
+    if mode == 'analysis':
+        return 'ANALYSIS-' + '+'.join(sorted(feature_types))
+    return 'DETECTION'
+
+def features_for_api(api):
+    """Cache key component for a Textract completion notification's API"""
+    return features_key('analysis' if api == 'StartDocumentAnalysis' else 'detection')
+
+def cache_key(content_hash, features, name):
+    """S3 key of one cached file"""
+    return f"{OCR_CACHE_PREFIX}{content_hash}/{features}/{name}"
+
+def object_exists(bucket, key):
+    try:
+        s3_client.head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+def lookup(bucket, content_hash, features):
+    """
+    Find cached results for some content
+
+    Returns:
+        dict: Result fields (processed_text_s3_key, markdown_s3_key if
+            cached) or None on a cache miss
+    """
+    text_key = cache_key(content_hash, features, TEXT_FILE)
+    if not object_exists(bucket, text_key):
+        return None
+
+    results = {'processed_text_s3_key': text_key}
+    markdown_key = cache_key(content_hash, features, MARKDOWN_FILE)
+    if object_exists(bucket, markdown_key):
+        results['markdown_s3_key'] = markdown_key
+    return results
+
+def read_text(bucket, key):
+    return s3_client.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8')
+
+class ResultWriter:
+    """
+    Collect a Textract result page by page into the cache
+
+    Blocks are streamed to a gzip file in /tmp and LINE text is kept per page;
+    save() uploads both.
+    """
+
+    def __init__(self, bucket, content_hash, features):
+        self.bucket = bucket
+        self.content_hash = content_hash
+        self.features = features
+        self.pages = {}
+        self._file = tempfile.NamedTemporaryFile(suffix='.ndjson.gz', delete=False)
+        self._blocks = gzip.open(self._file, 'wt', encoding='utf-8')
+
+    def add_blocks(self, blocks):
+        for block in blocks:
+            self._blocks.write(json.dumps(block, ensure_ascii=False, separators=(',', ':')) + '\n')
+            if block['BlockType'] == 'LINE':
+                self.pages.setdefault(block.get('Page', 1), []).append(block.get('Text', ''))
+
+    @property
+    def text(self):
+        """Document text, pages separated by blank lines"""
+        return '\n\n'.join('\n'.join(self.pages[page]) for page in sorted(self.pages))
+
+    def save(self):
+        """
+        Upload the blocks and text
+
+        Returns:
+            tuple: (S3 key of the text, text)
+        """
+        self._blocks.close()
+        self._file.close()
+        try:
+            s3_client.upload_file(
+                self._file.name, self.bucket, cache_key(self.content_hash, self.features, BLOCKS_FILE),
+                ExtraArgs={'ContentType': 'application/gzip'}
+            )
+        finally:
+            os.remove(self._file.name)
+
+        text = self.text
+        text_key = cache_key(self.content_hash, self.features, TEXT_FILE)
+        s3_client.put_object(
+            Bucket=self.bucket,
+            Key=text_key,
+            Body=text.encode('utf-8'),
+            ContentType='text/plain; charset=utf-8'
+        )
+        logger.info(f"Cached OCR result for {self.content_hash} ({self.features})")
+        return text_key, text
@@ -4,26 +4,45 @@ Integrates with Neptune graph database and vector search for intelligent documen
 """
 
 import json
-import boto3
+import base64
+import aws_clients
 import os
 from datetime import datetime
+from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
 import logging
+import vector_index
+import similarity_index
+import http_api
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-s3_client = boto3.client('s3')
+# AWS clients, created on first use
+dynamodb = aws_clients.lazy_resource('dynamodb')
+s3_client = aws_clients.lazy_client('s3')
 
 # Environment variables
 DOCUMENTS_TABLE = os.environ.get('DOCUMENTS_TABLE', 'vpflow-documents')
 WORKFLOWS_TABLE = os.environ.get('WORKFLOWS_TABLE', 'vpflow-workflows')
 BUCKET_NAME = os.environ.get('DOCUMENT_BUCKET', 'vpflow-documents')
 NEPTUNE_ENDPOINT = os.environ.get('NEPTUNE_ENDPOINT')
+DOCUMENTS_USER_INDEX = os.environ.get('DOCUMENTS_USER_INDEX', 'user-workflow-index')
+# user-workflow-index is sparse (documents without a workflow_name are not in
+# it), so listings without a workflow filter use the user-id-index
+DOCUMENTS_USER_ID_INDEX = os.environ.get('DOCUMENTS_USER_ID_INDEX', 'user-id-index')
 
+# Items read per query page; filtered searches keep paging until limit matches
+QUERY_PAGE_SIZE = 100
+MAX_LIMIT = 100
+
+# Minimum cosine similarity for semantic search results
+SEMANTIC_MIN_SCORE = float(os.environ.get('SEMANTIC_MIN_SCORE', '0.3'))
+# Minimum estimated Jaccard similarity for similar-document results
+SIMILARITY_MIN_SCORE = float(os.environ.get('SIMILARITY_MIN_SCORE', '0.3'))
+
+@http_api.handler(client_error_message='Failed to retrieve documents')
 def lambda_handler(event, context):
     """
     Handle document retrieval requests
@@ -35,230 +54,355 @@ def lambda_handler(event, context):
     Returns:
         dict: Response with status code and body containing retrieved documents
     """
+    body = http_api.parse_body(event)
+    
+    # Extract search parameters
+    user_id = body.get('userId')
+    search_query = body.get('query', '')
+    search_type = body.get('searchType', 'semantic')  # semantic, keyword, or similarity
+    limit = body.get('limit', 10)
+    workflow_filter = body.get('workflowFilter')
+    next_token = body.get('nextToken')
+    
+    http_api.require_fields(body, ['userId'], 'Missing required field: userId')
+    
     try:
-        # Parse the request
-        if 'body' in event:
-            body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
-        else:
-            body = event
-        
-        # Extract search parameters
-        user_id = body.get('userId')
-        search_query = body.get('query', '')
-        search_type = body.get('searchType', 'semantic')  # semantic, keyword, or similarity
-        limit = body.get('limit', 10)
-        workflow_filter = body.get('workflowFilter')
-        
-        if not user_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Missing required field: userId'
-                })
-            }
-        
-        documents = []
-        
+        limit = min(max(int(limit), 1), MAX_LIMIT)
+        start_key = decode_continuation_token(next_token)
+    except (TypeError, ValueError) as e:
+        raise http_api.HttpError(400, f'Invalid pagination parameters: {str(e)}')
+    
+    documents = []
+    last_key = None
+    
+    with http_api.timer(search_type):
         if search_type == 'semantic' and search_query:
             # Perform semantic search using vector embeddings
-            documents = perform_semantic_search(user_id, search_query, limit, workflow_filter)
+            documents, last_key = perform_semantic_search(user_id, search_query, limit, workflow_filter, start_key)
         elif search_type == 'keyword' and search_query:
             # Perform keyword-based search
-            documents = perform_keyword_search(user_id, search_query, limit, workflow_filter)
+            documents, last_key = perform_keyword_search(user_id, search_query, limit, workflow_filter, start_key)
         elif search_type == 'similarity' and body.get('documentId'):
             # Find similar documents
-            documents = find_similar_documents(user_id, body['documentId'], limit)
+            documents, last_key = find_similar_documents(user_id, body['documentId'], limit, start_key)
         else:
             # Return all user documents if no specific search
-            documents = get_user_documents(user_id, limit, workflow_filter)
-        
-        # Enrich documents with additional metadata
+            documents, last_key = get_user_documents(user_id, limit, workflow_filter, start_key)
+    
+    # Enrich documents with additional metadata
+    with http_api.timer('enrich'):
         enriched_documents = []
         for doc in documents:
             enriched_doc = enrich_document_metadata(doc)
             enriched_documents.append(enriched_doc)
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'success': True,
-                'documents': enriched_documents,
-                'total_count': len(enriched_documents),
-                'search_query': search_query,
-                'search_type': search_type
-            })
-        }
-        
-    except ClientError as e:
-        logger.error(f"AWS service error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': 'Failed to retrieve documents',
-                'details': str(e)
-            })
-        }
-        
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error',
-                'details': str(e)
-            })
-        }
+    
+    # Documents carry DynamoDB Decimal values, which http_api serializes
+    return http_api.success_response({
+        'documents': enriched_documents,
+        'total_count': len(enriched_documents),
+        'search_query': search_query,
+        'search_type': search_type,
+        'next_token': encode_continuation_token(last_key)
+    })
 
-def perform_semantic_search(user_id, query, limit, workflow_filter=None):
+def perform_semantic_search(user_id, query, limit, workflow_filter=None, start_key=None):
     """
     Perform semantic search using vector embeddings
-    This would integrate with Neptune for graph-based semantic search
+    Ranks the user's documents by embedding similarity of their processed text
+    (see vector_index.py), falling back to metadata matching when the vector
+    index is not configured or unavailable
+    
+    Returns:
+        tuple: (matching documents, LastEvaluatedKey to resume from or None)
     """
+    if vector_index.is_configured() and not start_key:
+        try:
+            matches = vector_index.search_documents(
+                user_id, query, limit,
+                min_score=SEMANTIC_MIN_SCORE,
+                workflow_filter=workflow_filter
+            )
+            # Ranked results are returned in a single page
+            return get_documents_by_ids(user_id, matches), None
+            
+        except Exception as e:
+            logger.error(f"Vector search failed, falling back to metadata search: {str(e)}")
+    
     try:
-        # For now, implement a basic text search until Neptune is configured
-        # In production, this would use vector embeddings and Neptune queries
-        
-        table = dynamodb.Table(DOCUMENTS_TABLE)
+        filter_condition = Attr('workflow_name').contains(query) | Attr('file_name').contains(query)
         
-        # Build filter expression
-        filter_expression = "user_id = :user_id AND (contains(workflow_name, :query) OR contains(file_name, :query))"
-        expression_values = {
-            ':user_id': user_id,
-            ':query': query
-        }
-        
-        if workflow_filter:
-            filter_expression += " AND workflow_name = :workflow"
-            expression_values[':workflow'] = workflow_filter
-        
-        response = table.scan(
-            FilterExpression=filter_expression,
-            ExpressionAttributeValues=expression_values,
-            Limit=limit
-        )
-        
-        return response.get('Items', [])
+        return query_user_documents(user_id, limit, workflow_filter, filter_condition, start_key)
         
     except Exception as e:
         logger.error(f"Error in semantic search: {str(e)}")
+        return [], None
+
+def get_documents_by_ids(user_id, matches):
+    """
+    Load document records for ranked vector matches, preserving their order
+    """
+    if not matches:
         return []
+    
+    keys = [{'document_id': match['document_id']} for match in matches]
+    items = {}
+    request = {DOCUMENTS_TABLE: {'Keys': keys}}
+    while request:
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(DOCUMENTS_TABLE, []):
+            items[item['document_id']] = item
+        request = response.get('UnprocessedKeys')
+    
+    documents = []
+    for match in matches:
+        document = items.get(match['document_id'])
+        # Chunks are stored per user, but re-check ownership on the source record
+        if document and document.get('user_id') == user_id:
+            document['score'] = round(match['score'], 4)
+            document['matched_text'] = match['matched_text']
+            documents.append(document)
+    
+    return documents
 
-def perform_keyword_search(user_id, query, limit, workflow_filter=None):
+def perform_keyword_search(user_id, query, limit, workflow_filter=None, start_key=None):
     """
     Perform keyword-based search on document metadata and content
+    
+    Returns:
+        tuple: (matching documents, LastEvaluatedKey to resume from or None)
     """
     try:
-        table = dynamodb.Table(DOCUMENTS_TABLE)
-        
         # Split query into keywords
         keywords = query.lower().split()
         
-        # Build filter expression for multiple keywords
-        filter_expression = "user_id = :user_id"
-        expression_values = {':user_id': user_id}
-        
-        for i, keyword in enumerate(keywords):
-            filter_expression += f" AND (contains(#fn, :k{i}) OR contains(workflow_name, :k{i}))"
-            expression_values[f':k{i}'] = keyword
+        # Every keyword must appear in the file name or workflow name
+        filter_condition = None
+        for keyword in keywords:
+            keyword_condition = Attr('file_name').contains(keyword) | Attr('workflow_name').contains(keyword)
+            filter_condition = keyword_condition if filter_condition is None else filter_condition & keyword_condition
         
-        if workflow_filter:
-            filter_expression += " AND workflow_name = :workflow"
-            expression_values[':workflow'] = workflow_filter
-        
-        response = table.scan(
-            FilterExpression=filter_expression,
-            ExpressionAttributeNames={'#fn': 'file_name'},
-            ExpressionAttributeValues=expression_values,
-            Limit=limit
-        )
-        
-        return response.get('Items', [])
+        return query_user_documents(user_id, limit, workflow_filter, filter_condition, start_key)
         
     except Exception as e:
         logger.error(f"Error in keyword search: {str(e)}")
-        return []
+        return [], None
 
-def find_similar_documents(user_id, document_id, limit):
+def find_similar_documents(user_id, document_id, limit, start_key=None):
     """
     Find documents similar to the specified document
-    This would use vector similarity in production
+    Uses the MinHash/LSH index (see similarity_index.py) on processed text, or
+    on raw file blocks for documents not processed yet, and falls back to
+    matching workflow_name or file_type for documents without a signature
+    
+    Returns:
+        tuple: (similar documents, LastEvaluatedKey to resume from or None)
     """
     try:
         # Get the reference document
         table = dynamodb.Table(DOCUMENTS_TABLE)
         ref_doc = table.get_item(Key={'document_id': document_id}).get('Item')
         
-        if not ref_doc:
-            return []
+        if not ref_doc or ref_doc.get('user_id') != user_id:
+            return [], None
+        
+        if not start_key:
+            documents = find_similar_by_signature(ref_doc, limit)
+            if documents is not None:
+                # Ranked results are returned in a single page
+                return documents, None
         
         # Find documents with similar workflow_name or file_type
-        response = table.scan(
-            FilterExpression="user_id = :user_id AND document_id <> :doc_id AND (workflow_name = :workflow OR file_type = :file_type)",
-            ExpressionAttributeValues={
-                ':user_id': user_id,
-                ':doc_id': document_id,
-                ':workflow': ref_doc.get('workflow_name', ''),
-                ':file_type': ref_doc.get('file_type', '')
-            },
-            Limit=limit
+        filter_condition = Attr('document_id').ne(document_id) & (
+            Attr('workflow_name').eq(ref_doc.get('workflow_name', '')) |
+            Attr('file_type').eq(ref_doc.get('file_type', ''))
         )
         
-        return response.get('Items', [])
+        return query_user_documents(user_id, limit, None, filter_condition, start_key)
         
     except Exception as e:
         logger.error(f"Error finding similar documents: {str(e)}")
-        return []
+        return [], None
 
-def get_user_documents(user_id, limit, workflow_filter=None):
+def find_similar_by_signature(ref_doc, limit):
     """
-    Get all documents for a user with optional workflow filter
+    Rank the owner's documents by estimated Jaccard similarity to ref_doc
+    
+    Returns:
+        list: Similar documents with a score, or None if ref_doc has no signature
     """
     try:
-        table = dynamodb.Table(DOCUMENTS_TABLE)
-        
-        if workflow_filter:
-            response = table.scan(
-                FilterExpression="user_id = :user_id AND workflow_name = :workflow",
-                ExpressionAttributeValues={
-                    ':user_id': user_id,
-                    ':workflow': workflow_filter
-                },
-                Limit=limit
-            )
-        else:
-            response = table.scan(
-                FilterExpression="user_id = :user_id",
-                ExpressionAttributeValues={':user_id': user_id},
-                Limit=limit
-            )
+        signature = similarity_index.signature_from_item(ref_doc, similarity_index.TEXT)
+        if signature is None and ref_doc.get('processed_text'):
+            # Documents processed before the index existed are indexed on first use
+            signature = similarity_index.index_document_text(ref_doc, ref_doc['processed_text'])
+        kind = similarity_index.TEXT
+        
+        if signature is None:
+            signature = similarity_index.signature_from_item(ref_doc, similarity_index.RAW)
+            kind = similarity_index.RAW
+        if signature is None:
+            return None
+        
+        matches = similarity_index.find_similar(
+            signature, ref_doc['user_id'],
+            kind=kind,
+            threshold=SIMILARITY_MIN_SCORE,
+            limit=limit,
+            exclude_id=ref_doc['document_id']
+        )
         
-        return response.get('Items', [])
+    except Exception as e:
+        logger.error(f"Similarity index lookup failed, falling back to metadata match: {str(e)}")
+        return None
+    
+    documents = []
+    for document, score in matches:
+        document['score'] = round(score, 4)
+        documents.append(document)
+    return documents
+
+def get_user_documents(user_id, limit, workflow_filter=None, start_key=None):
+    """
+    Get all documents for a user with optional workflow filter
+    
+    Returns:
+        tuple: (documents, LastEvaluatedKey to resume from or None)
+    """
+    try:
+        return query_user_documents(user_id, limit, workflow_filter, None, start_key)
         
     except Exception as e:
         logger.error(f"Error getting user documents: {str(e)}")
-        return []
+        return [], None
+
+def query_user_documents(user_id, limit, workflow_filter=None, filter_condition=None, start_key=None):
+    """
+    Query a user's documents through the user/workflow index, or the
+    user-id-index when there is no workflow filter
+    
+    DynamoDB applies Limit before FilterExpression, so pages are read until
+    ``limit`` matching documents are collected or the partition is exhausted.
+    When a page yields more matches than needed, the resume key is built from
+    the last returned document so no match is skipped on the next call.
+    
+    Args:
+        user_id (str): Partition key of the index
+        limit (int): Maximum number of documents to return
+        workflow_filter (str): Exact workflow name (uses the index sort key)
+        filter_condition: boto3 condition applied to each item (optional)
+        start_key (dict): LastEvaluatedKey from a previous call (optional)
+        
+    Returns:
+        tuple: (documents, LastEvaluatedKey to resume from or None)
+    """
+    table = dynamodb.Table(DOCUMENTS_TABLE)
+    
+    index_name = DOCUMENTS_USER_INDEX if workflow_filter else DOCUMENTS_USER_ID_INDEX
+    key_condition = Key('user_id').eq(user_id)
+    if workflow_filter:
+        key_condition = key_condition & Key('workflow_name').eq(workflow_filter)
+    
+    query_kwargs = {
+        'IndexName': index_name,
+        'KeyConditionExpression': key_condition,
+        'Limit': max(limit, QUERY_PAGE_SIZE)
+    }
+    if filter_condition is not None:
+        query_kwargs['FilterExpression'] = filter_condition
+    if start_key:
+        query_kwargs['ExclusiveStartKey'] = start_key
+    
+    try:
+        return read_documents(table.query, query_kwargs, limit)
+    except ClientError as e:
+        # The index is missing or still backfilling (see DocumentsWorkflowIndexEnabled)
+        if e.response['Error']['Code'] not in ('ValidationException', 'ResourceNotFoundException'):
+            raise
+        logger.warning(f"Index {index_name} unavailable, falling back to table scan: {str(e)}")
+    
+    scan_condition = Attr('user_id').eq(user_id)
+    if workflow_filter:
+        scan_condition = scan_condition & Attr('workflow_name').eq(workflow_filter)
+    if filter_condition is not None:
+        scan_condition = scan_condition & filter_condition
+    scan_kwargs = {'FilterExpression': scan_condition, 'Limit': max(limit, QUERY_PAGE_SIZE)}
+    if start_key:
+        scan_kwargs['ExclusiveStartKey'] = {'document_id': start_key['document_id']}
+    
+    documents, last_key = read_documents(table.scan, scan_kwargs, limit)
+    # Continuation tokens always carry the index key
+    return documents, index_key_of(documents[-1], index_name) if last_key and documents else None
+
+def read_documents(read, read_kwargs, limit):
+    """
+    Page through table.query or table.scan until ``limit`` documents match
+    
+    Returns:
+        tuple: (documents, key to resume from or None)
+    """
+    documents = []
+    while True:
+        response = read(**read_kwargs)
+        items = response.get('Items', [])
+        remaining = limit - len(documents)
+        
+        if len(items) > remaining:
+            documents.extend(items[:remaining])
+            return documents, index_key_of(documents[-1], read_kwargs.get('IndexName'))
+        
+        documents.extend(items)
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key or len(documents) >= limit:
+            return documents, last_key
+        
+        read_kwargs['ExclusiveStartKey'] = last_key
+
+def index_key_of(document, index_name=DOCUMENTS_USER_INDEX):
+    """
+    Build an ExclusiveStartKey for a user index from a document
+    """
+    key = {
+        'document_id': document['document_id'],
+        'user_id': document['user_id']
+    }
+    if index_name == DOCUMENTS_USER_INDEX:
+        key['workflow_name'] = document['workflow_name']
+    return key
+
+def encode_continuation_token(last_key):
+    """
+    Encode a LastEvaluatedKey as an opaque continuation token
+    """
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key, sort_keys=True).encode('utf-8')).decode('ascii')
+
+def decode_continuation_token(token):
+    """
+    Decode a continuation token back into an ExclusiveStartKey
+    
+    Raises:
+        ValueError: If the token is malformed
+    """
+    if not token:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError('Invalid continuation token')
+    if not isinstance(key, dict) or set(key) != {'document_id', 'user_id', 'workflow_name'}:
+        raise ValueError('Invalid continuation token')
+    return key
 
 def enrich_document_metadata(document):
     """
     Enrich document with additional metadata and signed URLs
     """
     try:
+        # Similarity signatures are binary and internal to the index
+        for attribute in similarity_index.SIGNATURE_ATTRIBUTES.values():
+            document.pop(attribute, None)
+        
         # Generate pre-signed URL for document access
         if document.get('s3_bucket') and document.get('s3_key'):
             try:
@@ -0,0 +1,242 @@
+"""
+MinHash/LSH similarity index for documents
+Builds MinHash signatures from document content when it is ingested and
+stores locality-sensitive hashing buckets in DynamoDB, so "documents similar
+to X" and duplicate-upload checks need a few bucket lookups instead of a scan
+"""
+
+import os
+import re
+import random
+import hashlib
+import logging
+import numpy as np
+import aws_clients
+from boto3.dynamodb.conditions import Key
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# AWS clients, created on first use
+dynamodb = aws_clients.lazy_resource('dynamodb')
+
+# Environment variables
+DOCUMENTS_TABLE = os.environ.get('DOCUMENTS_TABLE', 'vpflow-documents')
+SIMILARITY_TABLE = os.environ.get('SIMILARITY_TABLE', 'vpflow-similarity')
+
+# 32 bands x 4 rows: documents with Jaccard similarity around 0.5 or higher
+# share at least one bucket with high probability
+NUM_PERM = 128
+NUM_BANDS = 32
+ROWS_PER_BAND = NUM_PERM // NUM_BANDS
+
+SHINGLE_WORDS = 5
+RAW_BLOCK_SIZE = 1024
+
+# Signature kinds: processed text vs. raw uploaded bytes
+TEXT = 'text'
+RAW = 'raw'
+SIGNATURE_ATTRIBUTES = {TEXT: 'minhash_signature', RAW: 'raw_minhash_signature'}
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Fixed seed so every container computes identical permutations
+_rng = random.Random(20250101)
+_PERM_A = np.array([_rng.randint(1, (1 << 32) - 1) for _ in range(NUM_PERM)], dtype=np.uint64)
+_PERM_B = np.array([_rng.randint(0, (1 << 32) - 1) for _ in range(NUM_PERM)], dtype=np.uint64)
+
+def _hash32(data):
+    """
+    Stable 32-bit hash of bytes
+    """
+    return int.from_bytes(hashlib.blake2b(data, digest_size=4).digest(), 'little')
+
+def text_shingles(text, k=SHINGLE_WORDS):
+    """
+    Hash the word k-grams of normalized text
+
+    Returns:
+        set: 32-bit shingle hashes
+    """
+    words = re.findall(r'\w+', (text or '').lower())
+    if len(words) < k:
+        return {_hash32(' '.join(words).encode('utf-8'))} if words else set()
+    return {_hash32(' '.join(words[i:i + k]).encode('utf-8')) for i in range(len(words) - k + 1)}
+
+def raw_shingles(file_bytes, block_size=RAW_BLOCK_SIZE):
+    """
+    Hash fixed-size blocks of a file
+
+    Block shingles catch byte-identical re-uploads and PDFs saved with
+    incremental updates (appended to the end of the original file) without
+    extracting any text first.
+
+    Returns:
+        set: 32-bit block hashes
+    """
+    return {_hash32(file_bytes[i:i + block_size]) for i in range(0, len(file_bytes), block_size)}
+
+def minhash(shingles):
+    """
+    Compute the MinHash signature of a set of 32-bit shingle hashes
+
+    Returns:
+        numpy.ndarray: NUM_PERM uint32 values, or None for an empty set
+    """
+    if not shingles:
+        return None
+
+    hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    # Process in blocks to bound the (shingles x permutations) matrix
+    for start in range(0, len(hashes), 4096):
+        block = hashes[start:start + 4096, None]
+        permuted = np.bitwise_and((block * _PERM_A + _PERM_B) % _MERSENNE_PRIME, _MAX_HASH)
+        signature = np.minimum(signature, permuted.min(axis=0))
+    return signature.astype(np.uint32)
+
+def estimate_jaccard(signature_a, signature_b):
+    """
+    Estimate the Jaccard similarity of two signatures
+    """
+    return float(np.count_nonzero(signature_a == signature_b)) / NUM_PERM
+
+def band_buckets(signature, user_id, kind=TEXT):
+    """
+    Compute the LSH bucket keys of a signature
+
+    Buckets are namespaced by signature kind and user so lookups only touch
+    the caller's documents.
+    """
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+        buckets.append(f"{kind}#{user_id}#{band}#{hashlib.blake2b(rows, digest_size=8).hexdigest()}")
+    return buckets
+
+def signature_to_bytes(signature):
+    return signature.astype('<u4').tobytes()
+
+def signature_from_item(item, kind=TEXT):
+    """
+    Read a stored signature from a document record
+    """
+    value = item.get(SIGNATURE_ATTRIBUTES[kind])
+    if value is None:
+        return None
+    raw = value.value if hasattr(value, 'value') else bytes(value)
+    return np.frombuffer(raw, dtype='<u4').astype(np.uint32)
+
+def index_signature(document_id, user_id, signature, kind=TEXT, previous_signature=None):
+    """
+    Store a document's signature and LSH bucket entries
+
+    Args:
+        document_id (str): Document ID
+        user_id (str): Owner of the document
+        signature (numpy.ndarray): MinHash signature
+        kind (str): TEXT or RAW
+        previous_signature (numpy.ndarray): Signature being replaced, whose
+            buckets are removed (optional)
+    """
+    new_buckets = band_buckets(signature, user_id, kind)
+    stale_buckets = []
+    if previous_signature is not None:
+        stale_buckets = set(band_buckets(previous_signature, user_id, kind)) - set(new_buckets)
+
+    similarity_table = dynamodb.Table(SIMILARITY_TABLE)
+    with similarity_table.batch_writer() as batch:
+        for bucket in stale_buckets:
+            batch.delete_item(Key={'bucket': bucket, 'document_id': document_id})
+        for bucket in new_buckets:
+            batch.put_item(Item={'bucket': bucket, 'document_id': document_id, 'user_id': user_id})
+
+    dynamodb.Table(DOCUMENTS_TABLE).update_item(
+        Key={'document_id': document_id},
+        UpdateExpression='SET #sig = :sig',
+        ExpressionAttributeNames={'#sig': SIGNATURE_ATTRIBUTES[kind]},
+        ExpressionAttributeValues={':sig': signature_to_bytes(signature)}
+    )
+
+def index_document_text(document, text):
+    """
+    Index a document's processed text (call when text extraction completes)
+
+    Args:
+        document (dict): Document record (document_id, user_id, existing signature)
+        text (str): Processed document text
+
+    Returns:
+        numpy.ndarray: The new signature, or None for empty text
+    """
+    signature = minhash(text_shingles(text))
+    if signature is None:
+        return None
+    index_signature(
+        document['document_id'], document['user_id'], signature, TEXT,
+        previous_signature=signature_from_item(document, TEXT)
+    )
+    return signature
+
+def find_candidates(signature, user_id, kind=TEXT, exclude_id=None):
+    """
+    Collect documents sharing at least one LSH bucket with a signature
+
+    Returns:
+        set: Candidate document IDs
+    """
+    similarity_table = dynamodb.Table(SIMILARITY_TABLE)
+
+    def query_bucket(bucket):
+        response = similarity_table.query(
+            KeyConditionExpression=Key('bucket').eq(bucket),
+            ProjectionExpression='document_id'
+        )
+        return [item['document_id'] for item in response.get('Items', [])]
+
+    candidates = set()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for document_ids in executor.map(query_bucket, band_buckets(signature, user_id, kind)):
+            candidates.update(document_ids)
+
+    candidates.discard(exclude_id)
+    return candidates
+
+def find_similar(signature, user_id, kind=TEXT, threshold=0.5, limit=10, exclude_id=None):
+    """
+    Find a user's documents similar to a signature
+
+    Args:
+        signature (numpy.ndarray): MinHash signature to compare against
+        user_id (str): Owner whose documents are searched
+        kind (str): TEXT or RAW
+        threshold (float): Minimum estimated Jaccard similarity
+        limit (int): Maximum number of results
+        exclude_id (str): Document to leave out (usually the query document)
+
+    Returns:
+        list: (document record, estimated Jaccard) tuples, most similar first
+    """
+    candidates = list(find_candidates(signature, user_id, kind, exclude_id))
+    if not candidates:
+        return []
+
+    matches = []
+    for start in range(0, len(candidates), 100):
+        request = {DOCUMENTS_TABLE: {'Keys': [{'document_id': document_id} for document_id in candidates[start:start + 100]]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(DOCUMENTS_TABLE, []):
+                candidate_signature = signature_from_item(item, kind)
+                if candidate_signature is None or item.get('user_id') != user_id:
+                    continue
+                score = estimate_jaccard(signature, candidate_signature)
+                if score >= threshold:
+                    matches.append((item, score))
+            request = response.get('UnprocessedKeys')
+
+    matches.sort(key=lambda match: match[1], reverse=True)
+    return matches[:limit]
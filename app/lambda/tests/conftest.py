@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Handlers are flat modules, imported the way the Lambda runtime does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
@@ -0,0 +1,57 @@
+import content_store
+
+
+class FakeTable:
+    def __init__(self, ref_count):
+        self.ref_count = ref_count
+        self.deleted = []
+
+    def update_item(self, **kwargs):
+        self.ref_count += kwargs['ExpressionAttributeValues'][':minus_one']
+        return {'Attributes': {
+            'content_hash': 'abc',
+            's3_bucket': 'bucket',
+            's3_key': 'content/sha256/abc',
+            'ref_count': self.ref_count
+        }}
+
+    def delete_item(self, **kwargs):
+        self.deleted.append(kwargs['Key'])
+
+
+class FakeDynamoDB:
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+class FakeS3:
+    def __init__(self):
+        self.deleted = []
+
+    def head_object(self, Bucket, Key):
+        return {'VersionId': 'v1'}
+
+    def delete_object(self, **kwargs):
+        self.deleted.append(kwargs)
+
+
+def test_release_content_keeps_referenced_content(monkeypatch):
+    table, s3 = FakeTable(ref_count=2), FakeS3()
+    monkeypatch.setattr(content_store, 'dynamodb', FakeDynamoDB(table))
+    monkeypatch.setattr(content_store, 's3_client', s3)
+
+    assert not content_store.release_content('abc')
+    assert table.deleted == [] and s3.deleted == []
+
+
+def test_release_content_removes_last_reference_and_its_version(monkeypatch):
+    table, s3 = FakeTable(ref_count=1), FakeS3()
+    monkeypatch.setattr(content_store, 'dynamodb', FakeDynamoDB(table))
+    monkeypatch.setattr(content_store, 's3_client', s3)
+
+    assert content_store.release_content('abc')
+    assert table.deleted == [{'content_hash': 'abc'}]
+    assert s3.deleted == [{'Bucket': 'bucket', 'Key': 'content/sha256/abc', 'VersionId': 'v1'}]
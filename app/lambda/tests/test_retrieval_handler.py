@@ -0,0 +1,50 @@
+import pytest
+import retrieval_handler
+
+
+class FakeTable:
+    def __init__(self, items):
+        self.items = items
+        self.queries = []
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        return {'Items': self.items}
+
+
+class FakeDynamoDB:
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTable([
+        {'document_id': 'doc-1', 'user_id': 'user-1', 'workflow_name': 'Loan approval'},
+        {'document_id': 'doc-2', 'user_id': 'user-1'},
+    ])
+    monkeypatch.setattr(retrieval_handler, 'dynamodb', FakeDynamoDB(table))
+    return table
+
+
+def test_unfiltered_listing_uses_user_id_index(table):
+    documents, _ = retrieval_handler.query_user_documents('user-1', 10)
+
+    assert table.queries[0]['IndexName'] == retrieval_handler.DOCUMENTS_USER_ID_INDEX
+    # Documents without a workflow_name are not in the sparse workflow index
+    assert [document['document_id'] for document in documents] == ['doc-1', 'doc-2']
+
+
+def test_unfiltered_listing_resumes_without_workflow_name(table):
+    documents, last_key = retrieval_handler.query_user_documents('user-1', 1)
+
+    assert last_key == {'document_id': 'doc-1', 'user_id': 'user-1'}
+
+
+def test_workflow_filter_uses_user_workflow_index(table):
+    retrieval_handler.query_user_documents('user-1', 10, workflow_filter='Loan approval')
+
+    assert table.queries[0]['IndexName'] == retrieval_handler.DOCUMENTS_USER_INDEX
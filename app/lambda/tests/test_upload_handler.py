@@ -0,0 +1,135 @@
+import pytest
+from botocore.exceptions import ClientError
+import upload_handler
+
+
+class FakeTable:
+    def __init__(self):
+        self.items = []
+
+        self.updates = []
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+    def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+        return {'Attributes': {'document_id': kwargs['Key'].get('document_id'), 'user_id': 'user-1'}}
+
+
+class FakeDynamoDB:
+    def __init__(self):
+        self.table = FakeTable()
+
+    def Table(self, name):
+        return self.table
+
+
+@pytest.fixture
+def dynamodb(monkeypatch):
+    fake = FakeDynamoDB()
+    monkeypatch.setattr(upload_handler, 'dynamodb', fake)
+    return fake
+
+
+@pytest.mark.parametrize('workflow_name', ['', None, '   '])
+def test_create_pending_document_defaults_missing_workflow_name(dynamodb, workflow_name):
+    upload_handler.create_pending_document('doc-1', 'user-1', 'a.pdf', 'application/pdf', workflow_name, 'uploads/user-1/doc-1_a.pdf')
+
+    assert dynamodb.table.items[0]['workflow_name'] == upload_handler.DEFAULT_WORKFLOW_NAME
+
+
+def test_create_pending_document_keeps_workflow_name(dynamodb):
+    upload_handler.create_pending_document('doc-1', 'user-1', 'a.pdf', 'application/pdf', ' Loan approval ', 'uploads/user-1/doc-1_a.pdf')
+
+    assert dynamodb.table.items[0]['workflow_name'] == 'Loan approval'
+
+
+class FakeS3:
+    def __init__(self, missing=False):
+        self.missing = missing
+
+    def head_object(self, Bucket, Key):
+        if self.missing:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        return {'Metadata': {'document-id': 'doc-1'}}
+
+
+def s3_event(key='uploads/user-1/doc-1_a.pdf'):
+    return {'Records': [{
+        'eventSource': 'aws:s3',
+        's3': {'bucket': {'name': 'bucket'}, 'object': {'key': key, 'size': 10}}
+    }]}
+
+
+def test_s3_event_failure_releases_document_and_propagates(dynamodb, monkeypatch):
+    monkeypatch.setattr(upload_handler, 's3_client', FakeS3())
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(upload_handler, 'register_upload', fail)
+
+    with pytest.raises(RuntimeError):
+        upload_handler.handle_s3_event(s3_event())
+
+    claim, release = dynamodb.table.updates
+    assert release['ExpressionAttributeValues'][':pending'] == 'pending_upload'
+    assert release['ExpressionAttributeValues'][':s3_key'] == 'uploads/user-1/doc-1_a.pdf'
+
+
+def test_s3_event_skips_objects_already_registered(dynamodb, monkeypatch):
+    monkeypatch.setattr(upload_handler, 's3_client', FakeS3(missing=True))
+
+    assert upload_handler.handle_s3_event(s3_event()) == {'processed': 0}
+    assert dynamodb.table.updates == []
+
+
+def test_cached_ocr_updates_and_indexes_document_missing_from_index(dynamodb, monkeypatch):
+    monkeypatch.setattr(upload_handler.content_store, 'dynamodb', dynamodb)
+    monkeypatch.setattr(upload_handler.ocr_cache, 'lookup', lambda *args: {'processed_text_s3_key': 'ocr/text.txt'})
+    monkeypatch.setattr(upload_handler.ocr_cache, 'read_text', lambda *args: 'cached text')
+    # The content-hash index has not caught up with the new document yet
+    monkeypatch.setattr(upload_handler.content_store, 'get_document_ids', lambda content_hash: [])
+    indexed = []
+    monkeypatch.setattr(upload_handler.content_store, 'index_document', lambda document, text, embedded_chunks: indexed.append(document['document_id']))
+
+    document = {'document_id': 'doc-1', 'user_id': 'user-1', 'content_hash': 'abc'}
+    assert upload_handler.use_cached_ocr(document, 'bucket')
+
+    content_update, document_update = dynamodb.table.updates
+    assert document_update['Key'] == {'document_id': 'doc-1'}
+    assert document_update['ExpressionAttributeValues'][':status'] == 'processed'
+    assert indexed == ['doc-1']
+
+
+def test_textract_start_error_releases_content_claim(dynamodb, monkeypatch):
+    from botocore.exceptions import EndpointConnectionError
+
+    class FailingTextract:
+        def start_document_text_detection(self, **kwargs):
+            raise EndpointConnectionError(endpoint_url='https://textract')
+    monkeypatch.setattr(upload_handler, 'textract_client', FailingTextract())
+    monkeypatch.setattr(upload_handler, 'TEXTRACT_MODE', 'detection')
+    released = []
+    monkeypatch.setattr(upload_handler.content_store, 'update_content', lambda content_hash, **fields: released.append(fields))
+
+    upload_handler.start_textract_job({'document_id': 'doc-1', 'content_hash': 'abc', 's3_key': 'content/sha256/abc'}, 'bucket')
+
+    assert released == [{'status': 'failed'}]
+
+
+def test_failed_registration_releases_content_reference(dynamodb, monkeypatch):
+    monkeypatch.setattr(upload_handler.content_store, 'register_content',
+                        lambda *args: ({'s3_key': 'content/sha256/abc', 'status': 'pending'}, True))
+    released = []
+    monkeypatch.setattr(upload_handler.content_store, 'release_content', released.append)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(upload_handler, 'find_duplicate_upload', fail)
+
+    document = {'document_id': 'doc-1', 'user_id': 'user-1', 'file_type': 'application/pdf'}
+    with pytest.raises(RuntimeError):
+        upload_handler.register_upload(document, 'bucket', 'uploads/user-1/doc-1_a.pdf', 10, 'abc', set())
+
+    assert released == ['abc']
@@ -0,0 +1,122 @@
+"""
+Lambda function for handling Textract job completion
+Subscribed to the SNS topic Textract notifies when a job started by
+upload_handler finishes; collects the result into the OCR cache and updates
+every document that shares the content
+"""
+
+import json
+import aws_clients
+import os
+from datetime import datetime
+import logging
+import content_store
+import ocr_cache
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# AWS clients, created on first use
+textract_client = aws_clients.lazy_client('textract')
+dynamodb = aws_clients.lazy_resource('dynamodb')
+
+# Environment variables
+DOCUMENTS_TABLE = os.environ.get('DOCUMENTS_TABLE', 'vpflow-documents')
+
+def lambda_handler(event, context):
+    """
+    Handle Textract completion notifications
+
+    Args:
+        event: SNS event with one Textract notification per record
+        context: Lambda context object
+
+    Returns:
+        dict: Number of notifications handled
+    """
+    handled = 0
+
+    for record in event.get('Records', []):
+        notification = json.loads(record['Sns']['Message'])
+        job_id = notification.get('JobId')
+        status = notification.get('Status')
+        # upload_handler tags each job with the content hash it processes
+        content_hash = notification.get('JobTag')
+
+        if not job_id or not content_hash:
+            logger.warning(f"Ignoring notification without JobId/JobTag: {notification}")
+            continue
+
+        logger.info(f"Textract job {job_id} for content {content_hash} finished with status {status}")
+
+        if status in ('SUCCEEDED', 'PARTIAL_SUCCESS'):
+            handle_job_succeeded(job_id, content_hash, notification)
+        else:
+            handle_job_failed(content_hash, notification)
+        handled += 1
+
+    return {'handled': handled}
+
+def handle_job_succeeded(job_id, content_hash, notification):
+    """
+    Cache the result and publish its text to every referencing document
+    """
+    content = content_store.get_content(content_hash)
+    if content and content.get('status') == 'processed':
+        # SNS delivers at least once
+        logger.info(f"Content {content_hash} already processed, skipping")
+        return
+
+    api = notification.get('API')
+    bucket = notification.get('DocumentLocation', {}).get('S3Bucket') or (content or {}).get('s3_bucket')
+    writer = ocr_cache.ResultWriter(bucket, content_hash, ocr_cache.features_for_api(api))
+    for blocks in iter_result_blocks(job_id, api):
+        writer.add_blocks(blocks)
+    text_key, text = writer.save()
+
+    content_store.publish_text(content_hash, {
+        'processed_text_s3_key': text_key,
+        'processed_timestamp': datetime.utcnow().isoformat()
+    }, text)
+
+def handle_job_failed(content_hash, notification):
+    """
+    Mark the content and its documents as failed so a new upload can retry
+    """
+    content_store.update_content(content_hash, status='failed')
+
+    table = dynamodb.Table(DOCUMENTS_TABLE)
+    for document_id in content_store.get_document_ids(content_hash):
+        table.update_item(
+            Key={'document_id': document_id},
+            UpdateExpression='SET processing_status = :status, processing_error = :error',
+            ExpressionAttributeValues={
+                ':status': 'failed',
+                ':error': notification.get('Status', 'FAILED')
+            }
+        )
+
+def iter_result_blocks(job_id, api=None):
+    """
+    Page through a text detection or document analysis result
+
+    Yields:
+        list: Blocks of one result page
+    """
+    next_token = None
+
+    while True:
+        kwargs = {'JobId': job_id, 'MaxResults': 1000}
+        if next_token:
+            kwargs['NextToken'] = next_token
+        if api == 'StartDocumentAnalysis':
+            response = textract_client.get_document_analysis(**kwargs)
+        else:
+            response = textract_client.get_document_text_detection(**kwargs)
+
+        yield response.get('Blocks', [])
+
+        next_token = response.get('NextToken')
+        if not next_token:
+            break
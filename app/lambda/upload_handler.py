@@ -1,193 +1,778 @@
 """
 Lambda function for handling document uploads
 Integrates with S3, EventBridge, and Textract for document processing
+
+Files are uploaded straight to S3 with presigned PUT or multipart URLs; the
+S3 ObjectCreated event then registers the document and starts processing.
+Small files can still be sent base64-encoded in the request body. Identical
+files are stored and processed once (see content_store.py), and content that
+was recognized before reuses its cached OCR result (see ocr_cache.py).
 """
 
-import json
-import boto3
+import math
+import aws_clients
 import uuid
 import os
+import hashlib
 from datetime import datetime
+from urllib.parse import unquote_plus
 from botocore.exceptions import ClientError
 import logging
+import similarity_index
+import content_store
+import ocr_cache
+import event_publisher
+import http_api
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-s3_client = boto3.client('s3')
-textract_client = boto3.client('textract')
-eventbridge_client = boto3.client('events')
-dynamodb = boto3.resource('dynamodb')
+# AWS clients, created on first use
+s3_client = aws_clients.lazy_client('s3')
+textract_client = aws_clients.lazy_client('textract')
+dynamodb = aws_clients.lazy_resource('dynamodb')
 
 # Environment variables
 BUCKET_NAME = os.environ.get('DOCUMENT_BUCKET', 'vpflow-documents')
 DOCUMENTS_TABLE = os.environ.get('DOCUMENTS_TABLE', 'vpflow-documents')
-EVENT_BUS_NAME = os.environ.get('EVENT_BUS_NAME', 'vpflow-events')
+# Minimum estimated Jaccard similarity of raw file blocks to treat an upload as a duplicate
+DUPLICATE_THRESHOLD = float(os.environ.get('DUPLICATE_THRESHOLD', '0.9'))
+# Files above this size are uploaded in parts
+MULTIPART_THRESHOLD = int(os.environ.get('MULTIPART_THRESHOLD', str(64 * 1024 * 1024)))
+MAX_FILE_SIZE = int(os.environ.get('MAX_FILE_SIZE', str(5 * 1024 ** 3)))
+PRESIGNED_URL_EXPIRY = int(os.environ.get('PRESIGNED_URL_EXPIRY', '3600'))
+# Textract publishes job completion here; textract_handler collects the result
+TEXTRACT_SNS_TOPIC_ARN = os.environ.get('TEXTRACT_SNS_TOPIC_ARN')
+TEXTRACT_SNS_ROLE_ARN = os.environ.get('TEXTRACT_SNS_ROLE_ARN')
+# 'detection' (text only, cheaper) or 'analysis' (text, forms and tables in one job)
+TEXTRACT_MODE = os.environ.get('TEXTRACT_MODE', 'detection')
+
+UPLOAD_PREFIX = 'uploads/'
+MIB = 1024 * 1024
+# S3 requires parts of at least 5 MiB; larger parts mean fewer requests and URLs
+MIN_PART_SIZE = 8 * MIB
+MAX_PART_SIZE = 5 * 1024 * MIB
+# Part count cap, well under S3's 10,000 so the URL list fits in one response
+MAX_PARTS = 1000
+STREAM_CHUNK_SIZE = similarity_index.RAW_BLOCK_SIZE * 1024
+
+PROCESSABLE_TYPES = ['application/pdf', 'image/png', 'image/jpeg', 'image/jpg']
+# workflow_name is the range key of user-workflow-index, so it is never empty
+DEFAULT_WORKFLOW_NAME = 'Unknown Workflow'
 
+# Upload API actions, selected by the body's "action" field
+router = http_api.Router(default='upload')
+
+@event_publisher.flush_after
 def lambda_handler(event, context):
     """
-    Handle document upload requests
+    Handle document upload requests and S3 upload-completed events
     
     Args:
         event: Lambda event object containing the request
         context: Lambda context object
-        
+    
     Returns:
         dict: Response with status code and body
     """
+    if is_s3_event(event):
+        # Errors propagate so S3 retries the event
+        return handle_s3_event(event)
+    return handle_api_request(event, context)
+
+@http_api.handler(client_error_message='Failed to upload document')
+def handle_api_request(event, context):
+    """Route an API Gateway upload request to its action"""
+    return router.dispatch(http_api.parse_body(event))
+
+@router.route('initiate')
+def handle_initiate_upload(body):
+    """
+    Reserve a document and return presigned upload URL(s)
+    
+    A single presigned PUT is returned for files up to MULTIPART_THRESHOLD;
+    larger files get a multipart upload with one presigned URL per part.
+    """
+    file_name = body.get('fileName')
+    file_type = body.get('fileType', 'application/pdf')
+    user_id = body.get('userId')
+    workflow_name = normalize_workflow_name(body.get('workflowName'))
+    
     try:
-        # Parse the request
-        if 'body' in event:
-            body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
-        else:
-            body = event
-        
-        # Extract file information
-        file_name = body.get('fileName')
-        file_content = body.get('fileContent')  # Base64 encoded
-        file_type = body.get('fileType', 'application/pdf')
-        user_id = body.get('userId')
-        workflow_name = body.get('workflowName', 'Unknown Workflow')
-        
-        if not file_name or not file_content or not user_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Missing required fields: fileName, fileContent, or userId'
-                })
-            }
+        file_size = int(body.get('fileSize', 0))
+    except (TypeError, ValueError):
+        return http_api.error_response(400, 'fileSize must be an integer')
+    
+    if not file_name or not user_id or file_size <= 0:
+        return http_api.error_response(400, 'Missing required fields: fileName, fileSize, or userId')
+    
+    if file_size > MAX_FILE_SIZE:
+        return http_api.error_response(400, f'File exceeds the maximum size of {MAX_FILE_SIZE} bytes')
+    
+    document_id = str(uuid.uuid4())
+    s3_key = build_s3_key(user_id, document_id, file_name)
+    # Metadata values are signed into the URL, so the client must send them as headers
+    metadata = {'user-id': user_id, 'document-id': document_id}
+    
+    if file_size <= MULTIPART_THRESHOLD:
+        create_pending_document(document_id, user_id, file_name, file_type, workflow_name, s3_key)
         
-        # Generate unique document ID and S3 key
-        document_id = str(uuid.uuid4())
-        s3_key = f"uploads/{user_id}/{document_id}_{file_name}"
-        
-        # Decode and upload file to S3
-        import base64
-        file_bytes = base64.b64decode(file_content)
-        
-        s3_client.put_object(
-            Bucket=BUCKET_NAME,
-            Key=s3_key,
-            Body=file_bytes,
-            ContentType=file_type,
-            Metadata={
-                'user-id': user_id,
-                'document-id': document_id,
-                'workflow-name': workflow_name,
-                'upload-timestamp': datetime.utcnow().isoformat()
-            }
+        upload_url = s3_client.generate_presigned_url(
+            'put_object',
+            Params={
+                'Bucket': BUCKET_NAME,
+                'Key': s3_key,
+                'ContentType': file_type,
+                'Metadata': metadata
+            },
+            ExpiresIn=PRESIGNED_URL_EXPIRY
         )
         
-        # Save document metadata to DynamoDB
-        table = dynamodb.Table(DOCUMENTS_TABLE)
-        table.put_item(
-            Item={
-                'document_id': document_id,
-                'user_id': user_id,
-                'file_name': file_name,
-                'file_type': file_type,
-                'workflow_name': workflow_name,
-                's3_bucket': BUCKET_NAME,
-                's3_key': s3_key,
-                'upload_timestamp': datetime.utcnow().isoformat(),
-                'status': 'uploaded',
-                'processing_status': 'pending'
-            }
+        return http_api.success_response({
+            'document_id': document_id,
+            's3_key': s3_key,
+            'upload_type': 'single',
+            'upload_url': upload_url,
+            'headers': upload_headers(file_type, metadata),
+            'expires_in': PRESIGNED_URL_EXPIRY
+        })
+    
+    part_size = choose_part_size(file_size)
+    part_count = math.ceil(file_size / part_size)
+    
+    multipart = s3_client.create_multipart_upload(
+        Bucket=BUCKET_NAME,
+        Key=s3_key,
+        ContentType=file_type,
+        Metadata=metadata
+    )
+    upload_id = multipart['UploadId']
+    
+    create_pending_document(document_id, user_id, file_name, file_type, workflow_name, s3_key)
+    
+    logger.info(f"Started multipart upload for document {document_id}: {part_count} parts of {part_size} bytes")
+    
+    return http_api.success_response({
+        'document_id': document_id,
+        's3_key': s3_key,
+        'upload_type': 'multipart',
+        'upload_id': upload_id,
+        'part_size': part_size,
+        'part_count': part_count,
+        'parts': presign_parts(s3_key, upload_id, range(1, part_count + 1)),
+        'expires_in': PRESIGNED_URL_EXPIRY
+    })
+
+@router.route('parts')
+def handle_part_urls(body):
+    """
+    Re-issue presigned URLs for parts of a multipart upload (e.g. after expiry)
+    """
+    user_id = body.get('userId')
+    s3_key = body.get('s3Key')
+    upload_id = body.get('uploadId')
+    part_numbers = body.get('partNumbers') or []
+    
+    if not user_id or not s3_key or not upload_id or not part_numbers:
+        return http_api.error_response(400, 'Missing required fields: userId, s3Key, uploadId, or partNumbers')
+    
+    if not owns_upload_key(user_id, s3_key):
+        return http_api.error_response(403, 'Access denied')
+    
+    try:
+        part_numbers = [int(number) for number in part_numbers]
+    except (TypeError, ValueError):
+        return http_api.error_response(400, 'partNumbers must be integers')
+    
+    if len(part_numbers) > MAX_PARTS or any(number < 1 or number > 10000 for number in part_numbers):
+        return http_api.error_response(400, 'Invalid part numbers')
+    
+    return http_api.success_response({
+        'upload_id': upload_id,
+        'parts': presign_parts(s3_key, upload_id, part_numbers),
+        'expires_in': PRESIGNED_URL_EXPIRY
+    })
+
+@router.route('complete')
+def handle_complete_upload(body):
+    """
+    Complete a multipart upload from the part ETags returned by S3
+    
+    Registration and processing happen in the resulting S3 event.
+    """
+    user_id = body.get('userId')
+    s3_key = body.get('s3Key')
+    upload_id = body.get('uploadId')
+    parts = body.get('parts') or []
+    
+    if not user_id or not s3_key or not upload_id or not parts:
+        return http_api.error_response(400, 'Missing required fields: userId, s3Key, uploadId, or parts')
+    
+    if not owns_upload_key(user_id, s3_key):
+        return http_api.error_response(403, 'Access denied')
+    
+    try:
+        completed_parts = sorted(
+            ({'PartNumber': int(part['PartNumber']), 'ETag': part['ETag']} for part in parts),
+            key=lambda part: part['PartNumber']
         )
+    except (KeyError, TypeError, ValueError):
+        return http_api.error_response(400, 'Each part needs PartNumber and ETag')
+    
+    s3_client.complete_multipart_upload(
+        Bucket=BUCKET_NAME,
+        Key=s3_key,
+        UploadId=upload_id,
+        MultipartUpload={'Parts': completed_parts}
+    )
+    
+    return http_api.success_response({
+        's3_key': s3_key,
+        'message': 'Upload completed; processing will start shortly'
+    })
+
+@router.route('abort')
+def handle_abort_upload(body):
+    """
+    Abort a multipart upload and drop its pending document record
+    """
+    user_id = body.get('userId')
+    s3_key = body.get('s3Key')
+    upload_id = body.get('uploadId')
+    document_id = body.get('documentId')
+    
+    if not user_id or not s3_key or not upload_id:
+        return http_api.error_response(400, 'Missing required fields: userId, s3Key, or uploadId')
+    
+    if not owns_upload_key(user_id, s3_key):
+        return http_api.error_response(403, 'Access denied')
+    
+    s3_client.abort_multipart_upload(Bucket=BUCKET_NAME, Key=s3_key, UploadId=upload_id)
+    
+    if document_id:
+        try:
+            dynamodb.Table(DOCUMENTS_TABLE).delete_item(
+                Key={'document_id': document_id},
+                ConditionExpression='user_id = :user_id AND #status = :pending',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':user_id': user_id, ':pending': 'pending_upload'}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+    
+    return http_api.success_response({'message': 'Upload aborted'})
+
+@router.route('upload')
+def handle_direct_upload(body):
+    """
+    Upload a base64-encoded file sent in the request body
+    
+    Limited by the API Gateway payload size; use the 'initiate' action for
+    larger files.
+    """
+    # Extract file information
+    file_name = body.get('fileName')
+    file_content = body.get('fileContent')  # Base64 encoded
+    file_type = body.get('fileType', 'application/pdf')
+    user_id = body.get('userId')
+    workflow_name = normalize_workflow_name(body.get('workflowName'))
+    
+    if not file_name or not file_content or not user_id:
+        return http_api.error_response(400, 'Missing required fields: fileName, fileContent, or userId')
+    
+    # Generate unique document ID and S3 key
+    document_id = str(uuid.uuid4())
+    s3_key = build_s3_key(user_id, document_id, file_name)
+    
+    # Decode and upload file to S3
+    import base64
+    file_bytes = base64.b64decode(file_content)
+    
+    create_pending_document(document_id, user_id, file_name, file_type, workflow_name, s3_key)
+    
+    put_response = s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=s3_key,
+        Body=file_bytes,
+        ContentType=file_type,
+        Metadata={
+            'user-id': user_id,
+            'document-id': document_id,
+            'workflow-name': workflow_name,
+            'upload-timestamp': datetime.utcnow().isoformat()
+        }
+    )
+    
+    # Register right away; the S3 event for this object then finds it done
+    document = finalize_upload(
+        document_id, BUCKET_NAME, s3_key, len(file_bytes),
+        content_hash=content_store.hash_bytes(file_bytes),
+        shingles=similarity_index.raw_shingles(file_bytes),
+        version_id=put_response.get('VersionId')
+    )
+    
+    response_data = {
+        'document_id': document_id,
+        's3_key': s3_key,
+        'message': 'Document uploaded successfully and processing started'
+    }
+    if document and document.get('processing_status') == 'processed':
+        response_data['message'] = 'Document uploaded successfully; identical content was processed before, so its results were reused'
+    elif document and document.get('duplicate_of'):
+        response_data['duplicate_of'] = document['duplicate_of']
+        response_data['message'] = 'Document uploaded successfully; it duplicates an earlier upload, so processing was skipped'
+    
+    return http_api.success_response(response_data)
+
+def is_s3_event(event):
+    """Check whether the event is an S3 notification"""
+    records = event.get('Records') or []
+    return bool(records) and records[0].get('eventSource') == 'aws:s3'
+
+def handle_s3_event(event):
+    """
+    Register uploaded objects and start their processing
+    
+    Each object is streamed once (never held in memory) to compute its
+    content hash and duplicate-detection signature. Every record is
+    attempted; if any failed, the first error is raised afterwards so the
+    event is retried (records that succeeded are skipped on the retry).
+    """
+    processed = 0
+    errors = []
+    
+    for record in event['Records']:
+        bucket = record['s3']['bucket']['name']
+        s3_key = unquote_plus(record['s3']['object']['key'])
+        file_size = record['s3']['object'].get('size', 0)
         
-        # Trigger document processing via EventBridge
-        eventbridge_client.put_events(
-            Entries=[
-                {
-                    'Source': 'vpflow.document',
-                    'DetailType': 'Document Uploaded',
-                    'Detail': json.dumps({
-                        'document_id': document_id,
-                        'user_id': user_id,
-                        's3_bucket': BUCKET_NAME,
-                        's3_key': s3_key,
-                        'file_type': file_type,
-                        'workflow_name': workflow_name
-                    }),
-                    'EventBusName': EVENT_BUS_NAME
-                }
-            ]
-        )
+        if not s3_key.startswith(UPLOAD_PREFIX):
+            continue
+        
+        try:
+            head = s3_client.head_object(Bucket=bucket, Key=s3_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                # Registered already (e.g. by a direct upload), which removes the object
+                logger.info(f"s3://{bucket}/{s3_key} no longer exists, skipping")
+                continue
+            logger.error(f"Failed to read s3://{bucket}/{s3_key}: {str(e)}")
+            errors.append(e)
+            continue
         
-        # Start Textract job if it's a PDF or image
-        if file_type in ['application/pdf', 'image/png', 'image/jpeg', 'image/jpg']:
-            try:
-                textract_response = textract_client.start_document_text_detection(
-                    DocumentLocation={
-                        'S3Object': {
-                            'Bucket': BUCKET_NAME,
-                            'Name': s3_key
-                        }
-                    },
-                    ClientRequestToken=document_id
-                )
-                
-                # Update document with Textract job ID
-                table.update_item(
-                    Key={'document_id': document_id},
-                    UpdateExpression='SET textract_job_id = :job_id, processing_status = :status',
-                    ExpressionAttributeValues={
-                        ':job_id': textract_response['JobId'],
-                        ':status': 'processing'
-                    }
-                )
-                
-                logger.info(f"Started Textract job {textract_response['JobId']} for document {document_id}")
-                
-            except ClientError as e:
-                logger.error(f"Failed to start Textract job: {str(e)}")
-                # Continue without failing - manual processing can be done later
-        
-        # Return success response
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
+        document_id = head.get('Metadata', {}).get('document-id')
+        if not document_id:
+            logger.warning(f"Skipping s3://{bucket}/{s3_key}: no document-id metadata")
+            continue
+        
+        try:
+            version_id = record['s3']['object'].get('versionId') or head.get('VersionId')
+            if finalize_upload(document_id, bucket, s3_key, file_size, version_id=version_id):
+                processed += 1
+        except Exception as e:
+            logger.error(f"Failed to register s3://{bucket}/{s3_key}: {str(e)}")
+            errors.append(e)
+    
+    if errors:
+        raise errors[0]
+    return {'processed': processed}
+
+def finalize_upload(document_id, bucket, s3_key, file_size, content_hash=None, shingles=None, version_id=None):
+    """
+    Mark a pending document as uploaded and start its processing
+    
+    The pending -> uploaded transition is conditional, so the direct upload
+    path and (possibly repeated) S3 events process each document once. If
+    the work after it fails, the document goes back to pending and the error
+    propagates, so a retried S3 event processes it again. The object is
+    moved to content-addressed storage; content that was uploaded before
+    reuses its processing results instead of starting Textract. The upload
+    object is deleted last, once everything else has succeeded.
+    
+    Args:
+        document_id (str): Document ID
+        bucket (str): Bucket holding the object
+        s3_key (str): Object key
+        file_size (int): Object size in bytes
+        content_hash (str): SHA-256 of the object if the bytes are already in memory
+        shingles (set): Raw-block shingles if the bytes are already in memory;
+            otherwise the object is streamed from S3 once to compute both
+        version_id (str): Version of the upload object (the bucket is versioned)
+    
+    Returns:
+        dict: Updated document record, or None if it was already processed
+    """
+    table = dynamodb.Table(DOCUMENTS_TABLE)
+    
+    try:
+        document = table.update_item(
+            Key={'document_id': document_id},
+            UpdateExpression='SET #status = :uploaded, file_size = :size, upload_timestamp = :timestamp',
+            ConditionExpression='#status = :pending AND s3_key = :s3_key',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':uploaded': 'uploaded',
+                ':pending': 'pending_upload',
+                ':size': file_size,
+                ':timestamp': datetime.utcnow().isoformat(),
+                ':s3_key': s3_key
             },
-            'body': json.dumps({
-                'success': True,
-                'document_id': document_id,
-                's3_key': s3_key,
-                'message': 'Document uploaded successfully and processing started'
-            })
-        }
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logger.info(f"Document {document_id} already registered, skipping")
+            return None
+        raise
+    
+    try:
+        document = register_upload(document, bucket, s3_key, file_size, content_hash, shingles)
+    except Exception:
+        release_upload(document_id, s3_key)
+        raise
+    
+    content_store.discard_upload(bucket, s3_key, version_id)
+    return document
+
+def release_upload(document_id, s3_key):
+    """
+    Return a document whose registration failed to pending_upload, pointing
+    at its upload object again so the retry's claim matches
+    """
+    try:
+        dynamodb.Table(DOCUMENTS_TABLE).update_item(
+            Key={'document_id': document_id},
+            UpdateExpression='SET #status = :pending, s3_key = :s3_key',
+            ConditionExpression='#status = :uploaded',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':pending': 'pending_upload', ':uploaded': 'uploaded', ':s3_key': s3_key}
+        )
+    except ClientError as e:
+        logger.error(f"Could not release document {document_id} for retry: {str(e)}")
+
+def register_upload(document, bucket, s3_key, file_size, content_hash=None, shingles=None):
+    """
+    Link an uploaded document to its content and start processing
+    
+    Returns:
+        dict: Updated document record
+    """
+    document_id = document['document_id']
+    table = dynamodb.Table(DOCUMENTS_TABLE)
+    
+    if content_hash is None or shingles is None:
+        content_hash, shingles = read_upload_digest(bucket, s3_key)
+    
+    content, is_new = content_store.register_content(
+        content_hash, bucket, s3_key, file_size, document.get('file_type')
+    )
+    
+    try:
+        # Point the document at the shared object and any results already available
+        updates = {'content_hash': content_hash, 's3_key': content['s3_key']}
+        results = content_store.result_fields(content)
+        if results:
+            updates.update(results)
+            updates['processing_status'] = 'processed'
+        elif content.get('status') == 'processing':
+            updates['processing_status'] = 'processing'
+            updates['textract_job_id'] = content.get('textract_job_id')
+        update_document(document_id, updates)
+        document.update(updates)
+        
+        reuse_content = bool(results) or content.get('status') == 'processing'
+        
+        # Check the user's earlier uploads for a near-identical file
+        duplicate_of = find_duplicate_upload(document_id, document['user_id'], shingles, lookup=not reuse_content)
+        if duplicate_of:
+            table.update_item(
+                Key={'document_id': document_id},
+                UpdateExpression='SET duplicate_of = :duplicate_of, duplicate_score = :score, processing_status = :status',
+                ExpressionAttributeValues={
+                    ':duplicate_of': duplicate_of['document_id'],
+                    ':score': str(round(duplicate_of['score'], 4)),
+                    ':status': 'duplicate'
+                }
+            )
+            document['duplicate_of'] = duplicate_of['document_id']
         
+        start_processing(document, bucket, start_textract=not reuse_content and not duplicate_of)
+    except Exception:
+        # The document is released for a retry, which counts the content again
+        try:
+            content_store.release_content(content_hash)
+        except ClientError as e:
+            logger.error(f"Could not release content {content_hash}: {str(e)}")
+        raise
+    return document
+
+def start_processing(document, bucket, start_textract=True):
+    """
+    Start Textract (or reuse a cached OCR result) and publish the upload event
+    
+    Args:
+        document (dict): Document record (s3_key points at the content object)
+        bucket (str): Bucket holding the content object
+        start_textract (bool): False when the content's results are reused
+    """
+    document_id = document['document_id']
+    file_type = document.get('file_type')
+    content_hash = document.get('content_hash')
+    
+    # Process PDFs and images once per content
+    if start_textract and file_type in PROCESSABLE_TYPES and content_store.claim_processing(content_hash):
+        try:
+            cached = use_cached_ocr(document, bucket)
+        except Exception as e:
+            # The claim is still held; let Textract produce the result instead
+            logger.error(f"Failed to publish cached OCR result for {content_hash}: {str(e)}")
+            cached = False
+        if not cached:
+            start_textract_job(document, bucket)
+    
+    # Trigger document processing via EventBridge (sent when the invocation ends)
+    event_publisher.publish('vpflow.document', 'Document Uploaded', {
+        'document_id': document_id,
+        'user_id': document['user_id'],
+        's3_bucket': bucket,
+        's3_key': document['s3_key'],
+        'file_type': file_type,
+        'workflow_name': document.get('workflow_name'),
+        'content_hash': content_hash,
+        'processing_status': document.get('processing_status'),
+        'duplicate_of': document.get('duplicate_of')
+    })
+
+def use_cached_ocr(document, bucket):
+    """
+    Complete processing from the OCR cache if this content was recognized before
+    
+    Returns:
+        bool: True on a cache hit
+    """
+    content_hash = document.get('content_hash')
+    try:
+        results = ocr_cache.lookup(bucket, content_hash, ocr_cache.features_key(TEXTRACT_MODE))
+        if not results:
+            return False
+        text = ocr_cache.read_text(bucket, results['processed_text_s3_key'])
     except ClientError as e:
-        logger.error(f"AWS service error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
+        logger.warning(f"OCR cache lookup failed for {content_hash}: {str(e)}")
+        return False
+    
+    # The content-hash index may not list this document yet, so pass it directly
+    content_store.publish_text(content_hash, results, text, [document])
+    document.update(results)
+    document['processing_status'] = 'processed'
+    logger.info(f"Reused cached OCR result for document {document['document_id']}")
+    return True
+
+def start_textract_job(document, bucket):
+    """
+    Start the Textract job for a document's content; textract_handler
+    collects the result
+    """
+    document_id = document['document_id']
+    content_hash = document.get('content_hash')
+    
+    try:
+        job_kwargs = {}
+        if TEXTRACT_SNS_TOPIC_ARN and TEXTRACT_SNS_ROLE_ARN:
+            job_kwargs['NotificationChannel'] = {
+                'SNSTopicArn': TEXTRACT_SNS_TOPIC_ARN,
+                'RoleArn': TEXTRACT_SNS_ROLE_ARN
+            }
+        
+        if TEXTRACT_MODE == 'analysis':
+            # One analysis job yields lines as well as forms and tables
+            start_job = textract_client.start_document_analysis
+            job_kwargs['FeatureTypes'] = list(ocr_cache.ANALYSIS_FEATURES)
+        else:
+            start_job = textract_client.start_document_text_detection
+        
+        textract_response = start_job(
+            DocumentLocation={
+                'S3Object': {
+                    'Bucket': bucket,
+                    'Name': document['s3_key']
+                }
             },
-            'body': json.dumps({
-                'error': 'Failed to upload document',
-                'details': str(e)
-            })
-        }
+            # Textract returns the original job for a reused token, so the token
+            # is per attempt: content whose job failed gets a new job when a
+            # later upload claims it. The tag links the job to its content
+            ClientRequestToken=document_id,
+            JobTag=content_hash,
+            **job_kwargs
+        )
+        
+        # Record the job on the content and on the document
+        content_store.update_content(content_hash, textract_job_id=textract_response['JobId'])
+        update_document(document_id, {
+            'textract_job_id': textract_response['JobId'],
+            'processing_status': 'processing'
+        })
+        document['processing_status'] = 'processing'
+        
+        logger.info(f"Started Textract job {textract_response['JobId']} for document {document_id}")
         
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error',
-                'details': str(e)
-            })
+        logger.error(f"Failed to start Textract job: {str(e)}")
+        # Release the claim on any error (including connection and parameter
+        # errors) so a later upload of the same content can retry
+        content_store.update_content(content_hash, status='failed')
+        # Continue without failing - manual processing can be done later
+
+def update_document(document_id, fields):
+    """
+    Set fields on a document record
+    """
+    dynamodb.Table(DOCUMENTS_TABLE).update_item(
+        Key={'document_id': document_id},
+        UpdateExpression='SET ' + ', '.join(f'#f{i} = :v{i}' for i in range(len(fields))),
+        ExpressionAttributeNames={f'#f{i}': name for i, name in enumerate(fields)},
+        ExpressionAttributeValues={f':v{i}': value for i, value in enumerate(fields.values())}
+    )
+
+def normalize_workflow_name(workflow_name):
+    """
+    Workflow name to store, DEFAULT_WORKFLOW_NAME when missing or blank
+    
+    DynamoDB rejects an empty string or null for an index key attribute.
+    """
+    if workflow_name is None:
+        return DEFAULT_WORKFLOW_NAME
+    workflow_name = str(workflow_name).strip()
+    return workflow_name or DEFAULT_WORKFLOW_NAME
+
+def create_pending_document(document_id, user_id, file_name, file_type, workflow_name, s3_key):
+    """
+    Save the document record before its content arrives in S3
+    """
+    workflow_name = normalize_workflow_name(workflow_name)
+    dynamodb.Table(DOCUMENTS_TABLE).put_item(
+        Item={
+            'document_id': document_id,
+            'user_id': user_id,
+            'file_name': file_name,
+            'file_type': file_type,
+            'workflow_name': workflow_name,
+            's3_bucket': BUCKET_NAME,
+            's3_key': s3_key,
+            'created_timestamp': datetime.utcnow().isoformat(),
+            'status': 'pending_upload',
+            'processing_status': 'pending'
+        }
+    )
+
+def build_s3_key(user_id, document_id, file_name):
+    """Build the upload key; the S3 event only fires for this prefix"""
+    return f"{UPLOAD_PREFIX}{user_id}/{document_id}_{file_name}"
+
+def owns_upload_key(user_id, s3_key):
+    """Check that an upload key belongs to the requesting user"""
+    return s3_key.startswith(f"{UPLOAD_PREFIX}{user_id}/")
+
+def choose_part_size(file_size):
+    """
+    Choose a multipart part size for a file
+    
+    Parts are at least MIN_PART_SIZE and grow in whole MiB so that no upload
+    needs more than MAX_PARTS parts.
+    
+    Returns:
+        int: Part size in bytes
+    """
+    part_size = max(MIN_PART_SIZE, math.ceil(file_size / MAX_PARTS / MIB) * MIB)
+    return min(part_size, MAX_PART_SIZE)
+
+def presign_parts(s3_key, upload_id, part_numbers):
+    """
+    Presign upload_part URLs
+    
+    Returns:
+        list: Dicts with part_number and url
+    """
+    return [
+        {
+            'part_number': part_number,
+            'url': s3_client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': BUCKET_NAME,
+                    'Key': s3_key,
+                    'UploadId': upload_id,
+                    'PartNumber': part_number
+                },
+                ExpiresIn=PRESIGNED_URL_EXPIRY
+            )
         }
+        for part_number in part_numbers
+    ]
+
+def upload_headers(file_type, metadata):
+    """Headers the client must send with a presigned PUT"""
+    headers = {'Content-Type': file_type}
+    for name, value in metadata.items():
+        headers[f'x-amz-meta-{name}'] = value
+    return headers
+
+def read_upload_digest(bucket, s3_key):
+    """
+    Stream an object from S3 once and compute its SHA-256 and raw-block shingles
+    
+    Chunks are a multiple of the block size, so blocks line up with the
+    in-memory computation.
+    
+    Returns:
+        tuple: (SHA-256 hex digest, set of shingles)
+    """
+    digest = hashlib.sha256()
+    shingles = set()
+    body = s3_client.get_object(Bucket=bucket, Key=s3_key)['Body']
+    for chunk in body.iter_chunks(chunk_size=STREAM_CHUNK_SIZE):
+        digest.update(chunk)
+        shingles.update(similarity_index.raw_shingles(chunk))
+    return digest.hexdigest(), shingles
+
+def find_duplicate_upload(document_id, user_id, shingles, lookup=True):
+    """
+    Look for an earlier upload by the same user with near-identical content
+    and index the new file's raw-block signature
+    
+    Args:
+        document_id (str): ID of the new document
+        user_id (str): Uploading user
+        shingles (set): Raw-block shingles of the uploaded file
+        lookup (bool): False to only index the signature
+    
+    Returns:
+        dict: document_id and score of the closest earlier upload, or None
+    """
+    try:
+        signature = similarity_index.minhash(shingles)
+        if signature is None:
+            return None
+        
+        matches = []
+        if lookup:
+            matches = similarity_index.find_similar(
+                signature, user_id,
+                kind=similarity_index.RAW,
+                threshold=DUPLICATE_THRESHOLD,
+                limit=1,
+                exclude_id=document_id
+            )
+        similarity_index.index_signature(document_id, user_id, signature, similarity_index.RAW)
+        
+        if matches:
+            original, score = matches[0]
+            logger.info(f"Document {document_id} duplicates {original['document_id']} (estimated Jaccard {score:.2f})")
+            return {'document_id': original['document_id'], 'score': score}
+    
+    except Exception as e:
+        # Duplicate detection is best effort and must not block uploads
+        logger.warning(f"Duplicate check failed for document {document_id}: {str(e)}")
+    
+    return None
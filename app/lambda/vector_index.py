@@ -0,0 +1,306 @@
+"""
+Vector index for semantic document search
+Stores chunk embeddings of processed (Textract) document text in PostgreSQL
+with pgvector and answers approximate nearest-neighbor queries per user
+"""
+
+import os
+import logging
+import threading
+from functools import lru_cache
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Environment variables (same connection settings as app/database)
+DB_HOST = os.environ.get('DB_HOST')
+DB_PORT = os.environ.get('DB_PORT', '5432')
+DB_NAME = os.environ.get('DB_NAME', 'vpflow')
+DB_USER = os.environ.get('DB_USER', 'postgres')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'text-embedding-3-small')
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', '1536'))
+HNSW_EF_SEARCH = int(os.environ.get('HNSW_EF_SEARCH', '64'))
+# pgvector >= 0.8 keeps scanning the HNSW graph until enough rows pass the
+# user filter; set to an empty string on older pgvector versions
+HNSW_ITERATIVE_SCAN = os.environ.get('HNSW_ITERATIVE_SCAN', 'relaxed_order')
+
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 200
+EMBEDDING_BATCH_SIZE = 100
+
+# Connection reused across warm invocations
+_connection = None
+_connection_lock = threading.Lock()
+_schema_ready = False
+
+def is_configured():
+    """
+    Check whether the vector index can be used in this environment
+    """
+    return bool(DB_HOST and OPENAI_API_KEY)
+
+def get_connection():
+    """
+    Get the shared database connection, reconnecting if it was closed
+
+    Returns:
+        psycopg.Connection: Autocommit connection
+    """
+    global _connection, _schema_ready
+
+    import psycopg
+
+    with _connection_lock:
+        if _connection is None or _connection.closed:
+            _connection = psycopg.connect(
+                host=DB_HOST,
+                port=DB_PORT,
+                dbname=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                autocommit=True,
+                connect_timeout=5
+            )
+
+        if not _schema_ready:
+            init_vector_index(_connection)
+            _schema_ready = True
+
+        return _connection
+
+def init_vector_index(conn):
+    """
+    Create the chunk table and its indexes if they do not exist
+
+    Args:
+        conn: psycopg connection
+    """
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS document_chunks (
+                document_id VARCHAR(255) NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                user_id VARCHAR(255) NOT NULL,
+                workflow_name VARCHAR(500),
+                content TEXT NOT NULL,
+                embedding vector({EMBEDDING_DIMENSIONS}) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (document_id, chunk_index)
+            )
+        """)
+        # HNSW index for approximate nearest-neighbor search on cosine distance
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding
+            ON document_chunks USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_document_chunks_user_id
+            ON document_chunks(user_id)
+        """)
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Split text into overlapping chunks, preferring line breaks as boundaries
+
+    Args:
+        text (str): Processed document text
+        chunk_size (int): Maximum characters per chunk
+        overlap (int): Characters shared between consecutive chunks
+
+    Returns:
+        list: Non-empty text chunks
+    """
+    text = (text or '').strip()
+    chunks = []
+    start = 0
+
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Break at the last newline (or space) in the second half of the window
+            boundary = max(text.rfind('\n', start + chunk_size // 2, end), text.rfind(' ', start + chunk_size // 2, end))
+            if boundary > start:
+                end = boundary
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+
+    return chunks
+
+@lru_cache(maxsize=1)
+def get_openai_client():
+    """
+    Get the OpenAI client (created once per container)
+    """
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+def embed_texts(texts):
+    """
+    Compute embeddings for a list of texts in batches
+
+    Returns:
+        list: One embedding (list of floats) per input text
+    """
+    embeddings = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        response = get_openai_client().embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=texts[start:start + EMBEDDING_BATCH_SIZE],
+            dimensions=EMBEDDING_DIMENSIONS
+        )
+        embeddings.extend(item.embedding for item in response.data)
+    return embeddings
+
+@lru_cache(maxsize=512)
+def embed_query(query):
+    """
+    Compute (and cache per container) the embedding of a search query
+
+    Returns:
+        tuple: Query embedding
+    """
+    return tuple(embed_texts([query])[0])
+
+def to_vector_literal(embedding):
+    """
+    Format an embedding as a pgvector literal
+    """
+    return '[' + ','.join(f'{value:.7g}' for value in embedding) + ']'
+
+def embed_document(text):
+    """
+    Chunk and embed processed text once, so documents sharing the same
+    content can be indexed without calling the embedding API again
+
+    Returns:
+        list: (chunk, embedding) pairs in chunk order
+    """
+    chunks = chunk_text(text)
+    embeddings = embed_texts(chunks) if chunks else []
+    return list(zip(chunks, embeddings))
+
+def index_document(document_id, user_id, workflow_name, text, embedded_chunks=None):
+    """
+    Chunk, embed and store a document's processed text, replacing older chunks
+
+    Args:
+        document_id (str): Document ID
+        user_id (str): Owner of the document
+        workflow_name (str): Workflow name used for filtering
+        text (str): Processed document text (Textract output)
+        embedded_chunks (list): Output of embed_document(text), when already computed
+
+    Returns:
+        int: Number of chunks indexed
+    """
+    if embedded_chunks is None:
+        embedded_chunks = embed_document(text)
+
+    conn = get_connection()
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM document_chunks WHERE document_id = %s", (document_id,))
+            cur.executemany(
+                """
+                INSERT INTO document_chunks (document_id, chunk_index, user_id, workflow_name, content, embedding)
+                VALUES (%s, %s, %s, %s, %s, %s::vector)
+                """,
+                [
+                    (document_id, index, user_id, workflow_name, chunk, to_vector_literal(embedding))
+                    for index, (chunk, embedding) in enumerate(embedded_chunks)
+                ]
+            )
+
+    logger.info(f"Indexed {len(embedded_chunks)} chunks for document {document_id}")
+    return len(embedded_chunks)
+
+def delete_document(document_id):
+    """
+    Remove a document's chunks from the index
+    """
+    conn = get_connection()
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM document_chunks WHERE document_id = %s", (document_id,))
+
+def search_chunks(user_id, query, limit=10, min_score=0.3, workflow_filter=None):
+    """
+    Approximate nearest-neighbor search over a user's chunks
+
+    Args:
+        user_id (str): Only chunks owned by this user are returned
+        query (str): Natural-language query
+        limit (int): Maximum number of chunks
+        min_score (float): Minimum cosine similarity (0-1) of returned chunks
+        workflow_filter (str): Exact workflow name (optional)
+
+    Returns:
+        list: Dicts with document_id, chunk_index, content and score, best first
+    """
+    vector = to_vector_literal(embed_query(query))
+
+    sql = """
+        SELECT document_id, chunk_index, content, 1 - (embedding <=> %(vector)s::vector) AS score
+        FROM document_chunks
+        WHERE user_id = %(user_id)s
+    """
+    params = {'vector': vector, 'user_id': user_id, 'limit': limit}
+    if workflow_filter:
+        sql += " AND workflow_name = %(workflow)s"
+        params['workflow'] = workflow_filter
+    # Ordering by the distance operator itself lets the planner use the HNSW index
+    sql += " ORDER BY embedding <=> %(vector)s::vector LIMIT %(limit)s"
+
+    conn = get_connection()
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute(f"SET LOCAL hnsw.ef_search = {max(HNSW_EF_SEARCH, limit)}")
+            if HNSW_ITERATIVE_SCAN:
+                cur.execute(f"SET LOCAL hnsw.iterative_scan = {HNSW_ITERATIVE_SCAN}")
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+
+    return [
+        {'document_id': row[0], 'chunk_index': row[1], 'content': row[2], 'score': float(row[3])}
+        for row in rows
+        if row[3] >= min_score
+    ]
+
+def search_documents(user_id, query, limit=10, min_score=0.3, workflow_filter=None, chunks_per_document=3):
+    """
+    Semantic search returning the best-matching documents
+
+    Args:
+        user_id (str): Only documents owned by this user are returned
+        query (str): Natural-language query
+        limit (int): Maximum number of documents
+        min_score (float): Minimum cosine similarity of the best chunk
+        workflow_filter (str): Exact workflow name (optional)
+        chunks_per_document (int): Chunks fetched per requested document, so a
+            few long documents do not crowd out the rest
+
+    Returns:
+        list: Dicts with document_id, score and the best matching chunk text
+    """
+    chunks = search_chunks(user_id, query, limit * chunks_per_document, min_score, workflow_filter)
+
+    documents = {}
+    for chunk in chunks:
+        # Chunks arrive best first, so the first chunk per document is its best
+        if chunk['document_id'] not in documents:
+            documents[chunk['document_id']] = {
+                'document_id': chunk['document_id'],
+                'score': chunk['score'],
+                'matched_text': chunk['content']
+            }
+
+    return list(documents.values())[:limit]
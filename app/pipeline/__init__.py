@@ -0,0 +1,22 @@
+"""
+Local job queue and stage workers for document ingestion
+
+Documents move through ocr -> markdown -> lightrag -> diagram as jobs in a
+durable queue (SQLite, or PostgreSQL with SKIP LOCKED), each stage with its
+own worker pool, retries and idempotency keys.
+"""
+
+from .job_queue import Job, PostgresJobQueue, SQLiteJobQueue, open_queue
+from .runner import PipelineRunner, Stage
+from .stages import STAGE_NAMES, build_stages
+
+__all__ = [
+    'Job',
+    'PostgresJobQueue',
+    'SQLiteJobQueue',
+    'open_queue',
+    'PipelineRunner',
+    'Stage',
+    'STAGE_NAMES',
+    'build_stages',
+]
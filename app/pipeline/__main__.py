@@ -0,0 +1,172 @@
+"""
+Command-line entry point of the ingestion pipeline (run from app/)
+
+    python -m pipeline enqueue ./scans s3://vpbank-documents/uploads/
+    python -m pipeline run --concurrency ocr=8,lightrag=1
+    python -m pipeline run --until-idle --stages ocr,markdown --replay textract/outputs
+    python -m pipeline status
+
+The queue is a SQLite file by default (PIPELINE_QUEUE, pipeline.db); a
+postgresql:// URL lets workers on several machines share one queue.
+Enqueuing a document that is already queued or done is a no-op.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+from .job_queue import open_queue
+from .runner import PipelineRunner
+from .stages import STAGE_NAMES, _textract_modules, build_stages
+
+logger = logging.getLogger(__name__)
+
+
+def parse_concurrency(value):
+    """Parse 'ocr=8,lightrag=1' into a dict"""
+    concurrency = {}
+    for item in filter(None, value.split(',')):
+        name, _, count = item.partition('=')
+        concurrency[name.strip()] = int(count)
+    return concurrency
+
+
+def build_processor(args):
+    processor, _ = _textract_modules()
+    from ocr_cache import OcrCache
+    from textract_jobs import TextractJobOrchestrator
+
+    if args.replay:
+        return processor.DocumentProcessor(
+            processor.replay_orchestrator(args.replay, args.replay_latency), args.output_dir, mode=args.mode
+        )
+
+    import boto3
+    session = boto3.Session(profile_name=args.profile)
+    s3_client = session.client('s3')
+    queue_url = os.environ.get('TEXTRACT_SQS_QUEUE_URL')
+    orchestrator = TextractJobOrchestrator(
+        session.client('textract'),
+        sqs_client=session.client('sqs') if queue_url else None,
+        queue_url=queue_url,
+        sns_topic_arn=os.environ.get('TEXTRACT_SNS_TOPIC_ARN'),
+        sns_role_arn=os.environ.get('TEXTRACT_SNS_ROLE_ARN'),
+    )
+    return processor.DocumentProcessor(
+        orchestrator,
+        args.output_dir,
+        bucket_name=args.bucket,
+        s3_client=s3_client,
+        mode=args.mode,
+        chunk_pages=args.chunk_pages,
+        cache=OcrCache(args.cache, s3_client) if args.cache else None,
+    )
+
+
+def enqueue(args, queue):
+    processor, _ = _textract_modules()
+    s3_client = None
+    if any(source.startswith('s3://') for source in args.sources):
+        import boto3
+        s3_client = boto3.Session(profile_name=args.profile).client('s3')
+    sources = processor.expand_sources(args.sources, s3_client)
+    if not sources:
+        raise SystemExit("No documents to enqueue.")
+
+    created = 0
+    for source in sources:
+        # The source is the idempotency key: the same document is never queued twice
+        _, is_new = queue.enqueue(args.stage, {'source': source}, source, max_attempts=args.max_attempts)
+        created += is_new
+    logger.info(f"Enqueued {created} of {len(sources)} documents at stage {args.stage}")
+
+
+def run(args, queue):
+    names = tuple(name.strip() for name in args.stages.split(','))
+    stages = build_stages(
+        build_processor(args) if 'ocr' in names else None,
+        names=names,
+        concurrency=parse_concurrency(args.concurrency),
+        max_attempts=args.max_attempts,
+        retry_base=args.retry_base,
+        lightrag_dir=args.lightrag_dir,
+    )
+    runner = PipelineRunner(queue, stages, poll_interval=args.poll_interval)
+    start = time.perf_counter()
+    try:
+        if args.until_idle:
+            runner.run_until_idle()
+        else:
+            runner.run_forever()
+    finally:
+        for stage in stages:
+            close = getattr(stage.handler, 'close', None)
+            if close:
+                close()
+    print(json.dumps({
+        'elapsed': round(time.perf_counter() - start, 3),
+        'processed': runner.processed,
+        'failed_attempts': runner.failed,
+        'queue': queue.stats(),
+    }))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pipeline', description="Document ingestion job queue and workers.")
+    parser.add_argument('--queue', default=os.environ.get('PIPELINE_QUEUE', 'pipeline.db'),
+                        help="SQLite file or postgresql:// URL")
+    parser.add_argument('--max-attempts', type=int, default=3, help="Attempts per job before it is marked failed")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = commands.add_parser('enqueue', help="Queue documents for processing")
+    enqueue_parser.add_argument('sources', nargs='+', help="Local files or folders, s3:// objects or prefixes")
+    enqueue_parser.add_argument('--stage', default=STAGE_NAMES[0], choices=STAGE_NAMES)
+    enqueue_parser.add_argument('--profile', default=os.environ.get('AWS_PROFILE'))
+
+    run_parser = commands.add_parser('run', help="Start the stage workers")
+    run_parser.add_argument('--stages', default=','.join(STAGE_NAMES), help="Comma-separated stages to run")
+    run_parser.add_argument('--concurrency', default='', help="Workers per stage, e.g. ocr=8,lightrag=1")
+    run_parser.add_argument('--until-idle', action='store_true', help="Exit once the queue is drained")
+    run_parser.add_argument('--poll-interval', type=float, default=0.5)
+    run_parser.add_argument('--retry-base', type=float, default=2.0, help="Base retry delay in seconds")
+    run_parser.add_argument('--output-dir', default='textract/outputs')
+    run_parser.add_argument('--bucket', default=os.environ.get('TEXTRACT_BUCKET', 'vpbank-documents'))
+    run_parser.add_argument('--profile', default=os.environ.get('AWS_PROFILE'))
+    run_parser.add_argument('--mode', choices=('analysis', 'detection'),
+                            default=os.environ.get('TEXTRACT_MODE', 'analysis'))
+    run_parser.add_argument('--chunk-pages', type=int)
+    run_parser.add_argument('--cache', default=os.environ.get('OCR_CACHE'), help="OCR cache folder or s3:// URI")
+    run_parser.add_argument('--lightrag-dir', help="LightRAG working directory")
+    run_parser.add_argument('--replay', metavar='RESULTS_DIR',
+                            help="Replay saved Textract results instead of calling AWS")
+    run_parser.add_argument('--replay-latency', type=float, default=0.0)
+
+    retry_parser = commands.add_parser('retry', help="Requeue failed jobs")
+    retry_parser.add_argument('--stage', choices=STAGE_NAMES)
+
+    commands.add_parser('status', help="Print job counts per stage and status")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(threadName)s | %(message)s")
+    logging.getLogger('botocore').setLevel(logging.WARNING)
+    logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+    queue = open_queue(args.queue)
+    if args.command == 'enqueue':
+        enqueue(args, queue)
+    elif args.command == 'run':
+        run(args, queue)
+    elif args.command == 'retry':
+        logger.info(f"Requeued {queue.retry_failed(args.stage)} failed jobs")
+    else:
+        print(json.dumps(queue.stats(), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
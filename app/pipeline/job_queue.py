@@ -0,0 +1,455 @@
+"""
+Durable job queues for the ingestion pipeline
+
+SQLiteJobQueue keeps jobs in a single SQLite file and needs nothing but the
+standard library; PostgresJobQueue stores them in a PostgreSQL table and
+claims with FOR UPDATE SKIP LOCKED so several machines can share it.
+
+A job belongs to one stage and carries a JSON payload. Its idempotency key is
+unique per stage, so enqueuing the same document twice is a no-op. Claimed
+jobs hold a lease, which the runner extends while the handler is running; a
+job whose worker died is claimed again once the lease expires, or marked
+failed if that was its last attempt.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+LEASE_EXPIRED_ERROR = 'Lease expired on the last attempt'
+
+
+@dataclass
+class Job:
+    id: int
+    stage: str
+    idempotency_key: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+    lease_token: Optional[str] = None
+
+
+class SQLiteJobQueue:
+    """
+    Job queue in a SQLite database
+
+    Claims run in BEGIN IMMEDIATE transactions, which SQLite serializes, so
+    any number of worker threads (or processes on the same file) can share
+    one queue.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stage TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            available_at REAL NOT NULL,
+            lease_token TEXT,
+            locked_until REAL,
+            result TEXT,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            UNIQUE (stage, idempotency_key)
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (stage, status, available_at);
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Database file, or ':memory:' for a throwaway queue
+        """
+        self.path = path
+        self._local = threading.local()
+        # A private in-memory database exists once per connection, so share one
+        self._shared = self._connect() if path == ':memory:' else None
+        self._shared_lock = threading.Lock()
+        self._conn().executescript(self.SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _conn(self):
+        if self._shared is not None:
+            return self._shared
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _transaction(self, fn):
+        """Run fn(conn) inside BEGIN IMMEDIATE ... COMMIT"""
+        lock = self._shared_lock if self._shared is not None else None
+        if lock:
+            lock.acquire()
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(conn)
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            return result
+        finally:
+            if lock:
+                lock.release()
+
+    def enqueue(self, stage, payload, idempotency_key=None, max_attempts=3, delay=0):
+        """
+        Add a job unless one with the same stage and key exists
+
+        Returns:
+            tuple: (job ID, True if the job was created)
+        """
+        now = time.time()
+        key = idempotency_key or uuid.uuid4().hex
+
+        def insert(conn):
+            cursor = conn.execute(
+                """
+                INSERT OR IGNORE INTO jobs
+                    (stage, idempotency_key, payload, max_attempts, available_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (stage, key, json.dumps(payload), max_attempts, now + delay, now, now)
+            )
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+            row = conn.execute(
+                'SELECT id FROM jobs WHERE stage = ? AND idempotency_key = ?', (stage, key)
+            ).fetchone()
+            return row['id'], False
+
+        return self._transaction(insert)
+
+    def claim(self, stage, lease_seconds=300):
+        """
+        Claim the next available job of a stage
+
+        Returns:
+            Job: The claimed job, or None if none is available
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+
+        def take(conn):
+            # A lapsed lease on the last attempt means the worker died; running
+            # the job again would exceed max_attempts
+            conn.execute(
+                """
+                UPDATE jobs SET status = 'failed', last_error = ?, lease_token = NULL,
+                    locked_until = NULL, updated_at = ?
+                WHERE stage = ? AND status = 'running' AND locked_until < ?
+                  AND attempts >= max_attempts
+                """,
+                (LEASE_EXPIRED_ERROR, now, stage, now)
+            )
+            row = conn.execute(
+                """
+                SELECT * FROM jobs
+                WHERE stage = ?
+                  AND ((status = 'pending' AND available_at <= ?)
+                       OR (status = 'running' AND locked_until < ?))
+                ORDER BY available_at, id
+                LIMIT 1
+                """,
+                (stage, now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                """
+                UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                    lease_token = ?, locked_until = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (token, now + lease_seconds, now, row['id'])
+            )
+            return Job(row['id'], row['stage'], row['idempotency_key'], json.loads(row['payload']),
+                       row['attempts'] + 1, row['max_attempts'], token)
+
+        return self._transaction(take)
+
+    def complete(self, job, result=None):
+        """
+        Mark a claimed job done
+
+        Returns:
+            bool: False if the lease was lost to another worker
+        """
+        cursor = self._conn().execute(
+            """
+            UPDATE jobs SET status = 'done', result = ?, lease_token = NULL,
+                locked_until = NULL, updated_at = ?
+            WHERE id = ? AND lease_token = ?
+            """,
+            (json.dumps(result), time.time(), job.id, job.lease_token)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job, error, retry_delay=0):
+        """
+        Record a failed attempt; the job is retried after retry_delay seconds
+        until it runs out of attempts
+
+        Returns:
+            str: The job's new status
+        """
+        status = FAILED if job.attempts >= job.max_attempts else PENDING
+        now = time.time()
+        self._conn().execute(
+            """
+            UPDATE jobs SET status = ?, last_error = ?, available_at = ?,
+                lease_token = NULL, locked_until = NULL, updated_at = ?
+            WHERE id = ? AND lease_token = ?
+            """,
+            (status, str(error)[:2000], now + retry_delay, now, job.id, job.lease_token)
+        )
+        return status
+
+    def extend_lease(self, job, lease_seconds=300):
+        """Keep a long-running job from being reclaimed"""
+        cursor = self._conn().execute(
+            'UPDATE jobs SET locked_until = ? WHERE id = ? AND lease_token = ?',
+            (time.time() + lease_seconds, job.id, job.lease_token)
+        )
+        return cursor.rowcount == 1
+
+    def retry_failed(self, stage=None):
+        """
+        Make failed jobs available again with fresh attempts
+
+        Returns:
+            int: Number of jobs requeued
+        """
+        query = "UPDATE jobs SET status = 'pending', attempts = 0, available_at = ? WHERE status = 'failed'"
+        params = [time.time()]
+        if stage:
+            query += ' AND stage = ?'
+            params.append(stage)
+        return self._conn().execute(query, params).rowcount
+
+    def has_work(self, stages=None):
+        """True while any job of the given stages is pending or running"""
+        query = "SELECT 1 FROM jobs WHERE status IN ('pending', 'running')"
+        params = []
+        if stages:
+            query += ' AND stage IN (%s)' % ','.join('?' * len(stages))
+            params.extend(stages)
+        return self._conn().execute(query + ' LIMIT 1', params).fetchone() is not None
+
+    def stats(self):
+        """
+        Returns:
+            dict: {stage: {status: count}}
+        """
+        rows = self._conn().execute(
+            'SELECT stage, status, COUNT(*) AS count FROM jobs GROUP BY stage, status'
+        ).fetchall()
+        stats = {}
+        for row in rows:
+            stats.setdefault(row['stage'], {})[row['status']] = row['count']
+        return stats
+
+
+class PostgresJobQueue:
+    """
+    Job queue in a PostgreSQL table, claimed with FOR UPDATE SKIP LOCKED
+
+    Same interface as SQLiteJobQueue; workers on any number of machines can
+    share it. Needs psycopg (already used by app/database).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pipeline_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            stage TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            available_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            lease_token TEXT,
+            locked_until TIMESTAMPTZ,
+            result JSONB,
+            last_error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            UNIQUE (stage, idempotency_key)
+        );
+        CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_claim ON pipeline_jobs (stage, status, available_at);
+    """
+
+    def __init__(self, dsn):
+        """
+        Args:
+            dsn (str): PostgreSQL connection string
+        """
+        import psycopg
+        from psycopg.rows import dict_row
+
+        self._psycopg = psycopg
+        self._row_factory = dict_row
+        self.dsn = dsn
+        self._local = threading.local()
+        with self._conn().cursor() as cur:
+            cur.execute(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or conn.closed:
+            conn = self._local.conn = self._psycopg.connect(self.dsn, autocommit=True, row_factory=self._row_factory)
+        return conn
+
+    def enqueue(self, stage, payload, idempotency_key=None, max_attempts=3, delay=0):
+        key = idempotency_key or uuid.uuid4().hex
+        with self._conn().cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO pipeline_jobs (stage, idempotency_key, payload, max_attempts, available_at)
+                VALUES (%s, %s, %s, %s, now() + make_interval(secs => %s))
+                ON CONFLICT (stage, idempotency_key) DO NOTHING
+                RETURNING id
+                """,
+                (stage, key, json.dumps(payload), max_attempts, delay)
+            )
+            row = cur.fetchone()
+            if row:
+                return row['id'], True
+            cur.execute(
+                'SELECT id FROM pipeline_jobs WHERE stage = %s AND idempotency_key = %s', (stage, key)
+            )
+            return cur.fetchone()['id'], False
+
+    def claim(self, stage, lease_seconds=300):
+        token = uuid.uuid4().hex
+        with self._conn().cursor() as cur:
+            cur.execute(
+                """
+                UPDATE pipeline_jobs SET status = 'failed', last_error = %s, lease_token = NULL,
+                    locked_until = NULL, updated_at = now()
+                WHERE stage = %s AND status = 'running' AND locked_until < now()
+                  AND attempts >= max_attempts
+                """,
+                (LEASE_EXPIRED_ERROR, stage)
+            )
+            cur.execute(
+                """
+                UPDATE pipeline_jobs SET status = 'running', attempts = attempts + 1,
+                    lease_token = %s, locked_until = now() + make_interval(secs => %s), updated_at = now()
+                WHERE id = (
+                    SELECT id FROM pipeline_jobs
+                    WHERE stage = %s
+                      AND ((status = 'pending' AND available_at <= now())
+                           OR (status = 'running' AND locked_until < now()))
+                    ORDER BY available_at, id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, stage, idempotency_key, payload, attempts, max_attempts
+                """,
+                (token, lease_seconds, stage)
+            )
+            row = cur.fetchone()
+        if row is None:
+            return None
+        return Job(row['id'], row['stage'], row['idempotency_key'], row['payload'],
+                   row['attempts'], row['max_attempts'], token)
+
+    def complete(self, job, result=None):
+        with self._conn().cursor() as cur:
+            cur.execute(
+                """
+                UPDATE pipeline_jobs SET status = 'done', result = %s, lease_token = NULL,
+                    locked_until = NULL, updated_at = now()
+                WHERE id = %s AND lease_token = %s
+                """,
+                (json.dumps(result), job.id, job.lease_token)
+            )
+            return cur.rowcount == 1
+
+    def fail(self, job, error, retry_delay=0):
+        status = FAILED if job.attempts >= job.max_attempts else PENDING
+        with self._conn().cursor() as cur:
+            cur.execute(
+                """
+                UPDATE pipeline_jobs SET status = %s, last_error = %s,
+                    available_at = now() + make_interval(secs => %s),
+                    lease_token = NULL, locked_until = NULL, updated_at = now()
+                WHERE id = %s AND lease_token = %s
+                """,
+                (status, str(error)[:2000], retry_delay, job.id, job.lease_token)
+            )
+        return status
+
+    def extend_lease(self, job, lease_seconds=300):
+        with self._conn().cursor() as cur:
+            cur.execute(
+                """
+                UPDATE pipeline_jobs SET locked_until = now() + make_interval(secs => %s)
+                WHERE id = %s AND lease_token = %s
+                """,
+                (lease_seconds, job.id, job.lease_token)
+            )
+            return cur.rowcount == 1
+
+    def retry_failed(self, stage=None):
+        query = "UPDATE pipeline_jobs SET status = 'pending', attempts = 0, available_at = now() WHERE status = 'failed'"
+        params = []
+        if stage:
+            query += ' AND stage = %s'
+            params.append(stage)
+        with self._conn().cursor() as cur:
+            cur.execute(query, params)
+            return cur.rowcount
+
+    def has_work(self, stages=None):
+        query = "SELECT 1 FROM pipeline_jobs WHERE status IN ('pending', 'running')"
+        params = []
+        if stages:
+            query += ' AND stage = ANY(%s)'
+            params.append(list(stages))
+        with self._conn().cursor() as cur:
+            cur.execute(query + ' LIMIT 1', params)
+            return cur.fetchone() is not None
+
+    def stats(self):
+        with self._conn().cursor() as cur:
+            cur.execute('SELECT stage, status, COUNT(*) AS count FROM pipeline_jobs GROUP BY stage, status')
+            stats = {}
+            for row in cur.fetchall():
+                stats.setdefault(row['stage'], {})[row['status']] = row['count']
+            return stats
+
+
+def open_queue(url):
+    """
+    Open a queue from a URL: postgresql://... or a SQLite file path
+    """
+    if url.startswith(('postgres://', 'postgresql://')):
+        return PostgresJobQueue(url)
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return SQLiteJobQueue(url)
@@ -0,0 +1,177 @@
+"""
+Stage workers for the ingestion pipeline
+
+Each stage has its own pool of worker threads polling the queue for jobs of
+that stage, so a slow stage (LightRAG ingestion) never holds up a fast one
+(OCR) and each stage's concurrency is set independently. When a handler
+returns, its result is enqueued as the payload of the next stage under the
+same idempotency key. While a handler runs, a heartbeat keeps extending the
+job's lease, so long OCR or ingestion jobs are not reclaimed by another
+worker; the lease only lapses when the worker itself dies.
+"""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 0.5
+DEFAULT_LEASE_SECONDS = 900
+
+
+@dataclass
+class Stage:
+    name: str
+    # handler(payload) -> dict passed to next_stage; None ends the chain
+    handler: Callable[[dict], Optional[dict]]
+    concurrency: int = 1
+    max_attempts: int = 3
+    # Retry delay is retry_base * 2 ** (attempt - 1) seconds, with jitter
+    retry_base: float = 2.0
+    next_stage: Optional[str] = None
+    # Extended every lease_seconds / 3 while the handler runs
+    lease_seconds: int = DEFAULT_LEASE_SECONDS
+
+
+class PipelineRunner:
+    """
+    Runs stage worker pools against a job queue
+    """
+
+    def __init__(self, queue, stages, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        Args:
+            queue: SQLiteJobQueue or PostgresJobQueue
+            stages (list): Stage definitions, in chain order
+            poll_interval (float): Idle wait between empty claims, in seconds
+        """
+        self.queue = queue
+        self.stages = {stage.name: stage for stage in stages}
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+        self.processed = {name: 0 for name in self.stages}
+        self.failed = {name: 0 for name in self.stages}
+        self._counter_lock = threading.Lock()
+
+    def submit(self, payload, idempotency_key, stage=None):
+        """
+        Enqueue a document at the first stage (or the given one)
+
+        Returns:
+            tuple: (job ID, True if the job was created)
+        """
+        stage = self.stages[stage] if stage else next(iter(self.stages.values()))
+        return self.queue.enqueue(stage.name, payload, idempotency_key, max_attempts=stage.max_attempts)
+
+    def _heartbeat(self, stage, job, done):
+        """Extend the job's lease until done is set or the lease is lost"""
+        interval = stage.lease_seconds / 3
+        while not done.wait(interval):
+            try:
+                if not self.queue.extend_lease(job, lease_seconds=stage.lease_seconds):
+                    logger.warning(f"{stage.name} job {job.idempotency_key} lost its lease while running")
+                    return
+            except Exception as e:
+                # The next beat retries; the lease still has two intervals left
+                logger.warning(f"Could not extend the lease of {stage.name} job {job.idempotency_key}: {e}")
+
+    @contextmanager
+    def _lease_kept(self, stage, job):
+        """Run the heartbeat for the duration of the block"""
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(stage, job, done),
+            name=f"{threading.current_thread().name}-heartbeat", daemon=True
+        )
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            # Stop before complete() or fail() releases the lease
+            done.set()
+            heartbeat.join()
+
+    def run_job(self, stage, job):
+        """Run one claimed job and advance or retry it"""
+        start = time.perf_counter()
+        try:
+            with self._lease_kept(stage, job):
+                result = stage.handler(job.payload)
+        except Exception as e:
+            delay = stage.retry_base * 2 ** (job.attempts - 1) * random.uniform(0.5, 1.5)
+            status = self.queue.fail(job, e, retry_delay=delay)
+            with self._counter_lock:
+                self.failed[stage.name] += 1
+            if status == 'failed':
+                logger.exception(f"{stage.name} job {job.idempotency_key} failed after {job.attempts} attempts")
+            else:
+                logger.warning(f"{stage.name} job {job.idempotency_key} failed (attempt {job.attempts}), retrying in {delay:.1f}s: {e}")
+            return
+
+        # Enqueue the next stage before completing, so a crash in between
+        # repeats this stage instead of dropping the document
+        next_stage = self.stages.get(stage.next_stage) if stage.next_stage else None
+        if result is not None and next_stage is not None:
+            self.queue.enqueue(next_stage.name, result, job.idempotency_key, max_attempts=next_stage.max_attempts)
+        if not self.queue.complete(job, result):
+            logger.warning(f"{stage.name} job {job.idempotency_key} lost its lease before completing")
+        with self._counter_lock:
+            self.processed[stage.name] += 1
+        logger.info(f"{stage.name} job {job.idempotency_key} done in {time.perf_counter() - start:.2f}s")
+
+    def _worker(self, stage, until_idle):
+        while not self._stop.is_set():
+            job = self.queue.claim(stage.name, lease_seconds=stage.lease_seconds)
+            if job is not None:
+                self.run_job(stage, job)
+                continue
+            if until_idle and not self.queue.has_work(list(self.stages)):
+                return
+            self._stop.wait(self.poll_interval)
+
+    def start(self, until_idle=False):
+        """Start every stage's worker threads"""
+        self._stop.clear()
+        for stage in self.stages.values():
+            for i in range(stage.concurrency):
+                thread = threading.Thread(
+                    target=self._worker, args=(stage, until_idle), name=f"{stage.name}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info("Started workers: " + ", ".join(f"{s.name}={s.concurrency}" for s in self.stages.values()))
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+
+    def stop(self):
+        self._stop.set()
+        self.join()
+
+    def run_until_idle(self):
+        """
+        Process jobs until no stage has pending or running work
+
+        Jobs waiting for a retry count as pending, so this returns only once
+        every document has finished or run out of attempts.
+        """
+        self.start(until_idle=True)
+        self.join()
+
+    def run_forever(self):
+        """Process jobs until interrupted"""
+        self.start()
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info("Stopping workers")
+            self.stop()
@@ -0,0 +1,259 @@
+"""
+Stage handlers for the document ingestion chain
+
+    ocr -> markdown -> lightrag -> diagram
+
+Each handler takes the payload its stage was enqueued with and returns the
+payload of the next stage. Payloads are plain JSON: the source document, its
+output folder and whatever earlier stages produced.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+
+from .runner import Stage
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXTRACT_SRC = os.path.join(APP_DIR, 'textract', 'src')
+
+STAGE_NAMES = ('ocr', 'markdown', 'lightrag', 'diagram')
+
+DEFAULT_CONCURRENCY = {
+    'ocr': 4,
+    'markdown': 2,
+    # LightRAG serializes its own writes; more workers only queue on its locks
+    'lightrag': 1,
+    'diagram': 2,
+}
+
+
+def _textract_modules():
+    """Import the Textract pipeline, whose modules expect src on sys.path"""
+    if TEXTRACT_SRC not in sys.path:
+        sys.path.insert(0, TEXTRACT_SRC)
+    import md_converter
+    import processor
+    return processor, md_converter
+
+
+class OcrStage:
+    """Run a document through Textract into its output folder"""
+
+    def __init__(self, processor):
+        """
+        Args:
+            processor: textract DocumentProcessor; its markdown option is
+                turned off since rendering is a stage of its own
+        """
+        processor.markdown = False
+        self.processor = processor
+
+    def __call__(self, payload):
+        result = self.processor.process_document(payload['source'])
+        return {
+            **payload,
+            'output_folder': result.output_folder,
+            'mode': result.mode,
+            'job_id': result.job_id,
+            'content_hash': result.content_hash,
+            'cached': result.cached,
+            'page_count': result.page_count,
+        }
+
+
+class MarkdownStage:
+    """Render the Markdown of an OCR result"""
+
+    def __init__(self, title=None):
+        self.title = title
+
+    def __call__(self, payload):
+        _, md_converter = _textract_modules()
+        from block_store import find_store
+
+        if payload.get('mode', 'analysis') != 'analysis':
+            # Text detection results have no tables or forms to render
+            return {**payload, 'markdown_path': None}
+        folder = payload['output_folder']
+        result_path = find_store(folder, 'document-analysis')
+        if result_path is None:
+            raise FileNotFoundError(f"No analysis result in {folder}")
+        markdown_path = os.path.join(folder, 'proposal.md')
+        md_converter.convert(result_path, markdown_path, title=self.title or md_converter.DEFAULT_TITLE)
+        return {**payload, 'markdown_path': markdown_path}
+
+
+class LightRAGStage:
+    """
+    Insert a document's Markdown into the LightRAG knowledge base
+
+    LightRAG is async and its storages are bound to the event loop that
+    initialized them, so one loop runs in a background thread for the life of
+    the stage and worker threads submit inserts to it.
+    """
+
+    def __init__(self, working_dir=None):
+        self.working_dir = working_dir
+        self._loop = None
+        self._rag = None
+        self._lock = threading.Lock()
+
+    def _ensure_rag(self):
+        with self._lock:
+            if self._rag is not None:
+                return
+            if self.working_dir:
+                os.makedirs(self.working_dir, exist_ok=True)
+            from knowledge_graph import lightrag_create
+            if self.working_dir:
+                lightrag_create.WORKING_DIR = self.working_dir
+
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='lightrag-loop', daemon=True).start()
+            self._rag = asyncio.run_coroutine_threadsafe(lightrag_create.initialize_rag(), loop).result()
+            self._loop = loop
+
+    def __call__(self, payload):
+        markdown_path = payload.get('markdown_path')
+        if not markdown_path:
+            logger.info(f"No Markdown for {payload['source']}, skipping LightRAG")
+            return {**payload, 'lightrag_id': None}
+
+        self._ensure_rag()
+        with open(markdown_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        # The content hash makes re-ingesting the same document a no-op
+        doc_id = payload.get('content_hash') or os.path.basename(payload['output_folder'])
+        asyncio.run_coroutine_threadsafe(self._rag.ainsert(text, ids=doc_id), self._loop).result()
+        return {**payload, 'lightrag_id': doc_id}
+
+    def close(self):
+        if self._rag is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._rag.finalize_storages(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._rag = None
+
+
+class DiagramStage:
+    """
+    Load a document's workflow into Neptune and render its diagram into the
+    output folder
+
+    The workflow is VPFlow workflow JSON (see sagemaker/agent/graph_loader.py),
+    read from workflow.json in the output folder or from a
+    <document>.workflow.json file next to a local source. Documents without
+    one have no diagram.
+    """
+
+    WORKFLOW_FILE = 'workflow.json'
+
+    def __init__(self, neptune_endpoint=None):
+        self.neptune_endpoint = neptune_endpoint or os.environ.get('NEPTUNE_ENDPOINT')
+
+    def find_workflow(self, payload):
+        """
+        Returns:
+            str: Path of the document's workflow JSON, or None
+        """
+        candidates = [os.path.join(payload['output_folder'], self.WORKFLOW_FILE)]
+        if not payload['source'].startswith('s3://'):
+            candidates.append(os.path.splitext(payload['source'])[0] + '.workflow.json')
+        return next((path for path in candidates if os.path.isfile(path)), None)
+
+    def load_workflow(self, path):
+        """
+        Upsert the workflow into Neptune
+
+        Returns:
+            str: Its workflow_id
+        """
+        import json
+        from sagemaker.agent.create_diagram import NeptuneClient
+        from sagemaker.agent.graph_loader import WorkflowGraphLoader, get_workflow_id
+
+        with open(path, 'r', encoding='utf-8') as f:
+            workflow = json.load(f)
+        if isinstance(workflow, list) and len(workflow) == 1:
+            workflow = workflow[0]
+        if not isinstance(workflow, dict):
+            raise ValueError(f"{path} must hold one workflow object")
+
+        client = NeptuneClient(self.neptune_endpoint)
+        try:
+            if not client.connect():
+                raise RuntimeError("Failed to connect to Neptune")
+            stats = WorkflowGraphLoader(client).load_workflows([workflow])
+        finally:
+            client.disconnect()
+        if stats['failed_batches']:
+            raise RuntimeError(f"{stats['failed_batches']} graph batch(es) failed loading {path}")
+        return get_workflow_id(workflow)
+
+    def __call__(self, payload):
+        if not self.neptune_endpoint:
+            logger.info(f"NEPTUNE_ENDPOINT not set, skipping diagram for {payload['source']}")
+            return {**payload, 'diagram_path': None}
+
+        workflow_path = self.find_workflow(payload)
+        if workflow_path is None:
+            logger.info(f"No workflow JSON for {payload['source']}, skipping diagram")
+            return {**payload, 'workflow_id': None, 'diagram_path': None}
+
+        import json
+        from sagemaker.agent.create_diagram import create_workflow_diagram_from_neptune
+
+        workflow_id = self.load_workflow(workflow_path)
+        diagram = create_workflow_diagram_from_neptune(self.neptune_endpoint, workflow_id)
+        if 'error' in diagram:
+            raise RuntimeError(diagram['error'])
+        diagram_path = os.path.join(payload['output_folder'], 'diagram.json')
+        with open(diagram_path, 'w', encoding='utf-8') as f:
+            json.dump(diagram, f, ensure_ascii=False, indent=2)
+        return {**payload, 'workflow_id': workflow_id, 'diagram_path': diagram_path}
+
+
+def build_stages(processor, names=STAGE_NAMES, concurrency=None, max_attempts=3, retry_base=2.0,
+                 title=None, lightrag_dir=None, neptune_endpoint=None):
+    """
+    Build the chain of stages
+
+    Args:
+        processor: textract DocumentProcessor used by the ocr stage
+        names (tuple): Stages to run, a subsequence of STAGE_NAMES
+        concurrency (dict): Worker threads per stage, overriding
+            DEFAULT_CONCURRENCY
+        max_attempts (int): Attempts per job before it is marked failed
+        retry_base (float): Base retry delay in seconds
+
+    Returns:
+        list: Stage definitions, chained in STAGE_NAMES order
+    """
+    unknown = set(names) - set(STAGE_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+    handlers = {
+        'ocr': lambda: OcrStage(processor),
+        'markdown': lambda: MarkdownStage(title),
+        'lightrag': lambda: LightRAGStage(lightrag_dir),
+        'diagram': lambda: DiagramStage(neptune_endpoint),
+    }
+    selected = [name for name in STAGE_NAMES if name in names]
+    return [
+        Stage(
+            name,
+            handlers[name](),
+            concurrency=concurrency[name],
+            max_attempts=max_attempts,
+            retry_base=retry_base,
+            next_stage=selected[i + 1] if i + 1 < len(selected) else None,
+        )
+        for i, name in enumerate(selected)
+    ]
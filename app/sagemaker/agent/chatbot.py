@@ -3,13 +3,13 @@ from langchain_openai import ChatOpenAI
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 import os
-from typing import List, Dict, AsyncGenerator, Any
+from functools import lru_cache
+from typing import List, Dict, AsyncGenerator, Any, Optional
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from langchain_core.messages import AIMessageChunk
 from langchain.callbacks.base import BaseCallbackHandler
 from sagemaker.agent.graph_tools import GetKnowledgeTool
-from app.database.chat_history import get_recent_chat_history, format_chat_history, save_chat_history
 
 
 load_dotenv()
@@ -35,6 +35,8 @@ def get_message_history(thread_id: str) -> List[Dict[str, Any]]:
     Returns:
         List[Dict[str, Any]]: Danh sách các tin nhắn trong cuộc trò chuyện
     """
+    # Import khi cần: caller tự truyền chat_history thì không cần kết nối database
+    from app.database.chat_history import get_recent_chat_history, format_chat_history
     recent_chat = get_recent_chat_history(thread_id)
     chat_history = format_chat_history(recent_chat)
     return chat_history
@@ -131,7 +133,16 @@ VPFlow-Mentor: VPBank's loan approval workflow typically involves the following
     return agent_executor
 
 
-def get_answer(question: str, thread_id: str) -> Dict:
+@lru_cache(maxsize=1)
+def get_agent() -> AgentExecutor:
+    """
+    Agent dùng chung cho cả process, chỉ khởi tạo ở lần gọi đầu tiên
+    (LLM client, prompt và tools được tái sử dụng giữa các request)
+    """
+    return get_llm_and_agent()
+
+
+def get_answer(question: str, thread_id: str, chat_history: Optional[List[Dict[str, Any]]] = None, save_history: bool = True) -> Dict:
 
     """
     Hàm lấy câu trả lời cho một câu hỏi
@@ -139,15 +150,17 @@ def get_answer(question: str, thread_id: str) -> Dict:
     Args:
         question (str): Câu hỏi của người dùng
         thread_id (str): ID của cuộc trò chuyện
+        chat_history (List[Dict]): Lịch sử chat đã đọc sẵn, nếu None thì đọc từ database
+        save_history (bool): Lưu câu trả lời vào database
         
     Returns:
         str: Câu trả lời từ AI
     """
-    agent = get_llm_and_agent()
+    agent = get_agent()
     
     # Get recent chat history
-    history = get_recent_chat_history(thread_id)
-    chat_history = format_chat_history(history)
+    if chat_history is None:
+        chat_history = get_message_history(thread_id)
 
     result = agent.invoke({
         "input": question,
@@ -155,12 +168,13 @@ def get_answer(question: str, thread_id: str) -> Dict:
     })
     
     # Save chat history to database
-    if isinstance(result, dict) and "output" in result:
+    if save_history and isinstance(result, dict) and "output" in result:
+        from app.database.chat_history import save_chat_history
         save_chat_history(thread_id, question, result["output"])
     
     return result
 
-async def get_answer_stream(docs_id: List[str], question: str, thread_id: str, course_id = str) -> AsyncGenerator[Dict, None]:
+async def get_answer_stream(docs_id: List[str], question: str, thread_id: str, course_id = str, chat_history: Optional[List[Dict[str, Any]]] = None, save_history: bool = True) -> AsyncGenerator[Dict, None]:
     """
     Hàm lấy câu trả lời dạng stream cho một câu hỏi
     
@@ -174,23 +188,21 @@ async def get_answer_stream(docs_id: List[str], question: str, thread_id: str, c
     Args:
         question (str): Câu hỏi của người dùng
         thread_id (str): ID phiên chat
+        chat_history (List[Dict]): Lịch sử chat đã đọc sẵn, nếu None thì đọc từ database
+        save_history (bool): Lưu câu trả lời vào database (tắt khi caller tự lưu)
         
     Returns:
         AsyncGenerator[str, None]: Generator trả về từng phần của câu trả lời
     """
     # Khởi tạo agent với các tools cần thiết
-    agent = get_llm_and_agent()
+    agent = get_agent()
 
     # Lấy lịch sử chat gần đây
-    history = get_recent_chat_history(thread_id)
-
-    chat_history = format_chat_history(history)
-
-    # print(chat_history)
+    if chat_history is None:
+        chat_history = get_message_history(thread_id)
     
     # Biến lưu câu trả lời hoàn chỉnh
     final_answer = ""
-    print(", ".join(docs_id) + '\n' + question)
     
     # Stream từng phần của câu trả lời
     async for event in agent.astream_events(
@@ -213,7 +225,8 @@ async def get_answer_stream(docs_id: List[str], question: str, thread_id: str, c
                 yield content
     
     # Lưu câu trả lời hoàn chỉnh vào database
-    if final_answer:
+    if save_history and final_answer:
+        from app.database.chat_history import save_chat_history
         save_chat_history(course_id = course_id, thread_id = thread_id, question = question, answer = final_answer)
 
 
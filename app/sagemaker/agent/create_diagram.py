@@ -1,47 +1,57 @@
 import json
+import os
 import logging
 from gremlin_python.driver import client
-from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
-from gremlin_python.process.anonymous_traversal import traversal
 from gremlin_python.process.graph_traversal import __
 from gremlin_python.process.traversal import T
 import boto3
 from botocore.exceptions import ClientError
+from sagemaker.agent.neptune_connection import get_connection_manager, close_all_connections
+from sagemaker.agent.diagram_cache import diagram_cache
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Gremlin steps that modify the graph
+MUTATING_STEPS = ('addV', 'addE', 'property', 'drop', 'mergeV', 'mergeE')
+
 class NeptuneClient:
     """
     Client class for interacting with Amazon Neptune graph database
     """
     
-    def __init__(self, neptune_endpoint, port=8182):
+    def __init__(self, neptune_endpoint, port=8182, use_ssl=True, connection_manager=None):
         """
         Initialize Neptune client
         
         Args:
             neptune_endpoint (str): Neptune cluster endpoint
             port (int): Port number (default: 8182)
+            use_ssl (bool): Use wss:// (default) or ws:// for a local Gremlin Server
+            connection_manager (NeptuneConnectionManager): Shared connection pool to
+                use instead of the process-wide one for this endpoint (optional)
         """
         self.neptune_endpoint = neptune_endpoint
         self.port = port
-        self.connection = None
+        self.use_ssl = use_ssl
+        self.connection_manager = connection_manager
         self.g = None
+        # Errors swallowed by the query methods, so callers can tell an empty
+        # result from a failed query
+        self.query_errors = []
         
     def connect(self):
         """
-        Establish connection to Neptune
+        Attach to the shared, pooled Neptune connection
         """
         try:
-            # Create connection string
-            connection_string = f'wss://{self.neptune_endpoint}:{self.port}/gremlin'
-            
-            # Create remote connection
-            self.connection = DriverRemoteConnection(connection_string, 'g')
+            if self.connection_manager is None:
+                self.connection_manager = get_connection_manager(
+                    self.neptune_endpoint, self.port, use_ssl=self.use_ssl
+                )
             
-            # Create traversal source
-            self.g = traversal().withRemote(self.connection)
+            # Reuses the warm connection if another caller already opened it
+            self.g = self.connection_manager.get_traversal()
             
             logger.info(f"Connected to Neptune at {self.neptune_endpoint}")
             return True
@@ -52,11 +62,55 @@ class NeptuneClient:
     
     def disconnect(self):
         """
-        Close Neptune connection
+        Release the shared connection
+        
+        The pooled connection stays open for the next caller; use
+        ``connection_manager.close()`` to actually tear it down.
         """
-        if self.connection:
-            self.connection.close()
-            logger.info("Disconnected from Neptune")
+        if self.g is not None:
+            self.g = None
+            logger.info("Released Neptune connection")
+    
+    def _execute(self, query_fn):
+        """
+        Run a traversal through the connection manager (reconnects on transport errors)
+        """
+        return self.connection_manager.execute(query_fn)
+    
+    def execute_write(self, query_fn, workflow_ids=None):
+        """
+        Run a mutating traversal and invalidate cached diagrams it affects
+        
+        All graph writes should go through this method so repeated diagram
+        views never serve data older than the last write from this process.
+        
+        Args:
+            query_fn (callable): Function taking the traversal source ``g``
+            workflow_ids (list): Workflows touched by the write (optional, all
+                cached diagrams are invalidated when omitted)
+            
+        Returns:
+            Any: Result of ``query_fn``
+        """
+        try:
+            return self._execute(query_fn)
+        finally:
+            # Invalidate even on failure: a partially applied write still changed the graph
+            diagram_cache.invalidate(workflow_ids)
+    
+    def submit(self, method, *args, **kwargs):
+        """
+        Run a client method concurrently on the shared connection pool
+        
+        Args:
+            method (callable): Bound NeptuneClient method, e.g. ``client.get_vertices_by_label``
+            *args: Positional arguments for the method
+            **kwargs: Keyword arguments for the method
+            
+        Returns:
+            concurrent.futures.Future: Future resolving to the method result
+        """
+        return self.connection_manager.run_in_pool(method, *args, **kwargs)
     
     def get_all_vertices(self, limit=100):
         """
@@ -69,10 +123,11 @@ class NeptuneClient:
             list: List of vertices
         """
         try:
-            vertices = self.g.V().limit(limit).valueMap(True).toList()
+            vertices = self._execute(lambda g: g.V().limit(limit).valueMap(True).toList())
             logger.info(f"Retrieved {len(vertices)} vertices")
             return vertices
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error getting vertices: {str(e)}")
             return []
     
@@ -88,10 +143,11 @@ class NeptuneClient:
             list: List of vertices with specified label
         """
         try:
-            vertices = self.g.V().hasLabel(label).limit(limit).valueMap(True).toList()
+            vertices = self._execute(lambda g: g.V().hasLabel(label).limit(limit).valueMap(True).toList())
             logger.info(f"Retrieved {len(vertices)} vertices with label '{label}'")
             return vertices
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error getting vertices by label: {str(e)}")
             return []
     
@@ -106,10 +162,11 @@ class NeptuneClient:
             dict: Vertex data
         """
         try:
-            vertex = self.g.V(vertex_id).valueMap(True).next()
+            vertex = self._execute(lambda g: g.V(vertex_id).valueMap(True).next())
             logger.info(f"Retrieved vertex with ID: {vertex_id}")
             return vertex
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error getting vertex by ID: {str(e)}")
             return None
     
@@ -124,10 +181,11 @@ class NeptuneClient:
             list: List of edges
         """
         try:
-            edges = self.g.E().limit(limit).valueMap(True).toList()
+            edges = self._execute(lambda g: g.E().limit(limit).valueMap(True).toList())
             logger.info(f"Retrieved {len(edges)} edges")
             return edges
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error getting edges: {str(e)}")
             return []
     
@@ -143,10 +201,11 @@ class NeptuneClient:
             list: List of edges with specified label
         """
         try:
-            edges = self.g.E().hasLabel(label).limit(limit).valueMap(True).toList()
+            edges = self._execute(lambda g: g.E().hasLabel(label).limit(limit).valueMap(True).toList())
             logger.info(f"Retrieved {len(edges)} edges with label '{label}'")
             return edges
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error getting edges by label: {str(e)}")
             return []
     
@@ -164,15 +223,16 @@ class NeptuneClient:
         """
         try:
             if direction == 'in':
-                neighbors = self.g.V(vertex_id).in_().limit(limit).valueMap(True).toList()
+                neighbors = self._execute(lambda g: g.V(vertex_id).in_().limit(limit).valueMap(True).toList())
             elif direction == 'out':
-                neighbors = self.g.V(vertex_id).out().limit(limit).valueMap(True).toList()
+                neighbors = self._execute(lambda g: g.V(vertex_id).out().limit(limit).valueMap(True).toList())
             else:  # both
-                neighbors = self.g.V(vertex_id).both().limit(limit).valueMap(True).toList()
+                neighbors = self._execute(lambda g: g.V(vertex_id).both().limit(limit).valueMap(True).toList())
             
             logger.info(f"Retrieved {len(neighbors)} neighbors for vertex {vertex_id}")
             return neighbors
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error getting neighbors: {str(e)}")
             return []
     
@@ -188,7 +248,7 @@ class NeptuneClient:
             list: Shortest path
         """
         try:
-            path = self.g.V(source_id).repeat(__.out().simplePath()).until(__.hasId(target_id)).path().limit(1).toList()
+            path = self._execute(lambda g: g.V(source_id).repeat(__.out().simplePath()).until(__.hasId(target_id)).path().limit(1).toList())
             if path:
                 logger.info(f"Found path from {source_id} to {target_id}")
                 return path[0]
@@ -196,6 +256,7 @@ class NeptuneClient:
                 logger.info(f"No path found from {source_id} to {target_id}")
                 return None
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error finding shortest path: {str(e)}")
             return None
     
@@ -212,13 +273,56 @@ class NeptuneClient:
             list: List of matching vertices
         """
         try:
-            vertices = self.g.V().has(property_name, property_value).limit(limit).valueMap(True).toList()
+            vertices = self._execute(lambda g: g.V().has(property_name, property_value).limit(limit).valueMap(True).toList())
             logger.info(f"Found {len(vertices)} vertices with {property_name}='{property_value}'")
             return vertices
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error searching vertices by property: {str(e)}")
             return []
     
+    def get_workflow_vertices(self, workflow_id, label, limit=100):
+        """
+        Get vertices with a label that belong to one workflow
+        
+        Args:
+            workflow_id (str): Workflow ID
+            label (str): Vertex label, e.g. 'task'
+            limit (int): Maximum number of vertices to return
+            
+        Returns:
+            list: List of matching vertices
+        """
+        try:
+            vertices = self._execute(lambda g: g.V().hasLabel(label).has('workflow_id', workflow_id).limit(limit).valueMap(True).toList())
+            logger.info(f"Found {len(vertices)} '{label}' vertices in workflow '{workflow_id}'")
+            return vertices
+        except Exception as e:
+            self.query_errors.append(e)
+            logger.error(f"Error getting workflow vertices: {str(e)}")
+            return []
+    
+    def get_workflow_edges(self, workflow_id, label, limit=100):
+        """
+        Get edges with a label whose source vertex belongs to one workflow
+        
+        Args:
+            workflow_id (str): Workflow ID
+            label (str): Edge label, e.g. 'next_step'
+            limit (int): Maximum number of edges to return
+            
+        Returns:
+            list: List of matching edges
+        """
+        try:
+            edges = self._execute(lambda g: g.E().hasLabel(label).where(__.outV().has('workflow_id', workflow_id)).limit(limit).valueMap(True).toList())
+            logger.info(f"Found {len(edges)} '{label}' edges in workflow '{workflow_id}'")
+            return edges
+        except Exception as e:
+            self.query_errors.append(e)
+            logger.error(f"Error getting workflow edges: {str(e)}")
+            return []
+    
     def get_vertex_count(self):
         """
         Get total count of vertices
@@ -227,10 +331,11 @@ class NeptuneClient:
             int: Number of vertices
         """
         try:
-            count = self.g.V().count().next()
+            count = self._execute(lambda g: g.V().count().next())
             logger.info(f"Total vertices: {count}")
             return count
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error getting vertex count: {str(e)}")
             return 0
     
@@ -242,10 +347,11 @@ class NeptuneClient:
             int: Number of edges
         """
         try:
-            count = self.g.E().count().next()
+            count = self._execute(lambda g: g.E().count().next())
             logger.info(f"Total edges: {count}")
             return count
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error getting edge count: {str(e)}")
             return 0
     
@@ -262,25 +368,40 @@ class NeptuneClient:
         try:
             # This is a simplified approach - in production, use proper query building
             logger.warning("Executing custom query - ensure query is safe")
-            results = eval(f"self.g.{query_string}").toList()
+            query_fn = lambda g: eval(f"g.{query_string}").toList()
+            if any(f".{step}(" in f".{query_string}" for step in MUTATING_STEPS):
+                results = self.execute_write(query_fn)
+            else:
+                results = self._execute(query_fn)
             logger.info(f"Custom query returned {len(results)} results")
             return results
         except Exception as e:
+            self.query_errors.append(e)
             logger.error(f"Error executing custom query: {str(e)}")
             return []
 
-def create_workflow_diagram_from_neptune(neptune_endpoint, workflow_id=None):
+def create_workflow_diagram_from_neptune(neptune_endpoint, workflow_id=None, connection_manager=None, use_cache=True):
     """
     Create workflow diagram from Neptune data
     
     Args:
         neptune_endpoint (str): Neptune cluster endpoint
         workflow_id (str): Specific workflow ID to query (optional)
+        connection_manager (NeptuneConnectionManager): Connection pool to use (optional,
+            defaults to the process-wide pool for the endpoint)
+        use_cache (bool): Serve repeated views from the in-memory diagram cache
         
     Returns:
-        dict: Workflow diagram data
+        dict: Workflow diagram data (shared with the cache, do not mutate)
     """
-    client = NeptuneClient(neptune_endpoint)
+    if use_cache:
+        cached = diagram_cache.get(workflow_id, endpoint=neptune_endpoint)
+        if cached is not None:
+            logger.info(f"Serving diagram for workflow {workflow_id or 'ALL'} from cache")
+            return cached
+        write_stamp = diagram_cache.write_stamp
+    
+    client = NeptuneClient(neptune_endpoint, connection_manager=connection_manager)
     
     try:
         # Connect to Neptune
@@ -289,18 +410,29 @@ def create_workflow_diagram_from_neptune(neptune_endpoint, workflow_id=None):
         
         # Get workflow data
         if workflow_id:
-            # Get specific workflow
-            workflow_vertices = client.search_vertices_by_property('workflow_id', workflow_id)
+            # Get specific workflow; its swimlanes and tasks carry the same workflow_id
+            workflow_future = client.submit(client.get_workflow_vertices, workflow_id, 'workflow')
         else:
             # Get all workflow vertices
-            workflow_vertices = client.get_vertices_by_label('workflow')
+            workflow_future = client.submit(client.get_vertices_by_label, 'workflow')
         
-        # Get workflow steps/tasks
-        task_vertices = client.get_vertices_by_label('task')
+        # Get workflow steps/tasks and the relationships between them; the
+        # traversals are independent so they run concurrently on the pool.
+        # A workflow's diagram only reads its own tasks and edges, so writes to
+        # other workflows leave its cache entry valid
+        if workflow_id:
+            task_future = client.submit(client.get_workflow_vertices, workflow_id, 'task')
+            workflow_edges_future = client.submit(client.get_workflow_edges, workflow_id, 'next_step')
+            dependency_edges_future = client.submit(client.get_workflow_edges, workflow_id, 'depends_on')
+        else:
+            task_future = client.submit(client.get_vertices_by_label, 'task')
+            workflow_edges_future = client.submit(client.get_edges_by_label, 'next_step')
+            dependency_edges_future = client.submit(client.get_edges_by_label, 'depends_on')
         
-        # Get relationships between tasks
-        workflow_edges = client.get_edges_by_label('next_step')
-        dependency_edges = client.get_edges_by_label('depends_on')
+        workflow_vertices = workflow_future.result()
+        task_vertices = task_future.result()
+        workflow_edges = workflow_edges_future.result()
+        dependency_edges = dependency_edges_future.result()
         
         # Build diagram data structure
         diagram_data = {
@@ -347,6 +479,14 @@ def create_workflow_diagram_from_neptune(neptune_endpoint, workflow_id=None):
             })
         
         logger.info(f"Created diagram with {len(diagram_data['workflows'])} workflows and {len(diagram_data['tasks'])} tasks")
+        
+        # A failed query reads as an empty list; caching that would serve the
+        # incomplete diagram for the whole TTL
+        if client.query_errors:
+            logger.warning(f"Not caching diagram for workflow {workflow_id or 'ALL'}: {len(client.query_errors)} query(ies) failed")
+        elif use_cache:
+            diagram_cache.put(workflow_id, diagram_data, write_stamp=write_stamp, endpoint=neptune_endpoint)
+        
         return diagram_data
         
     except Exception as e:
@@ -360,8 +500,9 @@ def main():
     """
     Main function to demonstrate Neptune queries
     """
-    # Replace with your Neptune endpoint
-    NEPTUNE_ENDPOINT = "your-neptune-cluster.cluster-xxxxx.region.neptune.amazonaws.com"
+    # Replace with your Neptune endpoint, or set GREMLIN_URL=ws://localhost:8182/gremlin
+    # to run against a local Gremlin Server/TinkerGraph
+    NEPTUNE_ENDPOINT = os.environ.get('NEPTUNE_ENDPOINT', "your-neptune-cluster.cluster-xxxxx.region.neptune.amazonaws.com")
     
     # Create client
     client = NeptuneClient(NEPTUNE_ENDPOINT)
@@ -401,6 +542,7 @@ def main():
     
     finally:
         client.disconnect()
+        close_all_connections()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+In-memory cache for workflow diagram payloads assembled from Neptune
+
+Entries are keyed by Neptune endpoint, workflow_id and a graph version stamp. Writes that go
+through NeptuneClient either invalidate the affected workflows or bump the
+version stamp, which makes every older entry unreachable. The TTL bounds how
+long another process's writes can stay invisible to this one.
+"""
+
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get('DIAGRAM_CACHE_MAX_ENTRIES', '256'))
+DEFAULT_TTL_SECONDS = float(os.environ.get('DIAGRAM_CACHE_TTL_SECONDS', '300'))
+
+# Key used for diagrams built without a workflow_id (all workflows)
+ALL_WORKFLOWS = '*'
+
+
+class DiagramCache:
+    """
+    Thread-safe LRU cache with per-entry TTL for assembled diagram payloads
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries (int): Maximum number of cached diagrams before LRU eviction
+            ttl_seconds (float): Seconds an entry stays valid, 0 disables expiry
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.graph_version = 0
+        self.write_stamp = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, workflow_id, endpoint):
+        return (workflow_id or ALL_WORKFLOWS, endpoint, self.graph_version)
+
+    def get(self, workflow_id, endpoint=None):
+        """
+        Get a cached diagram for the current graph version
+
+        Args:
+            workflow_id (str): Workflow ID, or None for the all-workflows diagram
+            endpoint (str): Neptune endpoint the diagram was read from
+
+        Returns:
+            dict: Cached diagram payload (treat as read-only), or None on a miss
+        """
+        with self._lock:
+            key = self._key(workflow_id, endpoint)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, payload = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, workflow_id, payload, write_stamp=None, endpoint=None):
+        """
+        Store a diagram payload
+
+        Args:
+            workflow_id (str): Workflow ID, or None for the all-workflows diagram
+            payload (dict): Assembled diagram data
+            write_stamp (int): ``write_stamp`` observed before the payload was
+                read; the payload is dropped if any write happened since
+            endpoint (str): Neptune endpoint the diagram was read from
+        """
+        with self._lock:
+            if write_stamp is not None and write_stamp != self.write_stamp:
+                return
+
+            key = self._key(workflow_id, endpoint)
+            expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, workflow_ids=None):
+        """
+        Invalidate cached diagrams after a graph write
+
+        Args:
+            workflow_ids (list): Workflows touched by the write. When omitted the
+                graph version is bumped, which invalidates every entry.
+        """
+        with self._lock:
+            self.write_stamp += 1
+            if not workflow_ids:
+                self.graph_version += 1
+                self._entries.clear()
+                logger.info(f"Diagram cache cleared (graph version {self.graph_version})")
+                return
+
+            # The all-workflows diagram contains every workflow, so it is always stale
+            targets = set(workflow_ids) | {ALL_WORKFLOWS}
+            for key in [key for key in self._entries if key[0] in targets]:
+                del self._entries[key]
+            logger.info(f"Diagram cache invalidated for {len(workflow_ids)} workflow(s)")
+
+    def stats(self):
+        """
+        Get cache statistics
+
+        Returns:
+            dict: Size, hit/miss counters and current graph version
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'graph_version': self.graph_version
+            }
+
+
+# Process-wide cache shared by every NeptuneClient
+diagram_cache = DiagramCache()
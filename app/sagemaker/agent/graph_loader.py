@@ -0,0 +1,486 @@
+"""
+Bulk writer for loading extracted VPFlow workflows into Neptune
+
+Converts the VPFlow workflow schema (process -> swimlanes -> steps with
+dependencies) into vertices and edges with deterministic ids, then either
+upserts them in batched Gremlin traversals through NeptuneClient or writes
+Neptune bulk-loader CSV files for very large loads.
+"""
+
+import os
+import csv
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+from gremlin_python.process.graph_traversal import __
+from gremlin_python.process.traversal import T, Cardinality
+from gremlin_python.driver.protocol import GremlinServerError
+
+logger = logging.getLogger(__name__)
+
+# Namespace for deriving stable workflow ids from process name and version
+WORKFLOW_NAMESPACE = uuid.UUID('6f1c1b7e-5d4a-4c39-9a5e-8b7f3f2d9c10')
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_WORKFLOWS_PER_WAVE = 100
+DEFAULT_MAX_RETRIES = 5
+
+# Property columns for bulk-loader CSVs (name -> Neptune type)
+VERTEX_PROPERTIES = {
+    'workflow_id': 'String',
+    'step_id': 'String',
+    'name': 'String',
+    'description': 'String',
+    'version': 'String',
+    'created_date': 'String',
+    'status': 'String',
+    'type': 'String',
+    'role': 'String',
+    'department': 'String',
+    'duration': 'Double',
+    'error_rate': 'Double',
+    'rework_count': 'Long',
+    'risk_level': 'Long',
+    'sla': 'String',
+    'approval_required': 'Bool',
+    'actor_transitions': 'String',
+}
+EDGE_PROPERTIES = {
+    'workflow_id': 'String',
+    'source_id': 'String',
+    'target_id': 'String',
+}
+
+
+def get_workflow_id(workflow_data):
+    """
+    Get the stable id of a workflow
+
+    Args:
+        workflow_data (dict): VPFlow workflow JSON
+
+    Returns:
+        str: ``workflow_id`` from the data, or a UUIDv5 of process name and version
+    """
+    if workflow_data.get('workflow_id'):
+        return str(workflow_data['workflow_id'])
+    seed = f"{workflow_data.get('process_name', '')}|{workflow_data.get('version') or ''}"
+    return str(uuid.uuid5(WORKFLOW_NAMESPACE, seed))
+
+
+def _clean_properties(properties):
+    """
+    Drop empty values and serialize non-scalar values for Neptune
+    """
+    cleaned = {}
+    for key, value in properties.items():
+        if value is None or value == '':
+            continue
+        if isinstance(value, (list, dict)):
+            value = json.dumps(value, ensure_ascii=False)
+        cleaned[key] = value
+    return cleaned
+
+
+def workflow_to_graph(workflow_data):
+    """
+    Convert a VPFlow workflow into vertices and edges
+
+    Vertex labels are ``workflow``, ``swimlane`` and ``task``; edge labels are
+    ``has_swimlane``, ``performs``, ``next_step`` (dependency -> step) and
+    ``depends_on`` (step -> dependency). Ids are derived from the workflow id
+    and step ids, so re-loading the same workflow updates it in place. Edge
+    ``source_id``/``target_id`` hold vertex ids, which diagram connections
+    resolve against task ids.
+
+    Args:
+        workflow_data (dict): VPFlow workflow JSON
+
+    Returns:
+        tuple: (vertices, edges) where each element is a dict with ``id``,
+            ``label`` and ``properties`` (edges also have ``from`` and ``to``)
+    """
+    workflow_id = get_workflow_id(workflow_data)
+    workflow_vertex_id = f"workflow:{workflow_id}"
+
+    vertices = [{
+        'id': workflow_vertex_id,
+        'label': 'workflow',
+        'properties': _clean_properties({
+            'workflow_id': workflow_id,
+            'name': workflow_data.get('process_name'),
+            'description': workflow_data.get('description'),
+            'version': workflow_data.get('version'),
+            'created_date': workflow_data.get('created_date'),
+            'status': workflow_data.get('status', 'active'),
+        })
+    }]
+    edges = []
+    task_ids = {}
+    dependencies = []
+
+    for lane_index, swimlane in enumerate(workflow_data.get('swimlanes', [])):
+        role = swimlane.get('role', 'Unknown')
+        swimlane_vertex_id = f"swimlane:{workflow_id}:{lane_index}"
+        vertices.append({
+            'id': swimlane_vertex_id,
+            'label': 'swimlane',
+            'properties': _clean_properties({
+                'workflow_id': workflow_id,
+                'name': role,
+                'role': role,
+                'department': swimlane.get('department'),
+            })
+        })
+        edges.append({
+            'id': f"has_swimlane:{workflow_id}:{lane_index}",
+            'label': 'has_swimlane',
+            'from': workflow_vertex_id,
+            'to': swimlane_vertex_id,
+            'properties': {'workflow_id': workflow_id}
+        })
+
+        for step in swimlane.get('steps', []):
+            step_id = str(step.get('id'))
+            task_vertex_id = f"task:{workflow_id}:{step_id}"
+            task_ids[step_id] = task_vertex_id
+            vertices.append({
+                'id': task_vertex_id,
+                'label': 'task',
+                'properties': _clean_properties({
+                    'workflow_id': workflow_id,
+                    'step_id': step_id,
+                    'name': step.get('name'),
+                    'description': step.get('description'),
+                    'type': step.get('type', 'process'),
+                    'status': step.get('status', 'pending'),
+                    'role': role,
+                    'department': swimlane.get('department'),
+                    'duration': step.get('duration'),
+                    'error_rate': step.get('error_rate'),
+                    'rework_count': step.get('rework_count'),
+                    'risk_level': step.get('risk_level'),
+                    'sla': step.get('sla'),
+                    'approval_required': step.get('approval_required'),
+                    'actor_transitions': step.get('actor_transitions') or None,
+                })
+            })
+            edges.append({
+                'id': f"performs:{workflow_id}:{step_id}",
+                'label': 'performs',
+                'from': swimlane_vertex_id,
+                'to': task_vertex_id,
+                'properties': {'workflow_id': workflow_id}
+            })
+            for dependency in step.get('dependencies', []):
+                dependencies.append((str(dependency), step_id))
+
+    # Dependencies may point at steps in later swimlanes, so resolve them last
+    for dependency_id, step_id in dependencies:
+        if dependency_id not in task_ids:
+            logger.warning(f"Workflow {workflow_id}: step {step_id} depends on unknown step {dependency_id}")
+            continue
+        edges.append({
+            'id': f"next_step:{workflow_id}:{dependency_id}:{step_id}",
+            'label': 'next_step',
+            'from': task_ids[dependency_id],
+            'to': task_ids[step_id],
+            'properties': {'workflow_id': workflow_id, 'source_id': task_ids[dependency_id], 'target_id': task_ids[step_id]}
+        })
+        edges.append({
+            'id': f"depends_on:{workflow_id}:{step_id}:{dependency_id}",
+            'label': 'depends_on',
+            'from': task_ids[step_id],
+            'to': task_ids[dependency_id],
+            'properties': {'workflow_id': workflow_id, 'source_id': task_ids[step_id], 'target_id': task_ids[dependency_id]}
+        })
+
+    return vertices, edges
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _vertex_upsert_traversal(vertices):
+    """
+    Build a function that upserts a batch of vertices in a single traversal
+    """
+    def query_fn(g):
+        t = g
+        for vertex in vertices:
+            # V(id).fold().coalesce(unfold(), addV()) is the idempotent upsert
+            # pattern; chaining mid-traversal V() sends the batch in one request
+            t = t.V(vertex['id']).fold().coalesce(
+                __.unfold(),
+                __.addV(vertex['label']).property(T.id, vertex['id'])
+            )
+            for key, value in vertex['properties'].items():
+                t = t.property(Cardinality.single, key, value)
+        return t.iterate()
+    return query_fn
+
+
+def _edge_upsert_traversal(edges):
+    """
+    Build a function that upserts a batch of edges in a single traversal
+    """
+    def query_fn(g):
+        t = g
+        for edge in edges:
+            upsert = __.unfold().coalesce(
+                __.outE(edge['label']).hasId(edge['id']),
+                __.addE(edge['label']).to(__.V(edge['to'])).property(T.id, edge['id'])
+            )
+            for key, value in edge['properties'].items():
+                upsert = upsert.property(key, value)
+            # fold()/identity() keeps one traverser flowing even if the source
+            # vertex is missing, so one bad edge does not silently skip the rest
+            t = t.V(edge['from']).fold().coalesce(upsert, __.identity())
+        return t.iterate()
+    return query_fn
+
+
+class WorkflowGraphLoader:
+    """
+    Batched, concurrent upsert of workflows through NeptuneClient
+    """
+
+    def __init__(self, client, batch_size=DEFAULT_BATCH_SIZE,
+                 workflows_per_wave=DEFAULT_WORKFLOWS_PER_WAVE, max_retries=DEFAULT_MAX_RETRIES):
+        """
+        Initialize the loader
+
+        Args:
+            client (NeptuneClient): Connected Neptune client
+            batch_size (int): Vertices or edges per Gremlin request
+            workflows_per_wave (int): Workflows whose vertices are written before
+                their edges; bounds memory when loading thousands of workflows
+            max_retries (int): Retries for batches hitting concurrent modification
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self.workflows_per_wave = workflows_per_wave
+        self.max_retries = max_retries
+
+    def _write_batch(self, query_fn, workflow_ids):
+        """
+        Write one batch, retrying Neptune concurrent-modification conflicts
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.client.execute_write(query_fn, workflow_ids=workflow_ids)
+            except GremlinServerError as e:
+                if 'ConcurrentModification' not in str(e) or attempt >= self.max_retries:
+                    raise
+                time.sleep(random.uniform(0, 0.1 * (2 ** attempt)))
+
+    def _write_all(self, items, build_traversal):
+        """
+        Write items in batches concurrently and wait for every batch
+        """
+        futures = []
+        for batch in _chunks(items, self.batch_size):
+            workflow_ids = sorted({item['properties']['workflow_id'] for item in batch})
+            futures.append(self.client.submit(self._write_batch, build_traversal(batch), workflow_ids))
+
+        errors = 0
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors += 1
+                logger.error(f"Error writing graph batch: {str(e)}")
+        return len(futures), errors
+
+    def load_workflows(self, workflows):
+        """
+        Upsert workflows into Neptune
+
+        Args:
+            workflows (iterable): VPFlow workflow JSON dicts
+
+        Returns:
+            dict: Counts of workflows, vertices, edges, batches and failed batches
+        """
+        stats = {'workflows': 0, 'vertices': 0, 'edges': 0, 'batches': 0, 'failed_batches': 0}
+        wave = []
+
+        def flush(wave):
+            vertices, edges = [], []
+            for workflow_data in wave:
+                workflow_vertices, workflow_edges = workflow_to_graph(workflow_data)
+                vertices.extend(workflow_vertices)
+                edges.extend(workflow_edges)
+
+            # Edges reference vertices, so all vertex batches must land first
+            for items, build_traversal in ((vertices, _vertex_upsert_traversal), (edges, _edge_upsert_traversal)):
+                batches, errors = self._write_all(items, build_traversal)
+                stats['batches'] += batches
+                stats['failed_batches'] += errors
+
+            stats['workflows'] += len(wave)
+            stats['vertices'] += len(vertices)
+            stats['edges'] += len(edges)
+            logger.info(f"Loaded {stats['workflows']} workflows ({stats['vertices']} vertices, {stats['edges']} edges)")
+
+        start = time.perf_counter()
+        for workflow_data in workflows:
+            wave.append(workflow_data)
+            if len(wave) >= self.workflows_per_wave:
+                flush(wave)
+                wave = []
+        if wave:
+            flush(wave)
+
+        stats['seconds'] = round(time.perf_counter() - start, 3)
+        return stats
+
+
+def _csv_header(prefix_columns, properties, single_cardinality):
+    suffix = '(single)' if single_cardinality else ''
+    return prefix_columns + [f"{name}:{type_name}{suffix}" for name, type_name in properties.items()]
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def write_bulk_load_csv(workflows, output_dir):
+    """
+    Write Neptune bulk-loader (Gremlin CSV format) files for workflows
+
+    Rows are streamed to disk one workflow at a time. Upload the directory to
+    S3 and start the load with ``start_bulk_load``.
+
+    Args:
+        workflows (iterable): VPFlow workflow JSON dicts
+        output_dir (str): Directory for vertices.csv and edges.csv
+
+    Returns:
+        dict: Paths and row counts of the written files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    vertices_path = os.path.join(output_dir, 'vertices.csv')
+    edges_path = os.path.join(output_dir, 'edges.csv')
+    vertex_count = edge_count = 0
+
+    with open(vertices_path, 'w', newline='', encoding='utf-8') as vertex_file, \
+            open(edges_path, 'w', newline='', encoding='utf-8') as edge_file:
+        vertex_writer = csv.writer(vertex_file)
+        edge_writer = csv.writer(edge_file)
+        vertex_writer.writerow(_csv_header(['~id', '~label'], VERTEX_PROPERTIES, True))
+        edge_writer.writerow(_csv_header(['~id', '~from', '~to', '~label'], EDGE_PROPERTIES, False))
+
+        for workflow_data in workflows:
+            vertices, edges = workflow_to_graph(workflow_data)
+            for vertex in vertices:
+                vertex_writer.writerow(
+                    [vertex['id'], vertex['label']]
+                    + [_csv_value(vertex['properties'].get(name)) for name in VERTEX_PROPERTIES]
+                )
+            for edge in edges:
+                edge_writer.writerow(
+                    [edge['id'], edge['from'], edge['to'], edge['label']]
+                    + [_csv_value(edge['properties'].get(name)) for name in EDGE_PROPERTIES]
+                )
+            vertex_count += len(vertices)
+            edge_count += len(edges)
+
+    logger.info(f"Wrote {vertex_count} vertices and {edge_count} edges to {output_dir}")
+    return {
+        'vertices_path': vertices_path,
+        'edges_path': edges_path,
+        'vertices': vertex_count,
+        'edges': edge_count
+    }
+
+
+def start_bulk_load(neptune_endpoint, source_s3_uri, iam_role_arn, region, port=8182):
+    """
+    Start a Neptune bulk load of CSV files from S3
+
+    Bulk loads bypass NeptuneClient, so the diagram cache is cleared here.
+    Clusters with IAM database authentication need a SigV4-signed request.
+
+    Args:
+        neptune_endpoint (str): Neptune cluster endpoint
+        source_s3_uri (str): S3 prefix containing vertices.csv and edges.csv
+        iam_role_arn (str): Role Neptune assumes to read the bucket
+        region (str): AWS region of the bucket
+        port (int): Port number (default: 8182)
+
+    Returns:
+        str: Neptune load id
+    """
+    import requests
+    from sagemaker.agent.diagram_cache import diagram_cache
+
+    response = requests.post(
+        f"https://{neptune_endpoint}:{port}/loader",
+        json={
+            'source': source_s3_uri,
+            'format': 'csv',
+            'iamRoleArn': iam_role_arn,
+            'region': region,
+            'failOnError': 'FALSE',
+            'parallelism': 'HIGH',
+            'updateSingleCardinalityProperties': 'TRUE',
+            'queueRequest': 'TRUE'
+        },
+        timeout=30
+    )
+    response.raise_for_status()
+    load_id = response.json()['payload']['loadId']
+    diagram_cache.invalidate()
+    logger.info(f"Started Neptune bulk load {load_id} from {source_s3_uri}")
+    return load_id
+
+
+def _iter_workflow_files(paths):
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        for workflow_data in (data if isinstance(data, list) else [data]):
+            yield workflow_data
+
+
+def main():
+    """
+    Load workflow JSON files into Neptune or write bulk-loader CSVs
+    """
+    parser = argparse.ArgumentParser(description='Load VPFlow workflows into Neptune')
+    parser.add_argument('files', nargs='+', help='Workflow JSON files (object or list of objects)')
+    parser.add_argument('--csv', dest='csv_dir', help='Write bulk-loader CSVs to this directory instead')
+    parser.add_argument('--endpoint', default=os.environ.get('NEPTUNE_ENDPOINT'), help='Neptune endpoint')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.csv_dir:
+        print(json.dumps(write_bulk_load_csv(_iter_workflow_files(args.files), args.csv_dir), indent=2))
+        return
+
+    from sagemaker.agent.create_diagram import NeptuneClient
+    from sagemaker.agent.neptune_connection import close_all_connections
+
+    client = NeptuneClient(args.endpoint)
+    try:
+        if not client.connect():
+            raise SystemExit("Failed to connect to Neptune")
+        loader = WorkflowGraphLoader(client, batch_size=args.batch_size)
+        print(json.dumps(loader.load_workflows(_iter_workflow_files(args.files)), indent=2))
+    finally:
+        client.disconnect()
+        close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
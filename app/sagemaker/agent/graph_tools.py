@@ -0,0 +1,115 @@
+"""
+LangChain tools backed by the LightRAG knowledge graph
+
+The LightRAG instance is loaded once per process, on first use or through
+load_knowledge_base(), and shared by every query. LightRAG storages are bound
+to the event loop that initialized them, so all queries must run on that loop.
+
+LightRAG writes to its working directory, so a read-only copy of the knowledge
+base (LIGHTRAG_BUNDLED_DIR, e.g. the Lambda agent layer) is copied into
+LIGHTRAG_WORKING_DIR the first time it is loaded.
+"""
+
+import os
+import shutil
+import asyncio
+import logging
+from typing import List, Type, Union
+from pydantic import BaseModel, Field
+from langchain.tools import BaseTool
+from lightrag import QueryParam
+
+logger = logging.getLogger(__name__)
+
+# Knowledge base built by knowledge_graph/lightrag_create.py (or the ingestion pipeline)
+LIGHTRAG_WORKING_DIR = os.environ.get('LIGHTRAG_WORKING_DIR')
+LIGHTRAG_BUNDLED_DIR = os.environ.get('LIGHTRAG_BUNDLED_DIR')
+DEFAULT_QUERY_MODE = os.environ.get('LIGHTRAG_QUERY_MODE', 'naive')
+
+_rag = None
+_rag_lock = None
+
+async def load_knowledge_base():
+    """
+    Shared LightRAG instance, initialized on the first call
+
+    Returns:
+        LightRAG: Instance bound to the running event loop
+    """
+    global _rag, _rag_lock
+    if _rag is not None:
+        return _rag
+    if _rag_lock is None:
+        _rag_lock = asyncio.Lock()
+    async with _rag_lock:
+        if _rag is None:
+            from knowledge_graph import lightrag_retrieve
+            if LIGHTRAG_WORKING_DIR:
+                lightrag_retrieve.WORKING_DIR = LIGHTRAG_WORKING_DIR
+            working_dir = lightrag_retrieve.WORKING_DIR
+            if LIGHTRAG_BUNDLED_DIR and not os.path.isdir(working_dir):
+                shutil.copytree(LIGHTRAG_BUNDLED_DIR, working_dir)
+            _rag = await lightrag_retrieve.initialize_rag()
+            logger.info(f"Knowledge base loaded from {lightrag_retrieve.WORKING_DIR}")
+    return _rag
+
+async def close_knowledge_base():
+    """Flush and release the shared LightRAG instance"""
+    global _rag
+    if _rag is not None:
+        await _rag.finalize_storages()
+        _rag = None
+
+def _normalize_docs_id(docs_id):
+    # The agent passes either a list or a comma-separated string
+    if not docs_id:
+        return []
+    if isinstance(docs_id, str):
+        docs_id = docs_id.split(',')
+    return [doc_id.strip() for doc_id in docs_id if doc_id and doc_id.strip()]
+
+class GetKnowledgeInput(BaseModel):
+    query: str = Field(description="Question or topic to search for, rewritten to be self-contained")
+    docs_id: Union[List[str], str, None] = Field(default=None, description="Document IDs to restrict the search to, can be empty")
+    mode: str = Field(default=DEFAULT_QUERY_MODE, description="LightRAG query mode: naive, local, global, hybrid or mix")
+    only_need_context: bool = Field(default=True, description="Return the retrieved context instead of a generated answer")
+
+class GetKnowledgeTool(BaseTool):
+    """Retrieve VPBank workflow knowledge from the LightRAG knowledge graph"""
+
+    name: str = "get_knowledge_tool"
+    description: str = (
+        "Retrieve information about VPBank workflows, banking processes and automation "
+        "from the VPFlow knowledge base."
+    )
+    args_schema: Type[BaseModel] = GetKnowledgeInput
+
+    async def _arun(
+        self,
+        query: str,
+        docs_id: Union[List[str], str, None] = None,
+        mode: str = DEFAULT_QUERY_MODE,
+        only_need_context: bool = True,
+        **kwargs
+    ) -> str:
+        rag = await load_knowledge_base()
+        param = QueryParam(mode=mode, only_need_context=only_need_context)
+        doc_ids = _normalize_docs_id(docs_id)
+        # Older LightRAG releases cannot filter by document
+        if doc_ids and hasattr(param, 'ids'):
+            param.ids = doc_ids
+
+        result = await rag.aquery(query, param=param)
+        return result or "No relevant information found in the knowledge base."
+
+    def _run(
+        self,
+        query: str,
+        docs_id: Union[List[str], str, None] = None,
+        mode: str = DEFAULT_QUERY_MODE,
+        only_need_context: bool = True,
+        **kwargs
+    ) -> str:
+        # For synchronous agent.invoke(); a process should use one style, since
+        # the knowledge base stays bound to the loop that loaded it
+        return asyncio.run(self._arun(query, docs_id, mode, only_need_context))
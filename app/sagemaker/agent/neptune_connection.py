@@ -0,0 +1,317 @@
+"""
+Process-wide Gremlin connection management for Amazon Neptune
+
+Keeps one pooled DriverRemoteConnection per endpoint alive for the lifetime of
+the process so diagram and retrieval code paths reuse warm WebSocket
+connections instead of opening a new one for every request.
+"""
+
+import os
+import random
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
+from gremlin_python.driver.protocol import GremlinServerError
+from gremlin_python.process.anonymous_traversal import traversal
+
+logger = logging.getLogger(__name__)
+
+# Defaults can be tuned per deployment without code changes
+DEFAULT_POOL_SIZE = int(os.environ.get('NEPTUNE_POOL_SIZE', '8'))
+DEFAULT_MAX_WORKERS = int(os.environ.get('NEPTUNE_MAX_WORKERS', '8'))
+DEFAULT_KEEPALIVE_SECONDS = float(os.environ.get('NEPTUNE_KEEPALIVE_SECONDS', '30'))
+DEFAULT_MAX_RETRIES = int(os.environ.get('NEPTUNE_MAX_RETRIES', '3'))
+DEFAULT_BACKOFF_BASE = float(os.environ.get('NEPTUNE_BACKOFF_BASE', '0.2'))
+DEFAULT_BACKOFF_MAX = float(os.environ.get('NEPTUNE_BACKOFF_MAX', '5'))
+
+
+def build_gremlin_url(endpoint, port=8182, use_ssl=True):
+    """
+    Build the Gremlin WebSocket URL for an endpoint
+
+    Args:
+        endpoint (str): Neptune cluster endpoint or Gremlin Server host
+        port (int): Port number (default: 8182)
+        use_ssl (bool): Use wss:// (Neptune) instead of ws:// (local Gremlin Server)
+
+    Returns:
+        str: Gremlin WebSocket URL
+    """
+    scheme = 'wss' if use_ssl else 'ws'
+    return f'{scheme}://{endpoint}:{port}/gremlin'
+
+
+class NeptuneConnectionManager:
+    """
+    Pooled, self-healing Gremlin connection shared across the process
+
+    A single DriverRemoteConnection already multiplexes requests over
+    ``pool_size`` WebSocket connections, so the manager owns exactly one of
+    them, keeps it alive with WebSocket heartbeats and transparently reopens it
+    with exponential backoff when the transport fails.
+    """
+
+    def __init__(self, url, pool_size=DEFAULT_POOL_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                 keepalive_seconds=DEFAULT_KEEPALIVE_SECONDS, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX,
+                 traversal_source='g'):
+        """
+        Initialize the connection manager (the connection is opened lazily)
+
+        Args:
+            url (str): Gremlin WebSocket URL, e.g. wss://cluster:8182/gremlin or
+                ws://localhost:8182/gremlin for a local Gremlin Server/TinkerGraph
+            pool_size (int): Number of WebSocket connections in the driver pool
+            max_workers (int): Threads used to submit traversals concurrently
+            keepalive_seconds (float): WebSocket heartbeat interval, 0 disables it
+            max_retries (int): Reconnect attempts before a traversal fails
+            backoff_base (float): Initial backoff delay in seconds
+            backoff_max (float): Upper bound for a single backoff delay in seconds
+            traversal_source (str): Remote traversal source name (default: 'g')
+        """
+        self.url = url
+        self.pool_size = pool_size
+        self.max_workers = max_workers
+        self.keepalive_seconds = keepalive_seconds
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.traversal_source = traversal_source
+
+        self._connection = None
+        self._g = None
+        self._lock = threading.RLock()
+        self._executor = None
+
+    def _open(self):
+        """
+        Open the pooled remote connection
+        """
+        transport_kwargs = {}
+        if self.keepalive_seconds:
+            # Forwarded to aiohttp's ws_connect, which sends ping frames so idle
+            # sockets are not dropped by Neptune or intermediate load balancers
+            transport_kwargs['heartbeat'] = self.keepalive_seconds
+
+        self._connection = DriverRemoteConnection(
+            self.url,
+            self.traversal_source,
+            pool_size=self.pool_size,
+            max_workers=self.max_workers,
+            **transport_kwargs
+        )
+        self._g = traversal().withRemote(self._connection)
+        logger.info(f"Opened Gremlin connection pool to {self.url} (pool_size={self.pool_size})")
+
+    def _close_connection(self):
+        """
+        Close the current remote connection, ignoring transport errors
+        """
+        if self._connection:
+            try:
+                self._connection.close()
+            except Exception as e:
+                logger.warning(f"Error closing Gremlin connection: {str(e)}")
+        self._connection = None
+        self._g = None
+
+    def _backoff_delay(self, attempt):
+        """
+        Exponential backoff with full jitter for a retry attempt
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get_traversal(self):
+        """
+        Get the shared traversal source, connecting with backoff if needed
+
+        Returns:
+            GraphTraversalSource: Remote traversal source bound to the pool
+        """
+        with self._lock:
+            if self._g is not None:
+                return self._g
+
+            last_error = None
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self._open()
+                    return self._g
+                except Exception as e:
+                    last_error = e
+                    self._close_connection()
+                    if attempt < self.max_retries:
+                        delay = self._backoff_delay(attempt)
+                        logger.warning(f"Gremlin connect attempt {attempt + 1} failed: {str(e)}; retrying in {delay:.2f}s")
+                        time.sleep(delay)
+
+            raise ConnectionError(f"Could not connect to {self.url}: {last_error}")
+
+    def reconnect(self):
+        """
+        Drop the current connection and open a fresh one
+
+        Returns:
+            GraphTraversalSource: New traversal source
+        """
+        with self._lock:
+            self._close_connection()
+            return self.get_traversal()
+
+    def execute(self, query_fn):
+        """
+        Run a traversal against the shared connection, reconnecting on failure
+
+        Server-side query errors are raised immediately; transport errors
+        (closed sockets, timeouts) trigger a reconnect with backoff.
+
+        Args:
+            query_fn (callable): Function taking the traversal source ``g`` and
+                returning the materialized result (e.g. ``lambda g: g.V().count().next()``)
+
+        Returns:
+            Any: Result of ``query_fn``
+        """
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            g = self.get_traversal()
+            try:
+                return query_fn(g)
+            except (GremlinServerError, StopIteration):
+                # Query errors and empty results are not transport failures
+                raise
+            except Exception as e:
+                last_error = e
+                if attempt >= self.max_retries:
+                    break
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"Gremlin traversal failed ({str(e)}); reconnecting in {delay:.2f}s")
+                time.sleep(delay)
+                with self._lock:
+                    # Only reset if no other thread has already replaced the connection
+                    if self._g is g:
+                        self._close_connection()
+
+        raise last_error
+
+    def run_in_pool(self, fn, *args, **kwargs):
+        """
+        Run an arbitrary callable on the manager's submission threads
+
+        Args:
+            fn (callable): Function to run
+            *args: Positional arguments for ``fn``
+            **kwargs: Keyword arguments for ``fn``
+
+        Returns:
+            concurrent.futures.Future: Future resolving to the call result
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='gremlin-submit'
+                )
+            executor = self._executor
+        return executor.submit(fn, *args, **kwargs)
+
+    def submit(self, query_fn):
+        """
+        Submit a traversal for concurrent execution
+
+        Args:
+            query_fn (callable): Function taking ``g`` and returning a result
+
+        Returns:
+            concurrent.futures.Future: Future resolving to the traversal result
+        """
+        return self.run_in_pool(self.execute, query_fn)
+
+    def execute_many(self, query_fns):
+        """
+        Execute several independent traversals concurrently
+
+        Args:
+            query_fns (dict|list): Traversal functions, keyed or positional
+
+        Returns:
+            dict|list: Results in the same shape as ``query_fns``
+        """
+        if isinstance(query_fns, dict):
+            futures = {key: self.submit(fn) for key, fn in query_fns.items()}
+            return {key: future.result() for key, future in futures.items()}
+
+        futures = [self.submit(fn) for fn in query_fns]
+        return [future.result() for future in futures]
+
+    def ping(self):
+        """
+        Check that the connection can serve a trivial traversal
+
+        Returns:
+            bool: True if the server answered
+        """
+        try:
+            self.execute(lambda g: g.inject(1).next())
+            return True
+        except Exception as e:
+            logger.warning(f"Gremlin health check failed: {str(e)}")
+            return False
+
+    def close(self):
+        """
+        Close the connection pool and the submission executor
+        """
+        with self._lock:
+            self._close_connection()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        logger.info(f"Closed Gremlin connection pool to {self.url}")
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(neptune_endpoint=None, port=8182, use_ssl=True, url=None, **kwargs):
+    """
+    Get the process-wide connection manager for an endpoint
+
+    Managers are created once per URL and reused across calls (and across warm
+    Lambda invocations), so callers never pay for a fresh WebSocket handshake.
+    Set ``GREMLIN_URL`` (e.g. ws://localhost:8182/gremlin) to point every caller
+    at a local Gremlin Server/TinkerGraph instead of Neptune.
+
+    Args:
+        neptune_endpoint (str): Neptune cluster endpoint
+        port (int): Port number (default: 8182)
+        use_ssl (bool): Use wss:// instead of ws://
+        url (str): Full Gremlin URL, overrides endpoint/port/use_ssl
+        **kwargs: Extra NeptuneConnectionManager options for first creation
+
+    Returns:
+        NeptuneConnectionManager: Shared manager
+    """
+    url = url or os.environ.get('GREMLIN_URL') or build_gremlin_url(neptune_endpoint, port, use_ssl)
+
+    with _managers_lock:
+        manager = _managers.get(url)
+        if manager is None:
+            manager = NeptuneConnectionManager(url, **kwargs)
+            _managers[url] = manager
+        return manager
+
+
+def close_all_connections():
+    """
+    Close every shared connection manager (e.g. on service shutdown)
+    """
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+
+    for manager in managers:
+        manager.close()
@@ -0,0 +1,129 @@
+"""
+Purpose
+
+Index over a set of Textract blocks, built once per document (or page) so
+extractors do not each rebuild block maps and re-walk Relationships lists.
+"""
+
+from collections import defaultdict
+
+
+class BlockIndex:
+    """Precomputed lookups over Textract blocks."""
+
+    def __init__(self, blocks):
+        """
+        :param blocks: Textract blocks, in the order Textract returned them.
+        """
+        self.blocks = blocks if isinstance(blocks, list) else list(blocks)
+        self.by_id = {}
+        self.children = {}
+        self.values = {}
+        self.parents = defaultdict(list)
+        self.by_type = defaultdict(list)
+        self.page_ranges = {}
+        # WORD/SELECTION_ELEMENT id -> containing CELL id and TABLE id
+        self.word_cell = {}
+        self.word_table = {}
+        self._text_cache = {}
+        self._table_cache = {}
+
+        for position, block in enumerate(self.blocks):
+            block_id = block["Id"]
+            self.by_id[block_id] = block
+            self.by_type[block["BlockType"]].append(block)
+
+            page = block.get("Page", 1)
+            start, _ = self.page_ranges.get(page, (position, position))
+            self.page_ranges[page] = (start, position + 1)
+
+            for rel in block.get("Relationships", []):
+                if rel["Type"] == "CHILD":
+                    self.children.setdefault(block_id, []).extend(rel["Ids"])
+                    for child_id in rel["Ids"]:
+                        self.parents[child_id].append(block_id)
+                elif rel["Type"] == "VALUE":
+                    self.values.setdefault(block_id, []).extend(rel["Ids"])
+
+        for table in self.by_type["TABLE"]:
+            for cell_id in self.children.get(table["Id"], []):
+                for word_id in self.children.get(cell_id, []):
+                    self.word_cell[word_id] = cell_id
+                    self.word_table[word_id] = table["Id"]
+
+    def get(self, block_id):
+        return self.by_id.get(block_id)
+
+    def child_blocks(self, block_id, block_type=None):
+        """Yields the existing CHILD blocks of a block, optionally of one type."""
+        for child_id in self.children.get(block_id, []):
+            child = self.by_id.get(child_id)
+            if child is not None and (block_type is None or child["BlockType"] == block_type):
+                yield child
+
+    def page_blocks(self, page):
+        """Blocks of one page (Textract returns blocks ordered by page)."""
+        start, end = self.page_ranges.get(page, (0, 0))
+        return self.blocks[start:end]
+
+    def text(self, block):
+        """
+        Text of a block's WORD children; selected checkboxes read as "X".
+
+        :param block: A block or block ID.
+        """
+        if block is None:
+            return ""
+        block_id = block if isinstance(block, str) else block["Id"]
+        cached = self._text_cache.get(block_id)
+        if cached is not None:
+            return cached
+
+        parts = []
+        for child in self.child_blocks(block_id):
+            if child["BlockType"] == "WORD":
+                parts.append(child["Text"])
+            elif child["BlockType"] == "SELECTION_ELEMENT" and child.get("SelectionStatus") == "SELECTED":
+                parts.append("X")
+        text = " ".join(parts)
+        self._text_cache[block_id] = text
+        return text
+
+    def is_in_table(self, block):
+        """True if any word of a block (e.g. a LINE) lies in a table cell."""
+        return any(word_id in self.word_table for word_id in self.children.get(block["Id"], []))
+
+    def table(self, table_block):
+        """
+        Cell texts of a table.
+
+        :return: Dict of row index to dict of column index to text.
+        """
+        table_id = table_block["Id"]
+        rows = self._table_cache.get(table_id)
+        if rows is None:
+            rows = {}
+            for cell in self.child_blocks(table_id, "CELL"):
+                rows.setdefault(cell["RowIndex"], {})[cell["ColumnIndex"]] = self.text(cell)
+            self._table_cache[table_id] = rows
+        return rows
+
+    def tables(self):
+        """Grids of every non-empty table, in document order."""
+        return [rows for rows in (self.table(block) for block in self.by_type["TABLE"]) if rows]
+
+    def is_key(self, block):
+        return block["BlockType"] == "KEY_VALUE_SET" and "KEY" in block.get("EntityTypes", [])
+
+    def value_block(self, key_block):
+        for value_id in self.values.get(key_block["Id"], []):
+            return self.by_id.get(value_id)
+        return None
+
+    def kv_pair(self, key_block):
+        """:return: Tuple of (key text, value text)."""
+        return self.text(key_block), self.text(self.value_block(key_block))
+
+    def kv_pairs(self):
+        """Key-value pairs of every form key, in document order."""
+        return [self.kv_pair(block) for block in self.by_type["KEY_VALUE_SET"] if self.is_key(block)]
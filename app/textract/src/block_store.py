@@ -0,0 +1,449 @@
+"""
+Purpose
+
+Compact storage for raw Textract blocks, on local disk or in S3.
+
+Formats, chosen by file extension:
+
+* .ndjson       plain NDJSON, one block per line.
+* .ndjson.zst   zstd-compressed NDJSON (needs zstandard), or .ndjson.gz with
+                gzip when zstandard isn't installed. Each page is its own
+                compressed frame and a sidecar <file>.idx.json records every
+                frame's page, offset, length and block types.
+* .parquet      Parquet (needs pyarrow) with page, block_type, id and block
+                columns, one row group per written page.
+
+read_blocks pushes page and block type predicates down: compressed NDJSON
+reads only the frames of matching pages (one ranged GET per contiguous run
+of frames in S3) and Parquet skips row groups by their column statistics.
+Paths may be local or s3://bucket/key.
+"""
+
+import argparse
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import boto3
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pafs = pq = None
+
+NDJSON = ".ndjson"
+ZSTD = ".ndjson.zst"
+GZIP = ".ndjson.gz"
+PARQUET = ".parquet"
+INDEX_SUFFIX = ".idx.json"
+
+FORMATS = {
+    "ndjson": NDJSON,
+    "zstd": ZSTD,
+    "gzip": GZIP,
+    "parquet": PARQUET,
+}
+
+
+def compressed_extension():
+    """Extension of the best available compressed NDJSON format."""
+    return ZSTD if zstandard is not None else GZIP
+
+
+def store_extension(path):
+    for extension in (ZSTD, GZIP, PARQUET, NDJSON):
+        if path.endswith(extension):
+            return extension
+    raise ValueError(f"Unknown block store format: {path}")
+
+
+def store_path(folder, name, raw_format):
+    """
+    Path of a block store in a folder.
+
+    :param name: Base name without extension, e.g. "document-analysis".
+    :param raw_format: A FORMATS key; "zstd" falls back to gzip if zstandard
+                       isn't installed.
+    """
+    extension = FORMATS[raw_format]
+    if extension == ZSTD:
+        extension = compressed_extension()
+    return os.path.join(folder, name + extension)
+
+
+def find_store(folder, name):
+    """
+    Finds a block store in a local folder, whatever its format.
+
+    :return: The path, or None if there is none.
+    """
+    for extension in (ZSTD, GZIP, PARQUET, NDJSON, ".json"):
+        path = os.path.join(folder, name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def is_s3(path):
+    return path.startswith("s3://")
+
+
+def _split_s3(path):
+    bucket, _, key = path[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def _s3(s3_client):
+    return s3_client or boto3.client("s3")
+
+
+def _encode(blocks):
+    return "".join(json.dumps(block, ensure_ascii=False, separators=(",", ":")) + "\n" for block in blocks).encode("utf-8")
+
+
+def _decode(data):
+    for line in data.decode("utf-8").splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+class BlockStoreWriter:
+    """
+    Writes blocks one page at a time.
+
+    S3 targets are written to a temporary file and uploaded on close.
+    """
+
+    def __init__(self, path, s3_client=None, compression_level=3):
+        """
+        :param path: Target path; the extension picks the format.
+        :param s3_client: A Boto3 S3 client for s3:// targets.
+        :param compression_level: zstd compression level.
+        """
+        self.path = path
+        self.extension = store_extension(path)
+        self.s3_client = s3_client
+        self.block_count = 0
+        self._entries = []
+        self._offset = 0
+
+        if self.extension == ZSTD and zstandard is None:
+            raise RuntimeError("zstd block stores require zstandard: pip install zstandard")
+        if self.extension == PARQUET and pq is None:
+            raise RuntimeError("Parquet block stores require pyarrow: pip install pyarrow")
+
+        self._local_path = path
+        self._tempdir = None
+        if is_s3(path):
+            self._tempdir = tempfile.mkdtemp()
+            self._local_path = os.path.join(self._tempdir, os.path.basename(path))
+
+        self._compressor = zstandard.ZstdCompressor(level=compression_level) if self.extension == ZSTD else None
+        self._parquet = None
+        self._file = None if self.extension == PARQUET else open(self._local_path, "wb")
+
+    def _parquet_table(self, blocks):
+        return pa.table({
+            "page": pa.array([block.get("Page", 1) for block in blocks], pa.int32()),
+            "block_type": pa.array([block["BlockType"] for block in blocks], pa.string()),
+            "id": pa.array([block["Id"] for block in blocks], pa.string()),
+            "block": pa.array([json.dumps(block, ensure_ascii=False, separators=(",", ":")) for block in blocks], pa.string()),
+        })
+
+    def write_page(self, blocks):
+        """:param blocks: Blocks of one page."""
+        if not blocks:
+            return
+        self.block_count += len(blocks)
+
+        if self.extension == PARQUET:
+            table = self._parquet_table(blocks)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self._local_path, table.schema, compression="zstd")
+            self._parquet.write_table(table)
+            return
+
+        data = _encode(blocks)
+        if self.extension == ZSTD:
+            data = self._compressor.compress(data)
+        elif self.extension == GZIP:
+            data = gzip.compress(data)
+        self._file.write(data)
+
+        if self.extension != NDJSON:
+            self._entries.append({
+                "page": blocks[0].get("Page", 1),
+                "offset": self._offset,
+                "length": len(data),
+                "blocks": len(blocks),
+                "types": sorted({block["BlockType"] for block in blocks}),
+            })
+        self._offset += len(data)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._file is not None:
+            self._file.close()
+
+        index_path = None
+        if self._entries:
+            index_path = self._local_path + INDEX_SUFFIX
+            with open(index_path, "w", encoding="utf-8") as f:
+                json.dump({"format": self.extension, "pages": self._entries}, f)
+
+        if self._tempdir is not None:
+            try:
+                bucket, key = _split_s3(self.path)
+                client = _s3(self.s3_client)
+                if os.path.exists(self._local_path):
+                    client.upload_file(self._local_path, bucket, key)
+                if index_path:
+                    client.upload_file(index_path, bucket, key + INDEX_SUFFIX)
+            finally:
+                shutil.rmtree(self._tempdir, ignore_errors=True)
+        logger.info("Stored %d blocks in %s.", self.block_count, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_blocks(path, blocks, s3_client=None):
+    """
+    Writes a page-ordered block sequence to a store.
+
+    :return: The number of blocks written.
+    """
+    with BlockStoreWriter(path, s3_client) as writer:
+        page_blocks = []
+        for block in blocks:
+            if page_blocks and block.get("Page", 1) != page_blocks[-1].get("Page", 1):
+                writer.write_page(page_blocks)
+                page_blocks = []
+            page_blocks.append(block)
+        writer.write_page(page_blocks)
+    return writer.block_count
+
+
+def _page_filter(pages):
+    """:return: Predicate on page numbers from None, (first, last) or a collection."""
+    if pages is None:
+        return lambda page: True
+    if isinstance(pages, tuple) and len(pages) == 2:
+        first, last = pages
+        return lambda page: first <= page <= last
+    pages = set(pages)
+    return lambda page: page in pages
+
+
+def _read_index(path, s3_client):
+    index_path = path + INDEX_SUFFIX
+    if is_s3(path):
+        bucket, key = _split_s3(index_path)
+        try:
+            body = _s3(s3_client).get_object(Bucket=bucket, Key=key)["Body"].read()
+        except ClientError as error:
+            if error.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(body)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _read_range(path, offset, length, s3_client):
+    if is_s3(path):
+        bucket, key = _split_s3(path)
+        response = _s3(s3_client).get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{offset + length - 1}")
+        return response["Body"].read()
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def _read_all(path, s3_client):
+    if is_s3(path):
+        bucket, key = _split_s3(path)
+        return _s3(s3_client).get_object(Bucket=bucket, Key=key)["Body"].read()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _decompress(extension, data):
+    if extension == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Reading zstd block stores requires zstandard: pip install zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True)
+        return reader.read()
+    if extension == GZIP:
+        # Concatenated gzip members decompress as one stream
+        return gzip.decompress(data)
+    return data
+
+
+def _spans(entries):
+    """Merges frames that are adjacent in the file into (offset, length, entries) spans."""
+    spans = []
+    for entry in entries:
+        if spans and spans[-1][0] + spans[-1][1] == entry["offset"]:
+            offset, length, members = spans[-1]
+            spans[-1] = (offset, length + entry["length"], members + [entry])
+        else:
+            spans.append((entry["offset"], entry["length"], [entry]))
+    return spans
+
+
+def _read_parquet(path, page_ok, pages, block_types):
+    if pq is None:
+        raise RuntimeError("Reading Parquet block stores requires pyarrow: pip install pyarrow")
+    filters = []
+    if isinstance(pages, tuple) and len(pages) == 2:
+        filters += [("page", ">=", pages[0]), ("page", "<=", pages[1])]
+    elif pages is not None:
+        filters.append(("page", "in", sorted(set(pages))))
+    if block_types:
+        filters.append(("block_type", "in", sorted(block_types)))
+
+    filesystem, location = pafs.FileSystem.from_uri(path) if is_s3(path) else (None, path)
+    table = pq.read_table(location, filesystem=filesystem, columns=["page", "block"], filters=filters or None)
+    for page, block in zip(table.column("page").to_pylist(), table.column("block").to_pylist()):
+        if page_ok(page):
+            yield json.loads(block)
+
+
+def read_blocks(path, pages=None, block_types=None, s3_client=None):
+    """
+    Yields the blocks of a store, optionally only some pages and types.
+
+    :param path: Local path or s3:// URI of the store.
+    :param pages: None for all pages, a (first, last) tuple (inclusive) or a
+                  collection of page numbers.
+    :param block_types: None for all, or a collection of BlockType values.
+    :param s3_client: A Boto3 S3 client for s3:// paths.
+    """
+    page_ok = _page_filter(pages)
+    types = set(block_types) if block_types else None
+
+    def wanted(block):
+        return page_ok(block.get("Page", 1)) and (types is None or block["BlockType"] in types)
+
+    if path.endswith(".json") and not path.endswith(INDEX_SUFFIX):
+        # Legacy {"Blocks": [...]} result
+        yield from (block for block in json.loads(_read_all(path, s3_client))["Blocks"] if wanted(block))
+        return
+
+    extension = store_extension(path)
+    if extension == PARQUET:
+        yield from _read_parquet(path, page_ok, pages, types)
+        return
+
+    index = _read_index(path, s3_client) if extension != NDJSON else None
+    if index is None:
+        data = _decompress(extension, _read_all(path, s3_client))
+        yield from (block for block in _decode(data) if wanted(block))
+        return
+
+    entries = [
+        entry for entry in index["pages"]
+        if page_ok(entry["page"]) and (types is None or types.intersection(entry["types"]))
+    ]
+    for offset, length, _ in _spans(entries):
+        data = _decompress(extension, _read_range(path, offset, length, s3_client))
+        yield from (block for block in _decode(data) if wanted(block))
+
+
+def copy_store(source, destination, s3_client=None):
+    """
+    Copies a store between local disk and S3, converting its format if the
+    extensions differ.
+
+    :return: The number of blocks converted, or None for a plain copy.
+    """
+    if store_extension(source) == store_extension(destination):
+        client = _s3(s3_client) if is_s3(source) or is_s3(destination) else None
+        for suffix in ("", INDEX_SUFFIX):
+            _copy_file(source + suffix, destination + suffix, client, required=not suffix)
+        return None
+    return write_blocks(destination, read_blocks(source, s3_client=s3_client), s3_client)
+
+
+def _copy_file(source, destination, client, required=True):
+    if not is_s3(source) and not os.path.exists(source):
+        if required:
+            raise FileNotFoundError(source)
+        return
+    if is_s3(source) and is_s3(destination):
+        src_bucket, src_key = _split_s3(source)
+        dst_bucket, dst_key = _split_s3(destination)
+        try:
+            client.copy({"Bucket": src_bucket, "Key": src_key}, dst_bucket, dst_key)
+        except ClientError:
+            if required:
+                raise
+    elif is_s3(source):
+        bucket, key = _split_s3(source)
+        try:
+            client.download_file(bucket, key, destination)
+        except ClientError:
+            if required:
+                raise
+    elif is_s3(destination):
+        bucket, key = _split_s3(destination)
+        client.upload_file(source, bucket, key)
+    else:
+        shutil.copyfile(source, destination)
+
+
+def _parse_pages(value):
+    if not value:
+        return None
+    if "-" in value:
+        first, last = value.split("-", 1)
+        return int(first), int(last)
+    return {int(page) for page in value.split(",")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and query stored Textract blocks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    copy = commands.add_parser("copy", help="Copy or convert a store (local paths or s3:// URIs)")
+    copy.add_argument("source")
+    copy.add_argument("destination")
+
+    query = commands.add_parser("query", help="Print matching blocks as NDJSON")
+    query.add_argument("path")
+    query.add_argument("--pages", help="Range like 10-20 or a list like 1,4,7")
+    query.add_argument("--types", help="Block types like TABLE,CELL")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    if args.command == "copy":
+        copy_store(args.source, args.destination)
+    else:
+        types = args.types.split(",") if args.types else None
+        for block in read_blocks(args.path, _parse_pages(args.pages), types):
+            print(json.dumps(block, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
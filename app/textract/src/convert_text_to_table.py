@@ -1,70 +1,185 @@
+"""
+Gắn nhãn TABLExxx cho các dòng trong text-detection.csv thuộc về một bảng.
+
+Tags each line of text-detection.csv that belongs to a table with the table's
+label (table_7.csv -> TABLE007). Cell texts of every table_*.csv go into one
+text -> labels inverted index, so each line is a dictionary lookup. When
+tables.csv records where each table is, a line is only tagged if it lies on
+the table's page inside its bounding box, so the same text elsewhere on the
+page (a heading repeating a column name, say) stays a LINE.
+
+Rows are streamed from the input to the output one at a time.
+
+Usage: python convert_text_to_table.py <output folder>
+"""
+
+import argparse
 import csv
-import os
 import logging
+import os
+import re
 from glob import glob
 
-# === CẤU HÌNH ===
-OUTPUT_FOLDER  ="../outputs/2-mb01bgiy--ngh-kim-h-m-v-s-dng-tktt-chung-khdn"
-TEXT_CSV_PATH = f"{OUTPUT_FOLDER}/text-detection.csv"
-TABLE_FOLDER = f"{OUTPUT_FOLDER}/."  # Hoặc thư mục chứa các file table_*.csv
-OUTPUT_CSV = f"{OUTPUT_FOLDER}/text-detection.converted.csv"
-LOG_FILE = f"{OUTPUT_FOLDER}/process_table_merge.log"
-
-# === SETUP LOGGING ===
-logging.basicConfig(
-    filename=LOG_FILE,
-    filemode='w',
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)s | %(message)s',
-)
 logger = logging.getLogger(__name__)
 
-logger.info("🚀 Bắt đầu xử lý text-detection.csv và gắn type TABLEXXX theo các bảng.")
+TABLE_FILE_PATTERN = re.compile(r"table_(\d+)\.csv$")
+# Slack around a table's bounding box, in page fractions
+BBOX_TOLERANCE = 0.005
+
+
+def table_label(file_path):
+    """TABLExxx label of a table_N.csv file, or None for other files."""
+    match = TABLE_FILE_PATTERN.search(os.path.basename(file_path))
+    return f"TABLE{int(match.group(1)):03d}" if match else None
+
+
+def build_table_index(table_folder):
+    """
+    Builds the text -> table labels inverted index.
+
+    :return: Dict of cell text to list of labels, in table order.
+    """
+    table_files = [(table_label(path), path) for path in glob(os.path.join(table_folder, "table_*.csv"))]
+    table_files = sorted((label, path) for label, path in table_files if label)
+
+    index = {}
+    for label, file_path in table_files:
+        logger.info("📄 Đọc %s thành %s", file_path, label)
+        with open(file_path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                for cell in row:
+                    text = cell.strip()
+                    if text:
+                        labels = index.setdefault(text, [])
+                        if not labels or labels[-1] != label:
+                            labels.append(label)
+
+    logger.info("Indexed %d distinct cell texts from %d tables.", len(index), len(table_files))
+    return index
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
 
-# === ĐỌC TOÀN BỘ BẢNG VÀ GÁN NHÃN ===
-tables = {}  # key: TABLE001, TABLE002, ... | value: set of text values
-table_files = sorted(glob(os.path.join(TABLE_FOLDER, "table_*.csv")))
+def load_table_positions(table_folder):
+    """
+    Reads the page and bounding box of each table from tables.csv.
 
-for idx, file_path in enumerate(table_files, start=1):
-    label = f"TABLE{idx:03d}"
-    tables[label] = set()
+    :return: Dict of label to (page, (left, top, width, height) or None);
+             empty if the folder has no manifest.
+    """
+    manifest = os.path.join(table_folder, "tables.csv")
+    if not os.path.exists(manifest):
+        logger.info("No tables.csv in %s; matching on text only.", table_folder)
+        return {}
+
+    positions = {}
+    with open(manifest, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            label = table_label(row["Table"] + ".csv")
+            box = [_float(row.get(field)) for field in ("Left", "Top", "Width", "Height")]
+            positions[label] = (row["Page Number"], None if None in box else tuple(box))
+    return positions
+
+
+def _contains(box, x, y):
+    left, top, width, height = box
+    return (
+        left - BBOX_TOLERANCE <= x <= left + width + BBOX_TOLERANCE
+        and top - BBOX_TOLERANCE <= y <= top + height + BBOX_TOLERANCE
+    )
+
+
+def match_table(row, labels, positions):
+    """
+    Picks the table a line belongs to among the tables containing its text.
+
+    :param row: A text-detection.csv row.
+    :param labels: Candidate labels from the inverted index.
+    :param positions: Table positions from load_table_positions.
+    :return: The label, or None if the line lies outside every candidate.
+    """
+    if not positions:
+        return labels[0]
+
+    page = row.get("Page Number")
+    left, top, width, height = (_float(row.get(field)) for field in ("Left", "Top", "Width", "Height"))
+    has_box = None not in (left, top, width, height)
+
+    for label in labels:
+        table_page, box = positions.get(label, (None, None))
+        if table_page is None:
+            # Table missing from the manifest: fall back to text matching
+            return label
+        if table_page != page:
+            continue
+        if not has_box or box is None or _contains(box, left + width / 2, top + height / 2):
+            return label
+    return None
+
+
+def tag_lines(text_csv_path, output_csv_path, table_folder):
+    """
+    Writes a copy of text-detection.csv with table lines typed TABLExxx.
+
+    :return: Tuple of (rows written, rows tagged).
+    """
+    index = build_table_index(table_folder)
+    positions = load_table_positions(table_folder)
+    total = tagged = 0
+
+    with open(text_csv_path, newline="", encoding="utf-8") as src, \
+            open(output_csv_path, "w", newline="", encoding="utf-8") as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, fieldnames=reader.fieldnames)
+        writer.writeheader()
 
-    logger.info("📄 Đọc %s thành %s", file_path, label)
-    with open(file_path, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
         for row in reader:
-            for cell in row:
-                text = cell.strip()
-                if text:
-                    tables[label].add(text)
-
-# === ĐỌC TEXT FILE VÀ ÁNH XẠ ===
-output_rows = []
-
-with open(TEXT_CSV_PATH, newline='', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        text = row["Text"].strip()
-        original_type = row["Type"]
-        matched = False
-
-        for label, value_set in tables.items():
-            if text in value_set:
+            total += 1
+            text = row["Text"].strip()
+            labels = index.get(text)
+            label = match_table(row, labels, positions) if labels else None
+            if label:
                 row["Type"] = label
-                matched = True
-                logger.info("🟡 Text '%s' gán vào bảng %s", text, label)
-                break
+                tagged += 1
+                logger.debug("🟡 Text '%s' gán vào bảng %s", text, label)
+            elif labels:
+                logger.debug("⚪ '%s' nằm ngoài vị trí các bảng %s", text, labels)
+            writer.writerow(row)
+
+    logger.info("✅ Hoàn tất. Tagged %d of %d lines. Đã ghi file: %s", tagged, total, output_csv_path)
+    return total, tagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tag text-detection.csv lines with the table they belong to.")
+    parser.add_argument("output_folder", help="Pipeline output folder of one document")
+    parser.add_argument("--table-folder", help="Folder holding table_*.csv and tables.csv (default: output_folder)")
+    parser.add_argument("--output", help="Default: <output_folder>/text-detection.converted.csv")
+    parser.add_argument("--log-file", help="Default: <output_folder>/process_table_merge.log")
+    parser.add_argument("--verbose", action="store_true", help="Log every matched line")
+    args = parser.parse_args()
 
-        if not matched:
-            logger.debug("⚪ Không tìm thấy bảng phù hợp cho: %s", text)
+    output_csv = args.output or os.path.join(args.output_folder, "text-detection.converted.csv")
+    logging.basicConfig(
+        filename=args.log_file or os.path.join(args.output_folder, "process_table_merge.log"),
+        filemode="w",
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+    )
 
-        output_rows.append(row)
+    logger.info("🚀 Bắt đầu xử lý text-detection.csv và gắn type TABLEXXX theo các bảng.")
+    tag_lines(
+        os.path.join(args.output_folder, "text-detection.csv"),
+        output_csv,
+        args.table_folder or args.output_folder,
+    )
+    print(f"✅ DONE. Converted file saved to: {output_csv}")
 
-# === GHI FILE MỚI ===
-with open(OUTPUT_CSV, "w", newline='', encoding="utf-8") as f:
-    writer = csv.DictWriter(f, fieldnames=["Page Number", "Type", "Text", "Confidence Score % (Line)"])
-    writer.writeheader()
-    writer.writerows(output_rows)
 
-logger.info("✅ Hoàn tất. Đã ghi file: %s", OUTPUT_CSV)
-print(f"✅ DONE. Converted file saved to: {OUTPUT_CSV}")
+if __name__ == "__main__":
+    main()
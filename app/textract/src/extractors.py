@@ -0,0 +1,155 @@
+import csv
+import os
+
+from block_index import BlockIndex
+from block_store import BlockStoreWriter, read_blocks
+
+BBOX_FIELDS = ["Left", "Top", "Width", "Height"]
+LINE_CSV_HEADER = ["Page Number", "Type", "Text", "Confidence Score % (Line)"] + BBOX_FIELDS
+TABLE_MANIFEST_HEADER = ["Table", "Page Number"] + BBOX_FIELDS
+
+def _as_index(blocks):
+    return blocks if isinstance(blocks, BlockIndex) else BlockIndex(blocks)
+
+def extract_kv_pairs(blocks):
+    """:param blocks: A BlockIndex, or blocks to index."""
+    return _as_index(blocks).kv_pairs()
+
+def extract_tables(blocks):
+    """:param blocks: A BlockIndex, or blocks to index."""
+    return _as_index(blocks).tables()
+
+def bbox(block):
+    """:return: [left, top, width, height] of a block, in page fractions."""
+    box = block.get("Geometry", {}).get("BoundingBox")
+    if not box:
+        return ["", "", "", ""]
+    return [round(box[field], 4) for field in BBOX_FIELDS]
+
+def line_rows(blocks):
+    """Yields text-detection.csv rows for the LINE blocks in blocks."""
+    for block in blocks:
+        if block["BlockType"] == "LINE":
+            page = block.get("Page", 1)
+            text = block.get("Text", "")
+            conf = round(block.get("Confidence", 0), 2)
+            yield [page, "LINE", text, f"{conf}%"] + bbox(block)
+
+def write_table_markdown(table, path):
+    max_col = max(max(row.keys()) for row in table.values())
+    with open(path, "w", encoding="utf-8") as f:
+        # Write header row (use first row as header, or generate generic headers)
+        header_row = [table[min(table.keys())].get(c, f"Col{c}") for c in range(1, max_col + 1)]
+        f.write("| " + " | ".join(header_row) + " |\n")
+        f.write("|" + " --- |" * max_col + "\n")
+        # Write data rows
+        for r in sorted(table.keys()):
+            row_data = [table[r].get(c, "") for c in range(1, max_col + 1)]
+            f.write("| " + " | ".join(row_data) + " |\n")
+
+def write_table_csv(table, path):
+    max_col = max(max(row.keys()) for row in table.values())
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        for r in sorted(table.keys()):
+            writer.writerow([table[r].get(c, "") for c in range(1, max_col + 1)])
+
+def iter_blocks(path, pages=None, block_types=None):
+    """
+    Yields blocks from a saved Textract result.
+
+    Reads any block store format (plain or compressed NDJSON, Parquet), local
+    or in S3, or a legacy {"Blocks": [...]} JSON file. See
+    block_store.read_blocks for the page and block type filters.
+    """
+    return read_blocks(path, pages, block_types)
+
+def iter_pages(blocks):
+    """
+    Groups a page-ordered block stream by document page.
+
+    :return: Generator of (page number, list of blocks) tuples.
+    """
+    page_number = None
+    page_blocks = []
+    for block in blocks:
+        block_page = block.get("Page", 1)
+        if block_page != page_number and page_blocks:
+            yield page_number, page_blocks
+            page_blocks = []
+        page_number = block_page
+        page_blocks.append(block)
+    if page_blocks:
+        yield page_number, page_blocks
+
+
+class PageOutputWriter:
+    """
+    Writes pipeline outputs incrementally, one document page at a time.
+
+    Raw blocks go to a block store (NDJSON, compressed NDJSON or Parquet, by
+    the extension of json_name), lines to text-detection.csv, key-value pairs to
+    forms.csv and each table to its own table_N.md and table_N.csv as soon as
+    its page is done, so nothing accumulates across pages. tables.csv records
+    the page and bounding box of every table.
+    """
+
+    def __init__(self, output_folder, json_name, extract_forms_and_tables=True):
+        self.output_folder = output_folder
+        self.extract_forms_and_tables = extract_forms_and_tables
+        self.block_count = 0
+        self.line_count = 0
+        self.kv_count = 0
+        self.table_count = 0
+
+        self._raw = BlockStoreWriter(os.path.join(output_folder, json_name))
+        self._lines_file = open(os.path.join(output_folder, "text-detection.csv"), "w", newline="", encoding="utf-8")
+        self._lines = csv.writer(self._lines_file)
+        self._lines.writerow(LINE_CSV_HEADER)
+        self._forms_file = None
+        self._tables_file = None
+        if extract_forms_and_tables:
+            self._forms_file = open(os.path.join(output_folder, "forms.csv"), "w", newline="", encoding="utf-8")
+            self._forms = csv.writer(self._forms_file)
+            self._forms.writerow(["Key", "Value"])
+            self._tables_file = open(os.path.join(output_folder, "tables.csv"), "w", newline="", encoding="utf-8")
+            self._tables = csv.writer(self._tables_file)
+            self._tables.writerow(TABLE_MANIFEST_HEADER)
+
+    def write_page(self, blocks):
+        self._raw.write_page(blocks)
+        self.block_count += len(blocks)
+
+        for row in line_rows(blocks):
+            self._lines.writerow(row)
+            self.line_count += 1
+
+        if not self.extract_forms_and_tables:
+            return
+
+        index = BlockIndex(blocks)
+        for key, value in extract_kv_pairs(index):
+            self._forms.writerow([key, value])
+            self.kv_count += 1
+
+        for block in index.by_type["TABLE"]:
+            table = index.table(block)
+            if not table:
+                continue
+            self.table_count += 1
+            name = f"table_{self.table_count}"
+            write_table_markdown(table, os.path.join(self.output_folder, f"{name}.md"))
+            write_table_csv(table, os.path.join(self.output_folder, f"{name}.csv"))
+            self._tables.writerow([name, block.get("Page", 1)] + bbox(block))
+
+    def close(self):
+        self._raw.close()
+        for f in (self._lines_file, self._forms_file, self._tables_file):
+            if f is not None:
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
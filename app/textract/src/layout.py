@@ -0,0 +1,211 @@
+"""
+Purpose
+
+Reconstructs the reading order of a page from block geometry.
+
+A page is reduced to layout elements: text lines outside tables and forms,
+tables and form key-value pairs, each with its bounding box. Lines whose
+words all belong to a table or a form field are dropped, since the table or
+field is emitted at its own position instead.
+
+Columns are found from a coverage grid over the page width: runs of empty
+grid cells wide enough to be a gutter separate columns. Elements that span a
+gutter (titles, full-width tables) split the page into bands; within a band
+columns are read left to right and each column top to bottom.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+LINE = "LINE"
+TABLE = "TABLE"
+FORM = "FORM"
+
+# Coverage grid resolution across the page width
+GRID_BINS = 200
+# Narrowest empty strip, in page fractions, that counts as a column gutter
+MIN_GUTTER = 0.02
+# Elements wider than this never define columns (they are usually titles)
+MAX_COLUMN_WIDTH = 0.6
+
+
+@dataclass
+class LayoutElement:
+    kind: str
+    block: dict
+    left: float
+    top: float
+    width: float
+    height: float
+    # None for elements spanning a column gutter
+    column: Optional[int] = 0
+
+    @property
+    def right(self):
+        return self.left + self.width
+
+    @property
+    def bottom(self):
+        return self.top + self.height
+
+
+def _box(block):
+    return block.get("Geometry", {}).get("BoundingBox")
+
+
+def _union(boxes):
+    left = min(box["Left"] for box in boxes)
+    top = min(box["Top"] for box in boxes)
+    right = max(box["Left"] + box["Width"] for box in boxes)
+    bottom = max(box["Top"] + box["Height"] for box in boxes)
+    return {"Left": left, "Top": top, "Width": right - left, "Height": bottom - top}
+
+
+def page_elements(index):
+    """
+    Collects the layout elements of an indexed page, in block order.
+
+    :param index: BlockIndex of one page.
+    :return: List of LayoutElement; elements without geometry get a zero box.
+    """
+    form_words = set()
+    form_boxes = {}
+    for key in index.by_type["KEY_VALUE_SET"]:
+        if not index.is_key(key):
+            continue
+        value = index.value_block(key)
+        parts = [key] if value is None else [key, value]
+        for part in parts:
+            form_words.update(index.children.get(part["Id"], []))
+        boxes = [_box(part) for part in parts if _box(part)]
+        form_boxes[key["Id"]] = _union(boxes) if boxes else None
+
+    elements = []
+    for block in index.blocks:
+        if block["BlockType"] == LINE:
+            word_ids = index.children.get(block["Id"], [])
+            if index.is_in_table(block):
+                continue
+            if word_ids and all(word_id in form_words for word_id in word_ids):
+                continue
+            if not block.get("Text", "").strip():
+                continue
+            elements.append(_element(LINE, block, _box(block)))
+        elif block["BlockType"] == TABLE:
+            if index.table(block):
+                elements.append(_element(TABLE, block, _box(block)))
+        elif block["Id"] in form_boxes:
+            elements.append(_element(FORM, block, form_boxes[block["Id"]]))
+    return elements
+
+
+def _element(kind, block, box):
+    if not box:
+        return LayoutElement(kind, block, 0.0, 0.0, 0.0, 0.0)
+    return LayoutElement(kind, block, box["Left"], box["Top"], box["Width"], box["Height"])
+
+
+def detect_columns(elements, bins=GRID_BINS, min_gutter=MIN_GUTTER, max_column_width=MAX_COLUMN_WIDTH):
+    """
+    Finds column boundaries from the horizontal coverage of narrow elements.
+
+    :return: Sorted x positions (page fractions) of the gutters' centres.
+    """
+    coverage = [0] * bins
+    narrow = [element for element in elements if 0 < element.width <= max_column_width]
+    if not narrow:
+        return []
+
+    for element in narrow:
+        first = max(0, int(element.left * bins))
+        last = min(bins - 1, int(element.right * bins))
+        for cell in range(first, last + 1):
+            coverage[cell] += 1
+
+    start = int(min(element.left for element in narrow) * bins)
+    end = min(bins - 1, int(max(element.right for element in narrow) * bins))
+    min_run = max(1, int(min_gutter * bins))
+
+    boundaries = []
+    run_start = None
+    for cell in range(start, end + 1):
+        if coverage[cell] == 0:
+            if run_start is None:
+                run_start = cell
+        elif run_start is not None:
+            boundary = (run_start + cell) / 2 / bins
+            if cell - run_start >= min_run and _side_by_side(narrow, boundary, bins):
+                boundaries.append(boundary)
+            run_start = None
+    return boundaries
+
+
+def _side_by_side(elements, boundary, bins, min_pairs=2):
+    """
+    True if elements on both sides of a gutter share rows of the page.
+
+    A lone right-aligned line (a date, a page number) leaves an empty strip
+    too, but nothing beside it; real columns run next to each other.
+    """
+    rows = [False] * bins
+    for element in elements:
+        if element.right <= boundary:
+            for cell in range(max(0, int(element.top * bins)), min(bins - 1, int(element.bottom * bins)) + 1):
+                rows[cell] = True
+
+    pairs = 0
+    for element in elements:
+        if element.left >= boundary:
+            cells = range(max(0, int(element.top * bins)), min(bins - 1, int(element.bottom * bins)) + 1)
+            if any(rows[cell] for cell in cells):
+                pairs += 1
+                if pairs >= min_pairs:
+                    return True
+    return False
+
+
+def _assign_column(element, boundaries):
+    """Column index of an element, or None if it spans a gutter."""
+    column = 0
+    for boundary in boundaries:
+        if element.right <= boundary:
+            return column
+        if element.left < boundary:
+            return None
+        column += 1
+    return column
+
+
+def reading_order(index):
+    """
+    Orders the layout elements of an indexed page for reading.
+
+    Pages without geometry (e.g. hand-built blocks) keep block order.
+
+    :param index: BlockIndex of one page.
+    :return: List of LayoutElement in reading order.
+    """
+    elements = page_elements(index)
+    if not elements or any(element.width == 0 and element.height == 0 for element in elements):
+        return elements
+
+    boundaries = detect_columns(elements)
+    for element in elements:
+        element.column = _assign_column(element, boundaries)
+
+    ordered = []
+    band = []
+
+    def flush():
+        band.sort(key=lambda element: (element.column, element.top, element.left))
+        ordered.extend(band)
+        band.clear()
+
+    for element in sorted(elements, key=lambda element: (element.top, element.left)):
+        if element.column is None:
+            flush()
+            ordered.append(element)
+        else:
+            band.append(element)
+    flush()
+    return ordered
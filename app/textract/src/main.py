@@ -1,244 +1,133 @@
-import boto3
-import os
-import random
-import time
+"""
+Command-line entry point of the Textract pipeline.
+
+    python main.py report.pdf
+    python main.py ./scans s3://vpbank-documents/uploads/ --workers 8
+    python main.py --replay ../outputs --output-dir /tmp/replay
+
+Local files are uploaded to the bucket before analysis; directories and S3
+prefixes are expanded into their documents. With --replay no AWS calls are
+made: every saved result under the folder is replayed through a local
+Textract stub and the batch throughput is reported.
+"""
+
+import argparse
 import json
-import csv
 import logging
-from datetime import datetime
-
-AWS_PROFILE = 'vpbank'
-BUCKET_NAME = 'vpbank-documents'
-LOCAL_FILE_PATH = r'E:\VPFlow\app\textract\outputs\3-mb01dgiy--ngh-m-v-s-dng-tkttchi-nhnh\3-mb01dgiy--ngh-m-v-s-dng-tkttchi-nhnh.pdf'
-
-filename_only = os.path.basename(LOCAL_FILE_PATH)
-output_folder = os.path.join("../outputs", os.path.splitext(filename_only)[0])
-os.makedirs(output_folder, exist_ok=True)
-
-log_path = os.path.join(output_folder, "process.log")
-logging.basicConfig(
-    filename=log_path,
-    filemode='w',
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-)
-logger = logging.getLogger(__name__)
-
-logger.info("Start Textract processing for: %s", filename_only)
+import os
+import time
 
-session = boto3.Session(profile_name=AWS_PROFILE)
-s3 = session.resource("s3")
-s3_key = f"uploads/{filename_only}"
+import boto3
 
-print(1)
+from block_store import FORMATS
+from ocr_cache import OcrCache
+from processor import DocumentProcessor, expand_sources, replay_orchestrator, summarize
+from textract_jobs import MODE_ANALYSIS, MODE_DETECTION, TextractJobOrchestrator
 
-try:
-    logger.info("Uploading %s to S3 bucket %s at key %s", filename_only, BUCKET_NAME, s3_key)
-    s3.Bucket(BUCKET_NAME).upload_file(LOCAL_FILE_PATH, s3_key)
-    logger.info("Upload complete.")
-except Exception as e:
-    logger.error("Upload failed: %s", e)
-    raise
+logger = logging.getLogger(__name__)
 
-print(2)
 
-client = session.client("textract")
-token = str(random.randint(1, int(1e10)))
-try:
-    response = client.start_document_text_detection(
-        DocumentLocation={"S3Object": {"Bucket": BUCKET_NAME, "Name": s3_key}},
-        ClientRequestToken=token,
-    )
-    job_id = response["JobId"]
-    logger.info("Textract job started. JobId: %s", job_id)
-except Exception as e:
-    logger.error("Failed to start Textract job: %s", e)
-    raise
-
-logger.info("Waiting for Textract job to complete...")
-
-while True:
-    job_result = client.get_document_text_detection(JobId=job_id)
-    job_status = job_result["JobStatus"]
-    if job_status in ["SUCCEEDED", "FAILED"]:
-        break
-    logger.info("Job status: %s. Sleeping 5s...", job_status)
-    time.sleep(5)
-
-if job_status != "SUCCEEDED":
-    logger.error("Textract job failed.")
-    exit(1)
-
-all_blocks = []
-next_token = None
-
-while True:
-    if next_token:
-        response = client.get_document_text_detection(JobId=job_id, NextToken=next_token)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run documents through Amazon Textract.")
+    parser.add_argument("sources", nargs="*", help="Local files or folders, s3:// objects or s3:// prefixes ending in /")
+    parser.add_argument("--output-dir", default="../outputs", help="Folder receiving one output folder per document")
+    parser.add_argument("--bucket", default=os.environ.get("TEXTRACT_BUCKET", "vpbank-documents"),
+                        help="Bucket local files are uploaded to")
+    parser.add_argument("--profile", default=os.environ.get("AWS_PROFILE"), help="AWS profile")
+    # "analysis": one job for lines, forms and tables; "detection": lines only (cheaper)
+    parser.add_argument("--mode", choices=(MODE_ANALYSIS, MODE_DETECTION),
+                        default=os.environ.get("TEXTRACT_MODE", MODE_ANALYSIS))
+    parser.add_argument("--workers", type=int, default=4, help="Documents processed concurrently")
+    parser.add_argument("--chunk-pages", type=int,
+                        help="Split PDFs longer than this many pages into concurrent page-range jobs")
+    parser.add_argument("--max-jobs", type=int, default=4, help="Most page-range jobs running at once per document")
+    parser.add_argument("--raw-format", choices=sorted(FORMATS), default="ndjson",
+                        help="Storage of raw blocks: zstd (gzip without zstandard) or parquet to save space")
+    parser.add_argument("--cache", default=os.environ.get("OCR_CACHE"),
+                        help="OCR result cache: a folder or s3://bucket/prefix (e.g. the upload Lambda's ocr-cache/)")
+    parser.add_argument("--no-markdown", action="store_true", help="Skip rendering proposal.md")
+    parser.add_argument("--replay", metavar="RESULTS_DIR",
+                        help="Replay saved results from this folder instead of calling AWS")
+    parser.add_argument("--replay-latency", type=float, default=0.0,
+                        help="Seconds added to each replayed Textract call")
+    parser.add_argument("--log-file", help="Also write the log to this file")
+    parser.add_argument("--verbose", action="store_true", help="Log every page")
+    return parser.parse_args(argv)
+
+
+def build_processor(args):
+    """:return: Tuple of (DocumentProcessor, S3 client or None)."""
+    if args.replay:
+        orchestrator = replay_orchestrator(args.replay, args.replay_latency)
+        s3_client = None
     else:
-        response = client.get_document_text_detection(JobId=job_id)
-
-    all_blocks.extend(response['Blocks'])
-    next_token = response.get('NextToken')
-
-    if not next_token:
-        break
-
-logger.info("Got all blocks: %d", len(all_blocks))
-
-json_path = os.path.join(output_folder, "text-detection.json")
-with open(json_path, "w", encoding="utf-8") as f:
-    json.dump({"Blocks": all_blocks}, f, indent=2, ensure_ascii=False)
-logger.info("Saved full raw Textract JSON to %s", json_path)
-
-line_blocks = [b for b in all_blocks if b["BlockType"] == "LINE"]
-
-csv_path = os.path.join(output_folder, "text-detection.csv")
-with open(csv_path, "w", newline="", encoding="utf-8") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(["Page Number", "Type", "Text", "Confidence Score % (Line)"])
-    for block in line_blocks:
-        page = block.get("Page", 1)
-        text = block.get("Text", "")
-        conf = round(block.get("Confidence", 0), 2)
-        writer.writerow([page, "LINE", text, f"{conf}%"])
-
-logger.info("Extracted %d lines to CSV: %s", len(line_blocks), csv_path)
-# logger.info("✅ Processing complete.")
-# print(f"✅ DONE. Output saved to: {output_folder}")
-
-try:
-    response = client.start_document_analysis(
-        DocumentLocation={"S3Object": {"Bucket": BUCKET_NAME, "Name": s3_key}},
-        FeatureTypes=["TABLES", "FORMS"],
-        ClientRequestToken=token,
+        session = boto3.Session(profile_name=args.profile)
+        s3_client = session.client("s3")
+        # Completion notifications (SNS -> SQS) are optional; without them the
+        # orchestrator polls with jittered exponential backoff
+        queue_url = os.environ.get("TEXTRACT_SQS_QUEUE_URL")
+        orchestrator = TextractJobOrchestrator(
+            session.client("textract"),
+            sqs_client=session.client("sqs") if queue_url else None,
+            queue_url=queue_url,
+            sns_topic_arn=os.environ.get("TEXTRACT_SNS_TOPIC_ARN"),
+            sns_role_arn=os.environ.get("TEXTRACT_SNS_ROLE_ARN"),
+        )
+
+    processor = DocumentProcessor(
+        orchestrator,
+        args.output_dir,
+        bucket_name=args.bucket,
+        s3_client=s3_client,
+        mode=args.mode,
+        markdown=not args.no_markdown,
+        chunk_pages=args.chunk_pages,
+        max_concurrent_jobs=args.max_jobs,
+        raw_format=args.raw_format,
+        cache=OcrCache(args.cache, s3_client) if args.cache else None,
     )
-    job_id = response["JobId"]
-    logger.info("Textract ANALYZE job started. JobId: %s", job_id)
-except Exception as e:
-    logger.error("Failed to start Textract ANALYZE job: %s", e)
-    raise
-
-# Poll cho đến khi hoàn thành
-while True:
-    job_result = client.get_document_analysis(JobId=job_id)
-    job_status = job_result["JobStatus"]
-    if job_status in ["SUCCEEDED", "FAILED"]:
-        break
-    logger.info("Job status: %s. Sleeping 5s...", job_status)
-    time.sleep(5)
-
-if job_status != "SUCCEEDED":
-    logger.error("Textract ANALYZE job failed.")
-    exit(1)
-
-all_blocks = []
-next_token = None
-
-while True:
-    if next_token:
-        response = client.get_document_analysis(JobId=job_id, NextToken=next_token)
-    else:
-        response = client.get_document_analysis(JobId=job_id)
-
-    all_blocks.extend(response["Blocks"])
-    next_token = response.get("NextToken")
-
-    if not next_token:
-        break
-
-logger.info("Got %d blocks from analysis.", len(all_blocks))
-json_path = os.path.join(output_folder, "document-analysis.json")
-with open(json_path, "w", encoding="utf-8") as f:
-    json.dump({"Blocks": all_blocks}, f, indent=2, ensure_ascii=False)
-logger.info("Saved analyze raw JSON to %s", json_path)
-
-print(3)
-
-def get_kv_map(blocks):
-    key_map = {}
-    value_map = {}
-    block_map = {}
-    for block in blocks:
-        block_map[block["Id"]] = block
-        if block["BlockType"] == "KEY_VALUE_SET":
-            if "KEY" in block.get("EntityTypes", []):
-                key_map[block["Id"]] = block
-            else:
-                value_map[block["Id"]] = block
-    return key_map, value_map, block_map
-
-def get_text(block, block_map):
-    text = ""
-    for rel in block.get("Relationships", []):
-        if rel["Type"] == "CHILD":
-            for child_id in rel["Ids"]:
-                word = block_map[child_id]
-                if word["BlockType"] == "WORD":
-                    text += word["Text"] + " "
-                elif word["BlockType"] == "SELECTION_ELEMENT":
-                    if word["SelectionStatus"] == "SELECTED":
-                        text += "X "
-    return text.strip()
-
-def find_value_block(key_block, value_map):
-    for rel in key_block.get("Relationships", []):
-        if rel["Type"] == "VALUE":
-            for value_id in rel["Ids"]:
-                return value_map.get(value_id)
-    return None
-
-def extract_kv_pairs(blocks):
-    key_map, value_map, block_map = get_kv_map(blocks)
-    kvs = []
-    for key_id, key_block in key_map.items():
-        value_block = find_value_block(key_block, value_map)
-        key = get_text(key_block, block_map)
-        value = get_text(value_block, block_map) if value_block else ""
-        kvs.append((key, value))
-    return kvs
-
-form_csv_path = os.path.join(output_folder, "forms.csv")
-kvs = extract_kv_pairs(all_blocks)
-
-with open(form_csv_path, "w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow(["Key", "Value"])
-    for key, value in kvs:
-        writer.writerow([key, value])
-logger.info("Extracted %d form key-value pairs to %s", len(kvs), form_csv_path)
-
-def extract_tables(blocks):
-    block_map = {b["Id"]: b for b in blocks}
-    tables = []
-    for block in blocks:
-        if block["BlockType"] == "TABLE":
-            rows = {}
-            for rel in block.get("Relationships", []):
-                if rel["Type"] == "CHILD":
-                    for cell_id in rel["Ids"]:
-                        cell = block_map[cell_id]
-                        row = cell["RowIndex"]
-                        col = cell["ColumnIndex"]
-                        text = get_text(cell, block_map)
-                        rows.setdefault(row, {})[col] = text
-            tables.append(rows)
-    return tables
-
-tables = extract_tables(all_blocks)
-for i, table in enumerate(tables):
-    table_md_path = os.path.join(output_folder, f"table_{i+1}.md")
-    max_col = max(max(row.keys()) for row in table.values())
-    with open(table_md_path, "w", encoding="utf-8") as f:
-        # Write header row (use first row as header, or generate generic headers)
-        header_row = [table[min(table.keys())].get(c, f"Col{c}") for c in range(1, max_col + 1)]
-        f.write("| " + " | ".join(header_row) + " |\n")
-        f.write("|" + " --- |" * max_col + "\n")
-        # Write data rows
-        for r in sorted(table.keys()):
-            row_data = [table[r].get(c, "") for c in range(1, max_col + 1)]
-            f.write("| " + " | ".join(row_data) + " |\n")
-    logger.info("Extracted table %d to %s (Markdown)", i + 1, table_md_path)
-
-logger.info("✅ All analysis complete. Output folder: %s", output_folder)
-print(f"✅ DONE. All outputs saved to: {output_folder}")
+    return processor, s3_client
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.cache and args.replay and not args.sources:
+        # Replayed documents are names, not files, so there is nothing to hash
+        raise SystemExit("--cache needs document files when used with --replay.")
+
+    handlers = [logging.StreamHandler()]
+    if args.log_file:
+        handlers.append(logging.FileHandler(args.log_file, mode="w", encoding="utf-8"))
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(threadName)s | %(message)s",
+        handlers=handlers,
+    )
+    # Keep per-request botocore/urllib3 chatter out of --verbose page logs
+    logging.getLogger("botocore").setLevel(logging.WARNING)
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+
+    processor, s3_client = build_processor(args)
+
+    sources = args.sources
+    if not sources and args.replay:
+        sources = processor.orchestrator.textract_client.document_names()
+    sources = expand_sources(sources, s3_client)
+    if not sources:
+        raise SystemExit("No documents to process.")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+    results = processor.process_batch(sources, max_workers=args.workers)
+    summary = summarize(results, time.perf_counter() - start)
+
+    for result in results:
+        if not result.succeeded:
+            logger.error("%s failed: %s", result.source, result.error)
+    logger.info("Batch summary: %s", json.dumps(summary))
+    print(json.dumps(summary))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
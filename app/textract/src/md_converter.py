@@ -0,0 +1,107 @@
+"""
+Purpose
+
+Converts a saved Textract analysis result into a Markdown document: lines
+outside tables and forms as text, tables as HTML and form fields as bold
+key-value pairs, in reading order reconstructed from block geometry (see
+layout.py), or in the order Textract returned them with --block-order.
+
+Blocks are streamed one page at a time and each page gets one BlockIndex, so
+conversion makes a single pass over the document.
+
+Usage: python md_converter.py <output folder>
+"""
+
+import argparse
+import logging
+import os
+
+import layout
+from block_index import BlockIndex
+from block_store import find_store
+from extractors import iter_blocks, iter_pages
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TITLE = "VPBank Technology Hackathon 2025"
+
+
+def table_to_html(table):
+    max_col = max(max(row.keys()) for row in table.values())
+    html = "<table border='1'>\n"
+    for r in sorted(table.keys()):
+        html += "  <tr>\n"
+        for c in range(1, max_col + 1):
+            html += f"    <td>{table[r].get(c, '')}</td>\n"
+        html += "  </tr>\n"
+    html += "</table>"
+    return html
+
+
+def element_markdown(index, element):
+    if element.kind == layout.TABLE:
+        return table_to_html(index.table(element.block)) + "\n\n"
+    if element.kind == layout.FORM:
+        key, value = index.kv_pair(element.block)
+        return f"**{key}**: {value}\n\n"
+    return element.block["Text"].strip() + "\n"
+
+
+def page_markdown(index, reading_order=True):
+    """
+    Yields the Markdown chunks of one indexed page.
+
+    :param reading_order: Order elements by geometry; otherwise keep block order.
+    """
+    elements = layout.reading_order(index) if reading_order else layout.page_elements(index)
+    for element in elements:
+        yield element_markdown(index, element)
+
+
+def find_result(output_folder):
+    """Path of the saved analysis result in an output folder."""
+    path = find_store(output_folder, "document-analysis")
+    if path is not None:
+        return path
+    raise FileNotFoundError(f"No document-analysis result in {output_folder}")
+
+
+def convert(result_path, markdown_path, title=DEFAULT_TITLE, reading_order=True):
+    """
+    Writes the Markdown for a saved analysis result.
+
+    :param result_path: document-analysis block store or legacy JSON file.
+    :param markdown_path: File to write.
+    :param title: Top-level heading of the document.
+    :param reading_order: Order each page by geometry rather than block order.
+    :return: The number of pages converted.
+    """
+    pages = 0
+    with open(markdown_path, "w", encoding="utf-8") as f:
+        f.write(f"# {title}\n")
+        for _, blocks in iter_pages(iter_blocks(result_path)):
+            f.writelines(page_markdown(BlockIndex(blocks), reading_order))
+            pages += 1
+    logger.info("Wrote %d pages to %s.", pages, markdown_path)
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a Textract analysis result to Markdown.")
+    parser.add_argument("output_folder", nargs="?", default=".", help="Folder holding the document-analysis result")
+    parser.add_argument("--output", help="Markdown file to write (default: <output_folder>/proposal.md)")
+    parser.add_argument("--title", default=DEFAULT_TITLE)
+    parser.add_argument("--block-order", action="store_true", help="Keep Textract block order instead of reading order")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    convert(
+        find_result(args.output_folder),
+        args.output or os.path.join(args.output_folder, "proposal.md"),
+        args.title,
+        reading_order=not args.block_order,
+    )
+
+
+if __name__ == "__main__":
+    main()
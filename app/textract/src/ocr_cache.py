@@ -0,0 +1,152 @@
+"""
+Purpose
+
+Caches Textract results by file content and feature set, so a document that
+was recognized before is never sent to Textract again.
+
+An entry lives under <root>/<sha256>/<features>/, where root is a local folder
+or an s3://bucket/prefix URI, and holds:
+
+* blocks.ndjson.gz  raw blocks (gzip NDJSON, see block_store.py)
+* text.txt          LINE text, pages separated by blank lines
+* document.md       rendered Markdown, when available
+
+The upload Lambda (app/lambda/ocr_cache.py) uses the same layout under
+s3://<document bucket>/ocr-cache/, so results are shared both ways.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+
+import boto3
+from botocore.exceptions import ClientError
+
+from block_store import GZIP, is_s3, read_blocks, write_blocks
+from textract_jobs import MODE_ANALYSIS
+
+logger = logging.getLogger(__name__)
+
+BLOCKS_FILE = "blocks" + GZIP
+TEXT_FILE = "text.txt"
+MARKDOWN_FILE = "document.md"
+# Metadata the upload Lambda sets on content-addressed objects
+CONTENT_HASH_METADATA = "content-hash"
+
+
+def features_key(mode, feature_types=("TABLES", "FORMS")):
+    """:return: "DETECTION" or e.g. "ANALYSIS-FORMS+TABLES"."""
+    if mode == MODE_ANALYSIS:
+        return "ANALYSIS-" + "+".join(sorted(feature_types))
+    return "DETECTION"
+
+
+def page_text(blocks):
+    """LINE text of blocks, pages separated by blank lines."""
+    pages = {}
+    for block in blocks:
+        if block["BlockType"] == "LINE":
+            pages.setdefault(block.get("Page", 1), []).append(block.get("Text", ""))
+    return "\n\n".join("\n".join(pages[page]) for page in sorted(pages))
+
+
+class OcrCache:
+    """Textract results keyed by content hash and feature set."""
+
+    def __init__(self, root, s3_client=None):
+        """
+        :param root: Local folder or s3://bucket/prefix URI.
+        :param s3_client: A Boto3 S3 client, for S3 roots and S3 sources.
+        """
+        self.root = root.rstrip("/")
+        self.s3_client = s3_client or (boto3.client("s3") if is_s3(root) else None)
+
+    def _path(self, content_hash, features, name):
+        if is_s3(self.root):
+            return f"{self.root}/{content_hash}/{features}/{name}"
+        return os.path.join(self.root, content_hash, features, name)
+
+    def _split(self, uri):
+        bucket, _, key = uri[len("s3://"):].partition("/")
+        return bucket, key
+
+    def _exists(self, path):
+        if not is_s3(path):
+            return os.path.exists(path)
+        bucket, key = self._split(path)
+        try:
+            self.s3_client.head_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError as error:
+            if error.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def source_hash(self, source):
+        """
+        SHA-256 of a local file or S3 object, streamed in chunks.
+
+        Objects the upload Lambda stored carry their hash in metadata, which
+        saves reading them.
+        """
+        digest = hashlib.sha256()
+        if source.startswith("s3://"):
+            bucket, key = self._split(source)
+            client = self.s3_client or boto3.client("s3")
+            content_hash = client.head_object(Bucket=bucket, Key=key).get("Metadata", {}).get(CONTENT_HASH_METADATA)
+            if content_hash:
+                return content_hash
+            for chunk in client.get_object(Bucket=bucket, Key=key)["Body"].iter_chunks(1024 * 1024):
+                digest.update(chunk)
+        else:
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def lookup(self, content_hash, features):
+        """
+        :return: Path of the cached blocks, or None on a miss.
+        """
+        # text.txt is written last, so its presence marks a complete entry
+        if not self._exists(self._path(content_hash, features, TEXT_FILE)):
+            return None
+        path = self._path(content_hash, features, BLOCKS_FILE)
+        return path if self._exists(path) else None
+
+    def iter_blocks(self, path):
+        return read_blocks(path, s3_client=self.s3_client)
+
+    def _put_file(self, local_path, path):
+        if is_s3(path):
+            bucket, key = self._split(path)
+            self.s3_client.upload_file(local_path, bucket, key)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(local_path, path)
+
+    def store(self, content_hash, features, raw_path, markdown_path=None):
+        """
+        Adds a processed document to the cache.
+
+        :param raw_path: The document's raw block store, in any format.
+        :param markdown_path: Its rendered Markdown, if any.
+        """
+        if not is_s3(self.root):
+            os.makedirs(os.path.join(self.root, content_hash, features), exist_ok=True)
+        write_blocks(self._path(content_hash, features, BLOCKS_FILE), read_blocks(raw_path), self.s3_client)
+        if markdown_path and os.path.exists(markdown_path):
+            self._put_file(markdown_path, self._path(content_hash, features, MARKDOWN_FILE))
+
+        text = page_text(read_blocks(raw_path, block_types=["LINE"]))
+        text_path = self._path(content_hash, features, TEXT_FILE)
+        if is_s3(text_path):
+            bucket, key = self._split(text_path)
+            self.s3_client.put_object(
+                Bucket=bucket, Key=key, Body=text.encode("utf-8"), ContentType="text/plain; charset=utf-8"
+            )
+        else:
+            with open(text_path, "w", encoding="utf-8") as f:
+                f.write(text)
+        logger.info("Cached OCR result for %s (%s) in %s.", content_hash, features, self.root)
@@ -0,0 +1,122 @@
+"""
+Purpose
+
+Processes a long PDF as several Textract jobs over consecutive page ranges.
+
+The PDF is split into chunks of a fixed number of pages, each chunk is
+uploaded and analyzed as its own job, and a bounded pool keeps at most
+max_concurrent_jobs jobs running. Results are yielded in document order with
+page numbers shifted back to the original document, and the first chunk's
+pages are available as soon as that chunk finishes rather than when the whole
+document does.
+
+Splitting needs pypdf (pip install pypdf).
+"""
+
+import io
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from textract_jobs import MODE_ANALYSIS
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # pragma: no cover - optional dependency
+    PdfReader = PdfWriter = None
+
+
+def split_pdf(data, pages_per_chunk):
+    """
+    Splits a PDF into page ranges.
+
+    :param data: The PDF as bytes.
+    :param pages_per_chunk: Most pages in one chunk.
+    :return: List of (page offset, chunk PDF bytes) tuples; the offset is the
+             number of pages before the chunk.
+    """
+    if PdfReader is None:
+        raise RuntimeError("Splitting PDFs into page ranges requires pypdf: pip install pypdf")
+
+    reader = PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+    if page_count <= pages_per_chunk:
+        return [(0, data)]
+
+    chunks = []
+    for offset in range(0, page_count, pages_per_chunk):
+        writer = PdfWriter()
+        for page in reader.pages[offset:offset + pages_per_chunk]:
+            writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        chunks.append((offset, buffer.getvalue()))
+    logger.info("Split %d pages into %d chunks of up to %d pages.", page_count, len(chunks), pages_per_chunk)
+    return chunks
+
+
+def offset_pages(blocks, offset):
+    """Shifts the Page of chunk blocks to their page in the whole document."""
+    if offset:
+        for block in blocks:
+            block["Page"] = block.get("Page", 1) + offset
+    return blocks
+
+
+class ChunkedJobRunner:
+    """Runs page-range Textract jobs concurrently and merges their results."""
+
+    def __init__(self, orchestrator, s3_client, bucket_name, max_concurrent_jobs=4):
+        """
+        :param orchestrator: A TextractJobOrchestrator.
+        :param s3_client: A Boto3 S3 client used to upload chunks.
+        :param bucket_name: Bucket chunks are uploaded to.
+        :param max_concurrent_jobs: Most Textract jobs running at once. Keep it
+                                    under the account's concurrent job quota.
+        """
+        self.orchestrator = orchestrator
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.job_ids = []
+
+    def _run_chunk(self, key, data, mode, feature_types):
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=data, ContentType="application/pdf")
+        return self.orchestrator.run_job(
+            self.bucket_name, key, mode=mode, feature_types=feature_types, token=uuid.uuid4().hex
+        )
+
+    def iter_document_pages(self, chunks, key_prefix, mode=MODE_ANALYSIS, feature_types=("TABLES", "FORMS")):
+        """
+        Runs every chunk and yields the merged result one page at a time.
+
+        Chunks are started up to the concurrency limit in document order, and
+        pages are yielded as soon as their chunk and every earlier chunk have
+        finished.
+
+        :param chunks: (page offset, PDF bytes) tuples from split_pdf.
+        :param key_prefix: S3 key prefix for the chunk objects.
+        :return: Generator of (page number, list of blocks) tuples.
+        """
+        keys = [f"{key_prefix}part-{number:04d}.pdf" for number in range(1, len(chunks) + 1)]
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrent_jobs)
+        try:
+            futures = [
+                executor.submit(self._run_chunk, key, data, mode, feature_types)
+                for key, (_, data) in zip(keys, chunks)
+            ]
+            for (offset, _), future in zip(chunks, futures):
+                api, job_id = future.result()
+                self.job_ids.append(job_id)
+                for page_number, blocks in self.orchestrator.iter_document_pages(api, job_id):
+                    yield page_number + offset, offset_pages(blocks, offset)
+        finally:
+            # Don't start chunks nobody will read if the consumer stopped early
+            executor.shutdown(wait=True, cancel_futures=True)
+            for key in keys:
+                try:
+                    self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+                except Exception as error:
+                    logger.warning("Couldn't delete chunk %s: %s", key, error)
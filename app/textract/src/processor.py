@@ -0,0 +1,391 @@
+"""
+Purpose
+
+Library entry point of the Textract pipeline. process_document runs one
+document (a local file or an s3:// object) through Textract and writes its
+outputs; process_batch runs a directory or S3 prefix with a bounded worker
+pool.
+
+LocalTextractStub stands in for the Textract client and replays saved
+results, so the pipeline and its throughput can be exercised offline.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+from block_store import find_store, store_path
+from extractors import PageOutputWriter, iter_blocks, iter_pages
+from md_converter import convert
+from ocr_cache import features_key
+from page_chunks import ChunkedJobRunner, split_pdf
+from textract_jobs import MODE_ANALYSIS, TextractJobOrchestrator
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff")
+UPLOAD_PREFIX = "uploads/"
+
+
+@dataclass
+class ProcessedDocument:
+    """Outputs and counters of one processed document."""
+
+    source: str
+    output_folder: str
+    mode: str
+    job_id: str
+    page_count: int = 0
+    block_count: int = 0
+    line_count: int = 0
+    kv_count: int = 0
+    table_count: int = 0
+    markdown_path: Optional[str] = None
+    elapsed: float = 0.0
+    content_hash: Optional[str] = None
+    cached: bool = False
+    error: Optional[str] = None
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+
+def parse_s3_uri(uri):
+    """:return: Tuple of (bucket, key) of an s3://bucket/key URI."""
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def document_name(source):
+    """Output folder name of a document: its file name without extension."""
+    return os.path.splitext(os.path.basename(source.rstrip("/")))[0]
+
+
+def source_digest(source):
+    """:return: Short hash telling apart sources with the same file name."""
+    if not source.startswith("s3://"):
+        source = os.path.abspath(source)
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+
+
+def expand_sources(sources, s3_client=None):
+    """
+    Expands directories and S3 prefixes into individual documents.
+
+    A local directory yields its document files; an s3:// URI ending in "/"
+    (or naming only a bucket) yields every document object under the prefix.
+
+    :param sources: Local paths and s3:// URIs.
+    :param s3_client: A Boto3 S3 client, required for S3 prefixes.
+    :return: List of local paths and s3:// URIs.
+    """
+    documents = []
+    for source in sources:
+        if source.startswith("s3://"):
+            bucket, key = parse_s3_uri(source)
+            if key and not key.endswith("/"):
+                documents.append(source)
+                continue
+            paginator = s3_client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=bucket, Prefix=key):
+                for obj in page.get("Contents", []):
+                    if obj["Key"].lower().endswith(DOCUMENT_EXTENSIONS):
+                        documents.append(f"s3://{bucket}/{obj['Key']}")
+        elif os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                if name.lower().endswith(DOCUMENT_EXTENSIONS):
+                    documents.append(os.path.join(source, name))
+        else:
+            documents.append(source)
+    return documents
+
+
+class DocumentProcessor:
+    """Runs documents through Textract and writes their outputs."""
+
+    def __init__(
+        self,
+        orchestrator,
+        output_root,
+        bucket_name=None,
+        s3_client=None,
+        mode=MODE_ANALYSIS,
+        feature_types=("TABLES", "FORMS"),
+        markdown=True,
+        chunk_pages=None,
+        max_concurrent_jobs=4,
+        raw_format="ndjson",
+        cache=None,
+    ):
+        """
+        :param orchestrator: A TextractJobOrchestrator.
+        :param output_root: Folder that receives one output folder per document.
+        :param bucket_name: Bucket local files are uploaded to before analysis.
+        :param s3_client: A Boto3 S3 client used to upload local files. Without
+                          one, local files are passed to Textract by name,
+                          which only a LocalTextractStub accepts.
+        :param mode: MODE_ANALYSIS or MODE_DETECTION.
+        :param feature_types: Analysis feature types.
+        :param markdown: Whether to render proposal.md after an analysis run.
+        :param chunk_pages: When set, PDFs longer than this many pages are split
+                            into page ranges analyzed as concurrent jobs.
+        :param max_concurrent_jobs: Most page-range jobs running at once per
+                                    document.
+        :param raw_format: Storage format of the raw blocks, a
+                           block_store.FORMATS key.
+        :param cache: An OcrCache consulted before starting Textract and
+                      filled after a fresh run.
+        """
+        self.orchestrator = orchestrator
+        self.output_root = output_root
+        self.bucket_name = bucket_name
+        self.s3_client = s3_client
+        self.mode = mode
+        self.feature_types = feature_types
+        self.markdown = markdown
+        self.chunk_pages = chunk_pages
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.raw_format = raw_format
+        self.cache = cache
+        self._output_names = {}
+        self._output_names_lock = threading.Lock()
+
+    def output_folder(self, source):
+        """
+        Output folder of a document: its file name without extension, with a
+        hash of the source appended when another source already uses the name
+        (a/report.pdf and b/report.pdf in one batch).
+        """
+        name = document_name(source)
+        with self._output_names_lock:
+            owner = self._output_names.setdefault(name, source)
+        if owner != source:
+            name = f"{name}-{source_digest(source)}"
+        return os.path.join(self.output_root, name)
+
+    def _document_location(self, source):
+        """:return: Tuple of (bucket, key) Textract reads the document from."""
+        if source.startswith("s3://"):
+            return parse_s3_uri(source)
+        # Keyed per source, so files with the same name never overwrite each other
+        key = f"{UPLOAD_PREFIX}{source_digest(source)}/{os.path.basename(source)}"
+        if self.s3_client is not None:
+            logger.info("Uploading %s to S3 bucket %s at key %s", source, self.bucket_name, key)
+            self.s3_client.upload_file(source, self.bucket_name, key)
+        return self.bucket_name, key
+
+    def _read_source(self, source):
+        if source.startswith("s3://"):
+            bucket, key = parse_s3_uri(source)
+            return self.s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        with open(source, "rb") as f:
+            return f.read()
+
+    def _start_pages(self, source):
+        """
+        Runs Textract on a document.
+
+        :return: Tuple of (job IDs, generator of (page number, blocks) tuples).
+        """
+        if self.chunk_pages and self.s3_client is not None and source.lower().endswith(".pdf"):
+            chunks = split_pdf(self._read_source(source), self.chunk_pages)
+            if len(chunks) > 1:
+                runner = ChunkedJobRunner(self.orchestrator, self.s3_client, self.bucket_name, self.max_concurrent_jobs)
+                key_prefix = f"{UPLOAD_PREFIX}chunks/{document_name(source)}-{uuid.uuid4().hex[:8]}/"
+                return runner.job_ids, runner.iter_document_pages(chunks, key_prefix, self.mode, self.feature_types)
+
+        bucket, key = self._document_location(source)
+        api, job_id = self.orchestrator.run_job(
+            bucket, key, mode=self.mode, feature_types=self.feature_types, token=uuid.uuid4().hex
+        )
+        return [job_id], self.orchestrator.iter_document_pages(api, job_id)
+
+    def process_document(self, source):
+        """
+        Processes one document.
+
+        :param source: A local file path or an s3:// URI.
+        :return: The ProcessedDocument.
+        """
+        start = time.perf_counter()
+        output_folder = self.output_folder(source)
+        os.makedirs(output_folder, exist_ok=True)
+        logger.info("Start Textract processing for: %s", source)
+
+        result = ProcessedDocument(source, output_folder, self.mode, "")
+        features = features_key(self.mode, self.feature_types)
+        cached_path = None
+        if self.cache is not None:
+            result.content_hash = self.cache.source_hash(source)
+            cached_path = self.cache.lookup(result.content_hash, features)
+
+        if cached_path:
+            logger.info("Using cached OCR result for %s (%s).", source, result.content_hash)
+            result.cached = True
+            job_ids, pages = [], iter_pages(self.cache.iter_blocks(cached_path))
+        else:
+            job_ids, pages = self._start_pages(source)
+
+        # Results are written page by page as they are fetched, so memory stays
+        # bounded by one page of blocks instead of the whole document
+        analysis = self.mode == MODE_ANALYSIS
+        raw_path = store_path(output_folder, "document-analysis" if analysis else "text-detection", self.raw_format)
+        json_name = os.path.basename(raw_path)
+        with PageOutputWriter(output_folder, json_name, extract_forms_and_tables=analysis) as writer:
+            for page_number, page_blocks in pages:
+                writer.write_page(page_blocks)
+                result.page_count += 1
+                logger.debug("Processed page %s of %s (%d blocks)", page_number, source, len(page_blocks))
+
+        # Page-range jobs are started lazily, so their IDs are known only now
+        result.job_id = ",".join(job_ids)
+        result.block_count = writer.block_count
+        result.line_count = writer.line_count
+        result.kv_count = writer.kv_count
+        result.table_count = writer.table_count
+
+        if analysis and self.markdown:
+            result.markdown_path = os.path.join(output_folder, "proposal.md")
+            convert(raw_path, result.markdown_path)
+
+        if self.cache is not None and not result.cached:
+            self.cache.store(result.content_hash, features, raw_path, result.markdown_path)
+
+        result.elapsed = time.perf_counter() - start
+        logger.info(
+            "Processed %s%s: %d pages, %d blocks, %d lines, %d form fields, %d tables in %.2fs. Output folder: %s",
+            source, " (cached)" if result.cached else "", result.page_count, result.block_count, result.line_count,
+            result.kv_count, result.table_count, result.elapsed, output_folder,
+        )
+        return result
+
+    def process_batch(self, sources, max_workers=4):
+        """
+        Processes documents concurrently.
+
+        A failing document is recorded on its result and does not stop the
+        batch.
+
+        :param sources: Local paths and s3:// URIs, as returned by expand_sources.
+        :param max_workers: Most documents in flight at once.
+        :return: List of ProcessedDocument, in the order of sources.
+        """
+
+        def run(source):
+            try:
+                return self.process_document(source)
+            except Exception as error:
+                logger.exception("Processing %s failed.", source)
+                return ProcessedDocument(source, self.output_folder(source), self.mode, "", error=str(error))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(run, sources))
+
+
+def process_document(source, orchestrator, output_root, **kwargs):
+    """
+    Processes one document; see DocumentProcessor for the keyword arguments.
+
+    :return: The ProcessedDocument.
+    """
+    return DocumentProcessor(orchestrator, output_root, **kwargs).process_document(source)
+
+
+def summarize(results: List[ProcessedDocument], elapsed):
+    """:return: Dict of batch totals and throughput."""
+    done = [result for result in results if result.succeeded]
+    pages = sum(result.page_count for result in done)
+    return {
+        "documents": len(results),
+        "failed": len(results) - len(done),
+        "pages": pages,
+        "blocks": sum(result.block_count for result in done),
+        "cached": sum(1 for result in done if result.cached),
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+class LocalTextractStub:
+    """
+    Offline stand-in for a Textract client.
+
+    Jobs succeed immediately and their results are replayed from saved
+    output folders: a document named "report.pdf" is answered from
+    <results_root>/report/document-analysis.* in any block store format (or
+    the legacy document-analysis.json). Detection jobs return the saved LINE and WORD
+    blocks only.
+    """
+
+    def __init__(self, results_root, latency=0.0):
+        """
+        :param results_root: Folder holding one saved output folder per document.
+        :param latency: Seconds added to every Get call, to approximate the
+                        service round trip.
+        """
+        self.results_root = results_root
+        self.latency = latency
+        self._jobs = {}
+
+    def _result_path(self, name):
+        return find_store(os.path.join(self.results_root, name), "document-analysis")
+
+    def document_names(self):
+        """Names of the documents with a saved result."""
+        return [
+            name for name in sorted(os.listdir(self.results_root))
+            if self._result_path(name) is not None
+        ]
+
+    def _start(self, kwargs, block_types=None):
+        name = document_name(kwargs["DocumentLocation"]["S3Object"]["Name"])
+        path = self._result_path(name)
+        if path is None:
+            raise FileNotFoundError(f"No saved Textract result for {name} in {self.results_root}")
+        blocks = [
+            block for block in iter_blocks(path)
+            if block_types is None or block["BlockType"] in block_types
+        ]
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = blocks
+        return {"JobId": job_id}
+
+    def start_document_analysis(self, **kwargs):
+        return self._start(kwargs)
+
+    def start_document_text_detection(self, **kwargs):
+        return self._start(kwargs, ("PAGE", "LINE", "WORD"))
+
+    def _get(self, JobId, MaxResults=1000, NextToken=None):
+        if self.latency:
+            time.sleep(self.latency)
+        blocks = self._jobs[JobId]
+        start = int(NextToken or 0)
+        end = start + MaxResults
+        response = {
+            "JobStatus": "SUCCEEDED",
+            "Blocks": blocks[start:end],
+            "DocumentMetadata": {"Pages": len({block.get("Page", 1) for block in blocks})},
+        }
+        if end < len(blocks):
+            response["NextToken"] = str(end)
+        return response
+
+    def get_document_analysis(self, **kwargs):
+        return self._get(**kwargs)
+
+    def get_document_text_detection(self, **kwargs):
+        return self._get(**kwargs)
+
+
+def replay_orchestrator(results_root, latency=0.0):
+    """:return: A TextractJobOrchestrator backed by a LocalTextractStub."""
+    return TextractJobOrchestrator(LocalTextractStub(results_root, latency))
+
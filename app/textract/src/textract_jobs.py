@@ -0,0 +1,380 @@
+"""
+Purpose
+
+Runs asynchronous Amazon Textract jobs without fixed-interval polling.
+Completion is picked up from the SNS notification delivered to an SQS queue
+when one is configured, otherwise job status is polled with jittered
+exponential backoff. One thread at a time receives from the queue and hands
+each notification to whichever waiter owns the job, so concurrent documents
+sharing an orchestrator do not hide each other's completions.
+
+A document is processed with a single job: analysis output already contains
+every LINE and WORD block that text detection produces, so lines, forms and
+tables all come from one block set. Detection-only is the cheaper option when
+forms and tables are not needed.
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+DETECTION = "DETECTION"
+ANALYSIS = "ANALYSIS"
+
+# Pipeline modes
+MODE_ANALYSIS = "analysis"
+MODE_DETECTION = "detection"
+
+TERMINAL_STATUSES = ("SUCCEEDED", "FAILED", "PARTIAL_SUCCESS")
+
+# Jobs finished by polling whose late notification is deleted on arrival
+COMPLETED_JOBS_REMEMBERED = 1000
+
+
+class TextractJobOrchestrator:
+    """Starts Textract jobs and waits for them to finish."""
+
+    def __init__(
+        self,
+        textract_client,
+        sqs_client=None,
+        queue_url=None,
+        sns_topic_arn=None,
+        sns_role_arn=None,
+        poll_base=0.5,
+        poll_max=20.0,
+        timeout=3600,
+        status_check_interval=60,
+    ):
+        """
+        :param textract_client: A Boto3 Textract client.
+        :param sqs_client: A Boto3 SQS client, required with queue_url.
+        :param queue_url: SQS queue subscribed to the notification topic.
+        :param sns_topic_arn: SNS topic Textract publishes job completion to.
+        :param sns_role_arn: IAM role Textract assumes to publish to the topic.
+        :param poll_base: First backoff delay in seconds when polling.
+        :param poll_max: Longest backoff delay in seconds when polling.
+        :param timeout: Seconds to wait for all jobs before giving up.
+        :param status_check_interval: Seconds between direct status checks
+                                      while waiting on the queue, in case a
+                                      notification is lost.
+        """
+        self.textract_client = textract_client
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.sns_topic_arn = sns_topic_arn
+        self.sns_role_arn = sns_role_arn
+        self.poll_base = poll_base
+        self.poll_max = poll_max
+        self.timeout = timeout
+        self.status_check_interval = status_check_interval
+        # Notification dispatch shared by every wait() on this orchestrator
+        self._condition = threading.Condition()
+        self._receiving = False
+        self._watched = set()
+        self._notified = {}
+        self._completed = OrderedDict()
+
+    @property
+    def notifications_enabled(self):
+        return bool(self.sqs_client and self.queue_url and self.sns_topic_arn and self.sns_role_arn)
+
+    def _job_kwargs(self, bucket_name, document_name, token=None, job_tag=None):
+        kwargs = {"DocumentLocation": {"S3Object": {"Bucket": bucket_name, "Name": document_name}}}
+        if token:
+            kwargs["ClientRequestToken"] = token
+        if job_tag:
+            kwargs["JobTag"] = job_tag
+        if self.sns_topic_arn and self.sns_role_arn:
+            kwargs["NotificationChannel"] = {
+                "SNSTopicArn": self.sns_topic_arn,
+                "RoleArn": self.sns_role_arn,
+            }
+        return kwargs
+
+    def start_detection(self, bucket_name, document_name, token=None, job_tag=None):
+        """
+        Starts a text detection job.
+
+        :return: The ID of the job.
+        """
+        response = self.textract_client.start_document_text_detection(
+            **self._job_kwargs(bucket_name, document_name, token, job_tag)
+        )
+        logger.info("Started text detection job %s on %s.", response["JobId"], document_name)
+        return response["JobId"]
+
+    def start_analysis(self, bucket_name, document_name, feature_types, token=None, job_tag=None):
+        """
+        Starts a document analysis job.
+
+        :param feature_types: The types of additional document features to detect.
+        :return: The ID of the job.
+        """
+        response = self.textract_client.start_document_analysis(
+            FeatureTypes=list(feature_types),
+            **self._job_kwargs(bucket_name, document_name, token, job_tag)
+        )
+        logger.info("Started analysis job %s on %s.", response["JobId"], document_name)
+        return response["JobId"]
+
+    def _get_page(self, api, job_id, next_token=None, max_results=1000):
+        kwargs = {"JobId": job_id, "MaxResults": max_results}
+        if next_token:
+            kwargs["NextToken"] = next_token
+        if api == DETECTION:
+            return self.textract_client.get_document_text_detection(**kwargs)
+        return self.textract_client.get_document_analysis(**kwargs)
+
+    def get_status(self, api, job_id):
+        """
+        Gets the status of a job with a minimal result page.
+
+        :return: The job status, e.g. IN_PROGRESS or SUCCEEDED.
+        """
+        return self._get_page(api, job_id, max_results=1)["JobStatus"]
+
+    def _backoff_delay(self, attempt):
+        # Full jitter keeps concurrent waiters from polling in lockstep
+        return random.uniform(0, min(self.poll_max, self.poll_base * (2 ** attempt)))
+
+    def _poll(self, pending, statuses):
+        """Polls every pending job once; returns True if any finished."""
+        finished = False
+        for job_id, api in list(pending.items()):
+            try:
+                status = self.get_status(api, job_id)
+            except ClientError as error:
+                if error.response["Error"]["Code"] not in ("ProvisionedThroughputExceededException", "ThrottlingException"):
+                    raise
+                logger.info("Throttled while checking job %s.", job_id)
+                continue
+            if status in TERMINAL_STATUSES:
+                statuses[job_id] = status
+                del pending[job_id]
+                finished = True
+                self._forget(job_id, completed=True)
+                logger.info("Job %s finished with status %s.", job_id, status)
+        return finished
+
+    def _forget(self, job_id, completed=False):
+        """Stops watching a job; a completed job's late notification is deleted on arrival."""
+        with self._condition:
+            self._watched.discard(job_id)
+            self._notified.pop(job_id, None)
+            if completed and self.notifications_enabled:
+                self._completed[job_id] = True
+                while len(self._completed) > COMPLETED_JOBS_REMEMBERED:
+                    self._completed.popitem(last=False)
+
+    def _collect(self, pending, statuses):
+        """Moves dispatched notifications for pending jobs into statuses. Hold the condition."""
+        for job_id in list(pending):
+            if job_id in self._notified:
+                statuses[job_id] = self._notified.pop(job_id)
+                del pending[job_id]
+                self._watched.discard(job_id)
+                logger.info("Job %s finished with status %s (notification).", job_id, statuses[job_id])
+
+    def _receive_notifications(self, pending, statuses, wait_seconds):
+        """
+        Waits for notifications of pending jobs.
+
+        One caller at a time long-polls the queue and dispatches what it
+        receives to every waiter; the others wait to be woken.
+        """
+        with self._condition:
+            self._collect(pending, statuses)
+            if not pending:
+                return
+            if self._receiving:
+                self._condition.wait(wait_seconds)
+                self._collect(pending, statuses)
+                return
+            self._receiving = True
+
+        relevant = True
+        try:
+            relevant = self._dispatch(wait_seconds)
+        finally:
+            with self._condition:
+                self._receiving = False
+                self._condition.notify_all()
+                self._collect(pending, statuses)
+
+        if not relevant:
+            # Only other processes' notifications are queued, and they are
+            # visible again at once; back off instead of receiving them in a loop
+            time.sleep(random.uniform(0, self.poll_base))
+
+    def _dispatch(self, wait_seconds):
+        """
+        Long-polls the queue once and routes each notification.
+
+        :return: False if messages arrived but none belonged to this orchestrator.
+        """
+        response = self.sqs_client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=wait_seconds,
+        )
+        messages = response.get("Messages", [])
+        relevant = not messages
+        for message in messages:
+            body = json.loads(message["Body"])
+            # Raw SNS delivery is off by default, so the Textract message is wrapped
+            notification = json.loads(body["Message"]) if "Message" in body else body
+            job_id = notification.get("JobId")
+            with self._condition:
+                if job_id in self._watched:
+                    self._notified[job_id] = notification.get("Status")
+                    own = True
+                else:
+                    # Late notification of a job finished by polling
+                    own = self._completed.pop(job_id, None) is not None
+            if own:
+                relevant = True
+                self.sqs_client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message["ReceiptHandle"])
+            else:
+                # Another process's job: make it visible to its waiter right away
+                self.sqs_client.change_message_visibility(
+                    QueueUrl=self.queue_url, ReceiptHandle=message["ReceiptHandle"], VisibilityTimeout=0
+                )
+        return relevant
+
+    def wait(self, jobs):
+        """
+        Waits until every job reaches a terminal status.
+
+        :param jobs: Dict of job ID to DETECTION or ANALYSIS.
+        :return: Dict of job ID to final status.
+        """
+        pending = dict(jobs)
+        statuses = {}
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            self._watched.update(pending)
+        try:
+            return self._wait(pending, statuses, deadline)
+        finally:
+            for job_id in pending:
+                self._forget(job_id)
+
+    def _wait(self, pending, statuses, deadline):
+        # A job can finish before its notification is consumed; check once up front
+        self._poll(pending, statuses)
+
+        attempt = 0
+        last_check = time.monotonic()
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Textract jobs still running after {self.timeout}s: {sorted(pending)}")
+
+            if self.notifications_enabled:
+                self._receive_notifications(pending, statuses, int(min(20, max(1, remaining))))
+                if pending and time.monotonic() - last_check >= self.status_check_interval:
+                    self._poll(pending, statuses)
+                    last_check = time.monotonic()
+            else:
+                time.sleep(min(self._backoff_delay(attempt), max(0, remaining)))
+                if self._poll(pending, statuses):
+                    attempt = 0
+                else:
+                    attempt += 1
+
+        return statuses
+
+    def iter_result_pages(self, api, job_id):
+        """
+        Yields the result pages of a finished job.
+
+        The next page is requested in the background while the caller handles
+        the current one.
+
+        :return: Generator of GetDocumentTextDetection/GetDocumentAnalysis responses.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self._get_page, api, job_id)
+            while future is not None:
+                response = future.result()
+                next_token = response.get("NextToken")
+                future = executor.submit(self._get_page, api, job_id, next_token) if next_token else None
+                yield response
+
+    def iter_document_pages(self, api, job_id):
+        """
+        Yields the blocks of a finished job one document page at a time.
+
+        Textract returns blocks ordered by page and relationships never cross
+        pages, so only the current page's blocks are held in memory.
+
+        :return: Generator of (page number, list of blocks) tuples.
+        """
+        page_number = None
+        page_blocks = []
+        for response in self.iter_result_pages(api, job_id):
+            for block in response["Blocks"]:
+                block_page = block.get("Page", 1)
+                if block_page != page_number and page_blocks:
+                    yield page_number, page_blocks
+                    page_blocks = []
+                page_number = block_page
+                page_blocks.append(block)
+        if page_blocks:
+            yield page_number, page_blocks
+
+    def get_blocks(self, api, job_id):
+        """
+        Gets all blocks of a finished job.
+
+        :return: List of blocks.
+        """
+        blocks = []
+        for response in self.iter_result_pages(api, job_id):
+            blocks.extend(response["Blocks"])
+        logger.info("Got %d blocks from job %s.", len(blocks), job_id)
+        return blocks
+
+    def run_job(self, bucket_name, document_name, mode=MODE_ANALYSIS, feature_types=("TABLES", "FORMS"), token=None, job_tag=None):
+        """
+        Runs one Textract job on a document and waits for it to finish.
+
+        :param mode: MODE_ANALYSIS for lines, forms and tables from a single
+                     analysis job, or MODE_DETECTION for lines only.
+        :param feature_types: Analysis feature types.
+        :param token: Idempotency token for the start request.
+        :return: Tuple of (DETECTION or ANALYSIS, job ID) to read results with.
+        """
+        if mode == MODE_ANALYSIS:
+            job_id = self.start_analysis(bucket_name, document_name, feature_types, token, job_tag)
+            api = ANALYSIS
+        elif mode == MODE_DETECTION:
+            job_id = self.start_detection(bucket_name, document_name, token, job_tag)
+            api = DETECTION
+        else:
+            raise ValueError(f"Unknown Textract mode: {mode}")
+
+        status = self.wait({job_id: api})[job_id]
+        if status not in ("SUCCEEDED", "PARTIAL_SUCCESS"):
+            raise RuntimeError(f"Textract job {job_id} finished with status {status}")
+
+        return api, job_id
+
+    def run(self, bucket_name, document_name, mode=MODE_ANALYSIS, feature_types=("TABLES", "FORMS"), token=None, job_tag=None):
+        """
+        Runs one Textract job on a document and returns all of its blocks.
+
+        Prefer run_job with iter_document_pages for large documents.
+
+        :return: List of blocks.
+        """
+        return self.get_blocks(*self.run_job(bucket_name, document_name, mode, feature_types, token, job_tag))